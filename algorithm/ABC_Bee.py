@@ -1,70 +1,93 @@
 import random
-import time
-from utils import total_distance, generate_neighbor, get_memory_usage, dsd_optimization
 
+import numpy as np
 
-def abc_algorithm(distmap, colony_size, max_iterations):
+from utils import get_memory_usage, dsd_optimization, batch_total_distance, random_population
+from moves import distance_lookup, random_swap, swap_delta, apply_swap
+from convergence import ConvergenceTrace
+
+
+def abc_algorithm(distmap, colony_size, max_iterations, budget=None, trace=None):
+    # budget 為 anytime.SolverBudget，每次迭代檢查一次停止條件；trace 為 ConvergenceTrace
     num_cities = len(distmap)
 
-    food_sources = [list(range(num_cities)) + [0] for _ in range(colony_size)]
-    for source in food_sources:
-        random.shuffle(source[1:-1])
+    # 族群存成 (colony_size × N+1) 的 NumPy 陣列，路徑長度一次批次計算
+    food_sources = random_population(colony_size, num_cities)
+
+    # 每個食物源的路徑長度隨移動累加更新，不再整條重算
+    lookup = distance_lookup(distmap)
+    distances = batch_total_distance(food_sources, distmap)
 
-    best_solution = min(food_sources, key=lambda x: total_distance(x, distmap))
-    best_distance = total_distance(best_solution, distmap)
+    best_index = int(distances.argmin())
+    best_solution = food_sources[best_index].copy()
+    best_distance = distances[best_index].item()
 
-    iteration_distances = [(0, best_distance)]
-    start_time = time.time()
+    if trace is None:
+        trace = ConvergenceTrace()
+    trace.start()
+    trace.record(0, best_distance)
+    if budget is not None:
+        budget.improved(best_solution, best_distance)
 
     best_iteration = 0
+    iteration = -1
 
     for iteration in range(max_iterations):
         # Employed Bees Phase
         for i in range(colony_size):
-            neighbor = generate_neighbor(food_sources[i])
-            if total_distance(neighbor, distmap) < total_distance(food_sources[i], distmap):
-                food_sources[i] = neighbor
+            a, b = random_swap(food_sources[i])
+            delta = swap_delta(food_sources[i], lookup, a, b)
+            if delta < 0:
+                apply_swap(food_sources[i], a, b)
+                distances[i] += delta
 
         # Onlooker Bees Phase
-        fitnesses = [1 / (1 + total_distance(source, distmap)) for source in food_sources]
-        total_fitness = sum(fitnesses)
-        probabilities = [fit / total_fitness for fit in fitnesses]
+        fitnesses = 1 / (1 + distances)
+        probabilities = fitnesses / fitnesses.sum()
 
-        for _ in range(colony_size):
-            selected = random.choices(range(colony_size), probabilities)[0]
-            neighbor = generate_neighbor(food_sources[selected])
-            if total_distance(neighbor, distmap) < total_distance(food_sources[selected], distmap):
-                food_sources[selected] = neighbor
+        for selected in random.choices(range(colony_size), probabilities, k=colony_size):
+            a, b = random_swap(food_sources[selected])
+            delta = swap_delta(food_sources[selected], lookup, a, b)
+            if delta < 0:
+                apply_swap(food_sources[selected], a, b)
+                distances[selected] += delta
 
         # Scout Bees Phase
-        for i in range(colony_size):
-            if random.random() < 0.1:  # 10% chance of reset
-                food_sources[i] = list(range(num_cities)) + [0]
-                random.shuffle(food_sources[i][1:-1])
+        resets = np.random.random(colony_size) < 0.1  # 10% chance of reset
+        reset_count = int(resets.sum())
+        if reset_count:
+            food_sources[resets] = random_population(reset_count, num_cities)
+            distances[resets] = batch_total_distance(food_sources[resets], distmap)
 
         # Update best solution
-        current_best = min(food_sources, key=lambda x: total_distance(x, distmap))
-        current_best_distance = total_distance(current_best, distmap)
+        current_index = int(distances.argmin())
+        current_best_distance = distances[current_index].item()
         if current_best_distance < best_distance:
-            best_solution = current_best
+            best_solution = food_sources[current_index].copy()
             best_distance = current_best_distance
             best_iteration = iteration + 1
+            if budget is not None:
+                budget.improved(best_solution, best_distance)
+
+        trace.record(iteration + 1, best_distance)
 
-        current_time = time.time() - start_time
-        iteration_distances.append((current_time, best_distance))
+        # 每次迭代評估 2 × colony_size 個鄰居與重新初始化的路徑
+        if budget is not None and budget.spend(2 * colony_size + reset_count):
+            break
 
-    return best_solution, best_distance, iteration_distances, best_iteration
+    trace.finish(iteration + 1, best_distance)
+    return best_solution.tolist(), best_distance, trace, best_iteration
 
 
-def run_abc(distmap, colony_size=100, max_iterations=1000):
+def run_abc(distmap, colony_size=100, max_iterations=1000, budget=None, trace=None):
     initial_memory = get_memory_usage()
 
     initial_solution, initial_distance = dsd_optimization(distmap)
 
-    best_solution, best_distance, iteration_distances, best_iteration = abc_algorithm(distmap, colony_size,
-                                                                                      max_iterations)
+    best_solution, best_distance, trace, best_iteration = abc_algorithm(distmap, colony_size, max_iterations,
+                                                                        budget, trace)
 
     final_memory = get_memory_usage()
     memory_used = final_memory - initial_memory
 
-    return best_solution, best_distance, iteration_distances, best_iteration, memory_used
+    return best_solution, best_distance, trace, best_iteration, memory_used
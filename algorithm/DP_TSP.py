@@ -1,36 +1,78 @@
 import time
-from functools import lru_cache
+
+import numpy as np
+
 from utils import total_distance
 
 
-def dp_tsp(distmap):
+def held_karp(distmap):
+    # 以整數位元遮罩表示已拜訪的城市集合，城市0固定為起點，不放入遮罩
+    # dp[mask, j]: 從0出發、走過mask中的城市、最後停在城市 j+1 的最短距離
+    # parent[mask, j]: 對應的前一個城市(同樣以 j 的編號方式記錄)，用來回溯路徑
     n = len(distmap)
-    all_points_set = frozenset(range(n))
+    if n < 2:
+        return [0, 0], 0, 0
+    if n == 2:
+        return [0, 1, 0], distmap[0][1] + distmap[1][0], 0
+
+    dist = np.asarray(distmap, dtype=np.float32)
+    m = n - 1
+    full = (1 << m) - 1
+
+    dp = np.full((1 << m, m), np.inf, dtype=np.float32)
+    parent = np.full((1 << m, m), -1, dtype=np.int32)
+    table_bytes = dp.nbytes + parent.nbytes
 
-    @lru_cache(maxsize=None)
-    def distance(current, remaining):
-        if not remaining:
-            return distmap[current][0], [current, 0]
+    inner = dist[1:, 1:]
+    for j in range(m):
+        dp[1 << j, j] = dist[0, j + 1]
 
-        results = []
-        for next_city in remaining:
-            remaining_cities = remaining - frozenset([next_city])
-            sub_path_dist, sub_path = distance(next_city, remaining_cities)
-            total_dist = distmap[current][next_city] + sub_path_dist
-            results.append((total_dist, [current] + sub_path))
+    # 依集合大小逐層處理，同一層的所有遮罩一次以 NumPy 向量化計算
+    masks = np.arange(1 << m, dtype=np.int64)
+    popcount = np.zeros(1 << m, dtype=np.int8)
+    for j in range(m):
+        popcount += ((masks >> j) & 1).astype(np.int8)
 
-        return min(results, key=lambda x: x[0])
+    for size in range(1, m):
+        layer = masks[popcount == size]
+        for k in range(m):
+            sources = layer[((layer >> k) & 1) == 0]
+            if not len(sources):
+                continue
+            candidates = dp[sources] + inner[:, k]
+            best_prev = candidates.argmin(axis=1)
+            targets = sources | (1 << k)
+            dp[targets, k] = candidates[np.arange(len(sources)), best_prev]
+            parent[targets, k] = best_prev
 
-    optimal_dist, optimal_path = distance(0, all_points_set - frozenset([0]))
-    return optimal_path, optimal_dist
+    closing = dp[full] + dist[1:, 0]
+    last = int(closing.argmin())
+    best_distance = float(closing[last])
+
+    # 從終點回溯路徑
+    path = []
+    mask = full
+    while last != -1:
+        path.append(last + 1)
+        prev = int(parent[mask, last])
+        mask ^= 1 << last
+        last = prev
+    route = [0] + path[::-1] + [0]
+
+    return route, best_distance, table_bytes
+
+
+def dp_tsp(distmap):
+    best_route, _, _ = held_karp(distmap)
+    return best_route, total_distance(best_route, distmap)
 
 
 def run_dp(distmap):
     start_time = time.perf_counter()
-    best_route, best_distance = dp_tsp(distmap)
+    best_route, _, table_bytes = held_karp(distmap)
     end_time = time.perf_counter()
     execution_time = (end_time - start_time) * 1000  # 轉換為毫秒
 
-    # 使用 utils 中的 total_distance 函數來驗證結果
-    calculated_distance = total_distance(best_route, distmap)
-    return best_route, best_distance, execution_time
+    # DP表以float32累加，最終距離以原始距離矩陣重新計算，避免精度誤差
+    best_distance = total_distance(best_route, distmap)
+    return best_route, best_distance, execution_time, table_bytes
@@ -0,0 +1,167 @@
+import random
+import time
+from collections import deque
+
+from utils import total_distance, get_memory_usage, knn_optimization, two_opt, neighbor_lists, ArrayTour
+from convergence import ConvergenceTrace
+
+# Chained Lin-Kernighan 參數設置
+LK_PARAMS = {
+    'neighbors': 8,  # 每個城市的候選鄰居數
+    'max_depth': 12,  # 單次 LK 移動最多串接的翻轉次數
+    'kick_span': 50,  # double-bridge 擾動的最大路段長度
+}
+
+
+def chained_lin_kernighan(route, distmap, max_iterations, trace=None):
+    # 路徑視為環狀: tour 為城市順序，pos 為城市在 tour 中的位置，距離矩陣需對稱
+    start = int(route[0])
+    tour = [int(city) for city in route[:-1]]
+    n = len(tour)
+    dist = distmap.tolist() if hasattr(distmap, 'tolist') else distmap
+    near = neighbor_lists(distmap, LK_PARAMS['neighbors'])
+    array_tour = ArrayTour(tour)
+    succ, pred, exchange = array_tour.succ, array_tour.pred, array_tour.exchange
+    rebuild_positions = array_tour.rebuild_positions
+    eps = 1e-9
+
+    def lk_move(t1):
+        # 以 t1 為起點做變深度搜索，回傳總增益與受影響的城市，沒有改進則還原
+        for t2 in (succ(t1), pred(t1)):
+            gain = dist[t1][t2]
+            flips = []
+            added, removed = set(), {frozenset((t1, t2))}
+            best_gain, best_depth = eps, 0
+
+            for _ in range(LK_PARAMS['max_depth']):
+                forward = succ(t1) == t2
+                choice = None
+                for t3 in near[t2]:
+                    g1 = gain - dist[t2][t3]
+                    if g1 <= eps:
+                        break
+                    t4 = pred(t3) if forward else succ(t3)
+                    if t3 == t1 or t4 == t2 or frozenset((t2, t3)) in removed \
+                            or frozenset((t3, t4)) in added:
+                        continue
+                    score = g1 + dist[t3][t4]
+                    if choice is None or score > choice[0]:
+                        choice = (score, t3, t4)
+                if choice is None:
+                    break
+
+                gain, t3, t4 = choice
+                exchange(t1, t2, t4, t3)
+                flips.append((t1, t2, t4, t3))
+                added.add(frozenset((t2, t3)))
+                removed.add(frozenset((t3, t4)))
+
+                closing = gain - dist[t4][t1]
+                if closing > best_gain:
+                    best_gain, best_depth = closing, len(flips)
+                t2 = t4
+
+            # 只保留增益最大的前 best_depth 次翻轉
+            while len(flips) > best_depth:
+                a, b, c, d = flips.pop()
+                exchange(a, c, b, d)
+            if best_depth:
+                touched = {t1}
+                for a, b, c, d in flips:
+                    touched.update((b, c, d))
+                return best_gain, touched
+        return 0, ()
+
+    def local_optimize(queue, queued):
+        # don't-look bits: 只有佇列中的城市需要重新檢查
+        total_gain = 0
+        while queue:
+            t1 = queue.popleft()
+            queued[t1] = False
+            gain, touched = lk_move(t1)
+            if gain:
+                total_gain += gain
+                for city in touched:
+                    if not queued[city]:
+                        queued[city] = True
+                        queue.append(city)
+        return total_gain
+
+    def double_bridge():
+        # 在局部範圍內切成 A B C D 並重組為 A C B D，回傳長度變化與端點城市
+        span = max(1, min(LK_PARAMS['kick_span'], (n - 2) // 3))
+        offset = random.randrange(n)
+        rotated = tour[offset:] + tour[:offset]
+        i = 1 + random.randrange(span)
+        j = i + 1 + random.randrange(span)
+        k = j + 1 + random.randrange(span)
+        if k >= n:
+            return 0, ()
+        a1, a2, b1, b2 = rotated[i - 1], rotated[i], rotated[j - 1], rotated[j]
+        c1, c2 = rotated[k - 1], rotated[k % n]
+        delta = (dist[a1][b2] + dist[c1][a2] + dist[b1][c2]
+                 - dist[a1][a2] - dist[b1][b2] - dist[c1][c2])
+        tour[:] = rotated[:i] + rotated[j:k] + rotated[i:j] + rotated[k:]
+        rebuild_positions()
+        return delta, (a1, a2, b1, b2, c1, c2)
+
+    current_distance = total_distance(route, distmap)
+    current_distance -= local_optimize(deque(tour), [True] * n)
+
+    best_tour = tour.copy()
+    best_distance = current_distance
+    best_iteration = 0
+    if trace is None:
+        trace = ConvergenceTrace()
+    trace.start()
+    trace.record(0, best_distance)
+    iteration = -1
+
+    if n >= 8:
+        for iteration in range(max_iterations):
+            saved_tour = tour.copy()
+            delta, endpoints = double_bridge()
+            queued = [False] * n
+            for city in endpoints:
+                queued[city] = True
+            candidate = current_distance + delta - local_optimize(deque(endpoints), queued)
+
+            if candidate < current_distance - eps:
+                current_distance = candidate
+                if current_distance < best_distance - eps:
+                    best_tour = tour.copy()
+                    best_distance = current_distance
+                    best_iteration = iteration + 1
+            else:
+                tour[:] = saved_tour
+                rebuild_positions()
+
+            trace.record(iteration + 1, best_distance)
+
+    index = best_tour.index(start)
+    best_route = best_tour[index:] + best_tour[:index] + [start]
+    trace.finish(iteration + 1, best_distance)
+    return best_route, total_distance(best_route, distmap), trace, best_iteration
+
+
+def run_lk(distmap, max_iterations=None, trace=None):
+    start_time = time.time()  # 開始計時
+
+    num_cities = len(distmap)
+    if max_iterations is None:
+        max_iterations = min(5000, max(500, num_cities * 5))
+
+    # KNN 初始解先以 2-opt / Or-opt 收斂，再交給 LK 與 double-bridge 擾動
+    initial_route, _ = knn_optimization(distmap)
+    initial_route, _ = two_opt(initial_route, distmap)
+
+    start_memory = get_memory_usage()
+    best_route, best_distance, trace, best_iteration = chained_lin_kernighan(
+        initial_route, distmap, max_iterations, trace)
+    end_memory = get_memory_usage()
+    memory_used = end_memory - start_memory
+
+    end_time = time.time()  # 結束計時
+    total_time = end_time - start_time  # 計算總執行時間
+
+    return best_route, best_distance, trace, best_iteration, memory_used, total_time
@@ -1,6 +1,11 @@
 import random
 import time
-from utils import total_distance, get_memory_usage
+
+import numpy as np
+
+from utils import get_memory_usage, batch_total_distance, random_population
+from moves import distance_lookup, random_segment, two_opt_delta, apply_two_opt, swap_delta, apply_swap
+from convergence import ConvergenceTrace
 
 
 def greedy_solution(distmap, start_city):
@@ -19,23 +24,24 @@ def greedy_solution(distmap, start_city):
     return tour
 
 
-def multi_start_greedy(distmap, num_starts):
-    solutions = [greedy_solution(distmap, i) for i in range(num_starts)]
-    return sorted(solutions, key=lambda x: total_distance(x, distmap))
+def rotate_to_depot(tour):
+    # 把封閉路徑旋轉成由城市0出發並回到城市0，距離不變
+    depot = tour.index(0)
+    return tour[depot:-1] + tour[:depot] + [0]
 
 
-def generate_neighbor(solution):
-    neighbor = solution.copy()
-    size = len(solution)
-    i, j = sorted(random.sample(range(1, size - 1), 2))
-    neighbor[i:j + 1] = reversed(neighbor[i:j + 1])
-    return neighbor
+def multi_start_greedy(distmap, num_starts, first_city=0):
+    # 由 first_city 起連續 num_starts 個城市 (超過城市數時回到城市0) 分別作為貪婪法的起點
+    # 各路徑再旋轉成由城市0出發，後續的交換與 2-opt 都固定頭尾，因此最終路徑仍從城市0出發
+    num_cities = len(distmap)
+    solutions = np.array([rotate_to_depot(greedy_solution(distmap, (first_city + i) % num_cities))
+                          for i in range(num_starts)], dtype=np.intp)
+    return solutions[np.argsort(batch_total_distance(solutions, distmap), kind='stable')]
 
 
-def rank_bees(food_sources, distmap):
-    fitnesses = [1 / (1 + total_distance(source, distmap)) for source in food_sources]
-    ranked_bees = sorted(range(len(fitnesses)), key=lambda k: fitnesses[k], reverse=True)
-    return ranked_bees
+def rank_bees(distances):
+    # 路徑越短適應度越高，等同依距離由小到大排序
+    return np.argsort(distances, kind='stable')
 
 
 def differential_mutation(food_sources, current_index, ranked_bees, distmap):
@@ -43,31 +49,46 @@ def differential_mutation(food_sources, current_index, ranked_bees, distmap):
     weights = [1 / (rank + 1) for rank in range(len(candidates))]
     r1, r2, r3 = random.choices(candidates, weights=weights, k=3)
 
-    mutant = food_sources[current_index].copy()
     num_cities = len(distmap)
 
     swap_count = max(2, int(0.1 * num_cities))
     swap_indices = random.sample(range(1, num_cities - 1), swap_count)
 
+    # 只回傳交換序列，由呼叫端以差值決定是否保留
+    swaps = []
     for i in swap_indices:
         if random.random() < 0.5:
             j = random.choice(swap_indices)
-            mutant[i], mutant[j] = mutant[j], mutant[i]
+            swaps.append((i, j))
+
+    return swaps
 
-    return mutant
+
+def apply_mutation(solution, swaps, distmap):
+    delta = 0
+    for i, j in swaps:
+        delta += swap_delta(solution, distmap, i, j)
+        apply_swap(solution, i, j)
+
+    if delta >= 0:
+        for i, j in reversed(swaps):
+            apply_swap(solution, i, j)
+        return 0
+    return delta
 
 
 def local_search(solution, distmap, max_iterations=100):
-    best_solution = solution
-    best_distance = total_distance(solution, distmap)
+    best_solution = [int(x) for x in solution]
+    lookup = distance_lookup(distmap)
+    best_distance = sum(lookup[a][b] for a, b in zip(best_solution, best_solution[1:]))
 
     for _ in range(max_iterations):
         improved = False
-        for i in range(1, len(solution) - 2):
-            for j in range(i + 1, min(i + 20, len(solution) - 1)):
-                delta = calculate_2opt_delta(solution, distmap, i, j)
+        for i in range(1, len(best_solution) - 2):
+            for j in range(i + 1, min(i + 20, len(best_solution) - 1)):
+                delta = two_opt_delta(best_solution, lookup, i, j)
                 if delta < 0:
-                    best_solution = solution[:i] + solution[i:j][::-1] + solution[j:]
+                    apply_two_opt(best_solution, i, j)
                     best_distance += delta
                     improved = True
                     break
@@ -76,65 +97,67 @@ def local_search(solution, distmap, max_iterations=100):
         if not improved:
             break
 
-    return best_solution
-
+    return best_solution, best_distance
 
-def calculate_2opt_delta(solution, distmap, i, j):
-    a, b = solution[i - 1], solution[i]
-    c, d = solution[j], solution[j + 1]
-    return (distmap[a][c] + distmap[b][d]) - (distmap[a][b] + distmap[c][d])
 
-
-def Hybrid_Metaheuristic_algorithm(distmap, colony_size, max_iterations, initial_solutions):
+def Hybrid_Metaheuristic_algorithm(distmap, colony_size, max_iterations, initial_solutions, budget=None,
+                                   trace=None, migration=None):
+    # budget 為 anytime.SolverBudget，每次迭代檢查一次停止條件；trace 為 ConvergenceTrace
+    # migration 為島嶼模型的遷移通道 (island.RingMigration)，每隔 migration.interval 次迭代交換精英路徑
     num_cities = len(distmap)
     elite_size = min(len(initial_solutions), max(2, int(0.05 * colony_size)))
 
-    food_sources = initial_solutions[:elite_size]
+    # 族群存成 (colony_size × N+1) 的 NumPy 陣列，前 elite_size 條為貪婪初始解
+    food_sources = np.empty((colony_size, num_cities + 1), dtype=np.intp)
+    food_sources[:elite_size] = initial_solutions[:elite_size]
+    food_sources[elite_size:] = random_population(colony_size - elite_size, num_cities)
 
-    for _ in range(colony_size - elite_size):
-        new_solution = list(range(num_cities)) + [0]
-        random.shuffle(new_solution[1:-1])
-        food_sources.append(new_solution)
+    # 每個食物源的路徑長度隨移動累加更新，不再整條重算
+    lookup = distance_lookup(distmap)
+    distances = batch_total_distance(food_sources, distmap)
 
-    best_solution = min(food_sources, key=lambda x: total_distance(x, distmap))
-    best_distance = total_distance(best_solution, distmap)
+    best_index = int(distances.argmin())
+    best_solution = food_sources[best_index].copy()
+    best_distance = distances[best_index].item()
 
-    iteration_distances = [(0, best_distance)]
-    start_time = time.time()
+    if trace is None:
+        trace = ConvergenceTrace()
+    trace.start()
+    trace.record(0, best_distance)
+    if budget is not None:
+        budget.improved(best_solution, best_distance)
 
     best_iteration = 0
     stagnation_counter = 0
+    iteration = -1
 
     for iteration in range(max_iterations):
-        ranked_bees = rank_bees(food_sources, distmap)
+        ranked_bees = rank_bees(distances)
 
         # 第一階段：差分進化
         for i in range(colony_size):
-            mutant = differential_mutation(food_sources, i, ranked_bees, distmap)
-            if total_distance(mutant, distmap) < total_distance(food_sources[i], distmap):
-                food_sources[i] = mutant
+            swaps = differential_mutation(food_sources, i, ranked_bees, distmap)
+            distances[i] += apply_mutation(food_sources[i], swaps, lookup)
 
         # 第二階段：近鄰搜索
         for i in range(colony_size):
-            neighbor = generate_neighbor(food_sources[i])
-            if total_distance(neighbor, distmap) < total_distance(food_sources[i], distmap):
-                food_sources[i] = neighbor
+            a, b = random_segment(food_sources[i])
+            delta = two_opt_delta(food_sources[i], lookup, a, b)
+            if delta < 0:
+                apply_two_opt(food_sources[i], a, b)
+                distances[i] += delta
 
         # 淘汰和重新初始化
-        fitnesses = [1 / (1 + total_distance(source, distmap)) for source in food_sources]
-        total_fitness = sum(fitnesses)
-        probabilities = [fit / total_fitness for fit in fitnesses]
-
-        for i in range(colony_size):
-            if i in ranked_bees[colony_size // 2:]:
-                if random.random() < 0.2:
-                    food_sources[i] = list(range(num_cities)) + [0]
-                    random.shuffle(food_sources[i][1:-1])
-
-        current_best = min(food_sources, key=lambda x: total_distance(x, distmap))
-        current_best_distance = total_distance(current_best, distmap)
+        worst_half = ranked_bees[colony_size // 2:]
+        resets = worst_half[np.random.random(len(worst_half)) < 0.2]
+        if len(resets):
+            food_sources[resets] = random_population(len(resets), num_cities)
+            distances[resets] = batch_total_distance(food_sources[resets], distmap)
+
+        current_index = int(distances.argmin())
+        current_best_distance = distances[current_index].item()
         if current_best_distance < best_distance:
-            best_solution = current_best
+            best_solution = food_sources[current_index].copy()
             best_distance = current_best_distance
             best_iteration = iteration + 1
             stagnation_counter = 0
@@ -143,21 +166,48 @@ def Hybrid_Metaheuristic_algorithm(distmap, colony_size, max_iterations, initial
 
         # 定期進行局部搜索
         if iteration % 100 == 0 or (iteration > max_iterations * 0.8 and iteration % 10 == 0):
-            best_solution = local_search(best_solution, distmap)
-            best_distance = total_distance(best_solution, distmap)
+            best_solution, best_distance = local_search(best_solution, distmap)
+        if budget is not None:
+            budget.improved(best_solution, best_distance)
 
         # 保留精英解
         elite_size = max(2, int(0.05 * colony_size))
-        food_sources = sorted(food_sources, key=lambda x: total_distance(x, distmap))
+        order = np.argsort(distances, kind='stable')
+        food_sources = food_sources[order]
+        distances = distances[order]
         food_sources[-elite_size:] = food_sources[:elite_size]
+        distances[-elite_size:] = distances[:elite_size]
+
+        # 送出目前最佳的幾條路徑 (第一條為含局部搜索結果的最佳解)，收到的路徑取代族群中最差的路徑
+        # 精英保留後族群尾端是精英的複本，因此依路徑長度找出最差的位置，而不是直接覆蓋尾端
+        if migration is not None and (iteration + 1) % migration.interval == 0:
+            emigrants = food_sources[:migration.size].copy()
+            emigrants[0] = best_solution
+            immigrants = migration.exchange(emigrants)
+            if immigrants is not None and len(immigrants):
+                immigrants = immigrants[:colony_size // 2]
+                worst = np.argsort(distances, kind='stable')[-len(immigrants):]
+                food_sources[worst] = immigrants
+                distances[worst] = batch_total_distance(immigrants, distmap)
+                current_index = int(distances.argmin())
+                if distances[current_index] < best_distance:
+                    best_solution = food_sources[current_index].copy()
+                    best_distance = distances[current_index].item()
+                    best_iteration = iteration + 1
+                    if budget is not None:
+                        budget.improved(best_solution, best_distance)
+
+        trace.record(iteration + 1, best_distance)
+
+        # 每次迭代評估 2 × colony_size 個鄰居與重新初始化的路徑
+        if budget is not None and budget.spend(2 * colony_size + len(resets)):
+            break
 
-        current_time = time.time() - start_time
-        iteration_distances.append((current_time, best_distance))
-
-    return best_solution, best_distance, iteration_distances, best_iteration
+    trace.finish(iteration + 1, best_distance)
+    return best_solution, best_distance, trace, best_iteration
 
 
-def run_hm(distmap, colony_size=None, max_iterations=None):
+def run_hm(distmap, colony_size=None, max_iterations=None, budget=None, trace=None):
     start_time = time.time()  # 開始計時
 
     num_cities = len(distmap)
@@ -171,8 +221,8 @@ def run_hm(distmap, colony_size=None, max_iterations=None):
     initial_solutions = multi_start_greedy(distmap, num_starts)
 
     start_memory = get_memory_usage()
-    best_solution, best_distance, iteration_distances, best_iteration = Hybrid_Metaheuristic_algorithm(
-        distmap, colony_size, max_iterations, initial_solutions)
+    best_solution, best_distance, trace, best_iteration = Hybrid_Metaheuristic_algorithm(
+        distmap, colony_size, max_iterations, initial_solutions, budget, trace)
     end_memory = get_memory_usage()
     memory_used = end_memory - start_memory
 
@@ -181,4 +231,4 @@ def run_hm(distmap, colony_size=None, max_iterations=None):
     end_time = time.time()  # 結束計時
     total_time = end_time - start_time  # 計算總執行時間
 
-    return best_solution, best_distance, iteration_distances, best_iteration, memory_used, total_time
+    return best_solution, best_distance, trace, best_iteration, memory_used, total_time
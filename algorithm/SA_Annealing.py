@@ -1,7 +1,8 @@
 import math
 import random
-import time
 from utils import total_distance, dsd_optimization, get_memory_usage
+from moves import distance_lookup, random_swap, swap_delta, apply_swap
+from convergence import ConvergenceTrace
 
 # SA參數設置
 SA_PARAMS = {
@@ -12,62 +13,66 @@ SA_PARAMS = {
 }
 
 
-def inversion(route):
-    copy = route.copy()
-    i, j = random.sample(range(1, len(route) - 1), 2)
-    copy[i], copy[j] = copy[j], copy[i]
-    return copy
-
-
-def simulated_annealing(route, distmap):
+def simulated_annealing(route, distmap, budget=None, trace=None):
+    # budget 為 anytime.SolverBudget，每個溫度檢查一次停止條件；None 時依溫度排程執行到底
+    # trace 為 ConvergenceTrace，內層迴圈只在找到更佳解時記錄，每個溫度結束時再交由 stride 取樣目前的路徑長度
     t0 = SA_PARAMS['t0']
     tmin = SA_PARAMS['tmin']
     k = SA_PARAMS['k']
     coolnum = SA_PARAMS['coolnum']
 
     t = t0
-    current_route = route
+    lookup = distance_lookup(distmap)
+    current_route = list(route)
     current_distance = total_distance(current_route, distmap)
-    best_route = current_route
+    best_route = current_route.copy()
     best_distance = current_distance
     iteration_count = 0
     best_iteration = 0
 
-    evetime_distance = [(0, current_distance)]
-    start_time = time.time()
+    if trace is None:
+        trace = ConvergenceTrace()
+    trace.start()
+    trace.record(0, current_distance)
+    if budget is not None:
+        budget.improved(best_route, best_distance)
 
     while t > tmin:
         for _ in range(k):
             iteration_count += 1
-            new_route = inversion(current_route)
-            new_distance = total_distance(new_route, distmap)
-            diff = new_distance - current_distance
+            # 交換兩個城市，只計算受影響邊的差值
+            i, j = random_swap(current_route)
+            diff = swap_delta(current_route, lookup, i, j)
 
             if diff < 0 or random.random() < math.exp(-diff / t):
-                current_route = new_route
-                current_distance = new_distance
+                apply_swap(current_route, i, j)
+                current_distance += diff
 
                 if current_distance < best_distance:
-                    best_route = current_route
+                    best_route = current_route.copy()
                     best_distance = current_distance
                     best_iteration = iteration_count
+                    trace.record(iteration_count, best_distance)
+                    if budget is not None:
+                        budget.improved(best_route, best_distance)
 
-            current_time = time.time() - start_time
-            evetime_distance.append((current_time, current_distance))
-
+        trace.record(iteration_count, current_distance)
         t *= coolnum
+        if budget is not None and budget.spend(k):
+            break
 
-    return best_route, best_distance, best_iteration, evetime_distance
+    trace.finish(iteration_count, current_distance)
+    return best_route, best_distance, best_iteration, trace
 
 
-def run_sa(distmap):
+def run_sa(distmap, budget=None, trace=None):
     num_cities = len(distmap)
     initial_route, initial_distance = dsd_optimization(distmap)
 
     start_memory = get_memory_usage()
 
-    best_route, best_distance, best_iteration, evetime_distance = simulated_annealing(initial_route, distmap)
+    best_route, best_distance, best_iteration, trace = simulated_annealing(initial_route, distmap, budget, trace)
     end_memory = get_memory_usage()
     memory_used = end_memory - start_memory
 
-    return best_route, best_distance, best_iteration, evetime_distance, memory_used
+    return best_route, best_distance, best_iteration, trace, memory_used
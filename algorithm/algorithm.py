@@ -1,35 +1,37 @@
 import os
 import sys
 import time
-from concurrent.futures import ThreadPoolExecutor
 
 import psutil
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from utils import create_output_directory, create_distmap, dsd_optimization, knn_with_two_opt
-from ABC_Bee import run_abc
-from SA_Annealing import run_sa
-from Metaheuristic import run_hm
 from DP_TSP import run_dp
+from benchmark import run_benchmark, best_results, summarize_benchmark
 from plotting import plot_results, plot_iterations_vs_distance, plot_hm_abc_comparison, plot_route
+from map.geo_distance import load_real_distmap, route_directions
+
+DP_MAX_CITIES = 20  # DP表大小為 n·2^n，超過此城市數則略過DP
 
 
 def save_results_to_file(
         dp_best_route, dp_best_distance, dp_execution_time, dp_memory_used,
         sa_best_route, sa_best_distance, sa_execution_time, sa_memory_used,
         abc_best_route, abc_best_distance, abc_execution_time, abc_memory_used,
-        hm_best_route, hm_best_distance, hm_execution_time, hm_memory_used):
+        hm_best_route, hm_best_distance, hm_execution_time, hm_memory_used,
+        lk_best_route, lk_best_distance, lk_execution_time, lk_memory_used):
     """將計算結果保存到 output 目錄下的文件中"""
     output_dir = create_output_directory()
     result_file = os.path.join(output_dir, "algorithm_results.txt")
 
     with open(result_file, 'w', encoding="utf-8") as f:
-        f.write(f'DP最終路徑: {dp_best_route}\n')
-        f.write(f'DP最終距離: {dp_best_distance}\n')
-        f.write(f'DP執行時間: {dp_execution_time:.2f} 毫秒\n')
-        f.write(f'DP執行時間 (分秒): {milliseconds_to_minutes_seconds(dp_execution_time)}\n')
-        f.write(f'DP內存使用: {dp_memory_used / 1024:.2f} KB\n')
+        if dp_best_route is not None:
+            f.write(f'DP最終路徑: {dp_best_route}\n')
+            f.write(f'DP最終距離: {dp_best_distance}\n')
+            f.write(f'DP執行時間: {dp_execution_time:.2f} 毫秒\n')
+            f.write(f'DP執行時間 (分秒): {milliseconds_to_minutes_seconds(dp_execution_time)}\n')
+            f.write(f'DP內存使用: {dp_memory_used / 1024:.2f} KB\n')
         f.write(f'SA最終路徑: {sa_best_route}\n')
         f.write(f'SA最終距離: {sa_best_distance}\n')
         f.write(f'SA執行時間: {sa_execution_time:.2f} 毫秒\n')
@@ -45,6 +47,11 @@ def save_results_to_file(
         f.write(f'HM執行時間: {hm_execution_time:.2f} 毫秒\n')
         f.write(f'HM執行時間 (分秒): {milliseconds_to_minutes_seconds(hm_execution_time)}\n')
         f.write(f'HM內存使用: {hm_memory_used / 1024:.2f} KB\n')
+        f.write(f'LK最終路徑: {lk_best_route}\n')
+        f.write(f'LK最終距離: {lk_best_distance}\n')
+        f.write(f'LK執行時間: {lk_execution_time:.2f} 毫秒\n')
+        f.write(f'LK執行時間 (分秒): {milliseconds_to_minutes_seconds(lk_execution_time)}\n')
+        f.write(f'LK內存使用: {lk_memory_used / 1024:.2f} KB\n')
 
     print(f"算法計算結果已保存至: {result_file}")
 
@@ -90,25 +97,40 @@ def save_results(
         f.write(f'HM內存使用: {hm_memory_used / 1024:.2f} KB\n')
 
 
-def main():
+def main(use_places=False, float32=False):
     print("Algorithm execution completed successfully.")
-    N = 10  # 城市數量
-    distmap = create_distmap(N)
-    distmap = distmap.astype(int)
-
-    print("距離矩陣：(KM)")
-    print("   ", end="")
-    for i in range(N):
-        print("{0:02d}".format(i), end=" ")
-    print()
-    for i in range(N):
-        print(f"{i:2}", end=" ")
-
-        for j in range(N):
-            # print(f"{distmap[i][j]:3}", end=" ")
-            print("{0:02d}".format(distmap[i][j]), end=" ")
-
+    REPEATS = 1  # 每個演算法以不同種子重複執行的次數
+
+    if use_places:
+        # 以 config.ini 的起點與 output 中的店家座標建立實際距離矩陣 (米)
+        project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        distmap, place_names, bearingmap = load_real_distmap(create_output_directory(),
+                                                             os.path.join(project_dir, 'config.ini'), float32,
+                                                             bearings=True)
+        N = len(distmap)
+
+        print(f"距離矩陣：(M) 共 {N} 個地點，城市0為起點")
+        for i, name in enumerate(place_names):
+            print(f"{i:2} {name}")
+    else:
+        bearingmap = None  # 隨機距離矩陣沒有座標，不計算方位
+        N = 10  # 城市數量
+        distmap = create_distmap(N)
+        distmap = distmap.astype(int)
+
+        print("距離矩陣：(KM)")
+        print("   ", end="")
+        for i in range(N):
+            print("{0:02d}".format(i), end=" ")
         print()
+        for i in range(N):
+            print(f"{i:2}", end=" ")
+
+            for j in range(N):
+                # print(f"{distmap[i][j]:3}", end=" ")
+                print("{0:02d}".format(distmap[i][j]), end=" ")
+
+            print()
     print('=' * 50)
 
     if N < 10:
@@ -127,86 +149,109 @@ def main():
 
     print('=' * 50)
 
-    # 執行DP算法
-    start_memory_dp = get_memory_usage()
-    dp_best_route, dp_best_distance, dp_execution_time = run_dp(distmap)
-    end_memory_dp = get_memory_usage()
-    dp_memory_used = end_memory_dp - start_memory_dp
-
-    with ThreadPoolExecutor(max_workers=3) as executor:
-        sa_future = executor.submit(run_sa, distmap)
-        abc_future = executor.submit(run_abc, distmap, 50, 1000)
-        hm_future = executor.submit(run_hm, distmap, 50, 1000)
-
-        sa_result = sa_future.result()
-        abc_result = abc_future.result()
-        hm_result = hm_future.result()
-
-    sa_best_route, sa_best_distance, sa_best_iteration, sa_evetime_distance, sa_memory_used = sa_result
-    abc_best_route, abc_best_distance, abc_evetime_distance, abc_best_iteration, abc_memory_used = abc_result
-    hm_best_route, hm_best_distance, hm_evetime_distance, hm_best_iteration, hm_memory_used, hm_total_time = hm_result
-
-    sa_best_time = sa_evetime_distance[sa_best_iteration][0] * 1000
-    abc_best_time = abc_evetime_distance[abc_best_iteration][0] * 1000
-    hm_best_time = hm_evetime_distance[hm_best_iteration][0] * 1000
-
-    sa_execution_time = sa_evetime_distance[-1][0] * 1000
-    abc_execution_time = abc_evetime_distance[-1][0] * 1000
-    hm_execution_time = hm_evetime_distance[-1][0] * 1000
-
-    print('DP最終路徑:', dp_best_route)
-    print('DP最終距離:', dp_best_distance)
-    print(f'DP執行時間: {dp_execution_time:.2f} 毫秒')
-    print(f'DP執行時間 (分秒): {milliseconds_to_minutes_seconds(dp_execution_time)}')
-    print(f'DP算法內存使用: {dp_memory_used / 1024:.2f} KB')
+    # 執行DP算法 (內存使用為DP表與回溯表的實際大小)
+    if N <= DP_MAX_CITIES:
+        dp_best_route, dp_best_distance, dp_execution_time, dp_memory_used = run_dp(distmap)
+    else:
+        dp_best_route, dp_best_distance, dp_execution_time, dp_memory_used = None, None, 0, 0
+
+    # SA、ABC、HM、LK 各自在獨立進程中執行 (每個演算法重複 REPEATS 次，取最佳一次)
+    benchmark_results = run_benchmark(distmap, ('SA', 'ABC', 'HM', 'LK'), repeats=REPEATS)
+    best = best_results(benchmark_results)
+
+    sa_best_route, sa_best_distance, sa_best_iteration, sa_trace, _ = best['SA']['result']
+    abc_best_route, abc_best_distance, abc_trace, abc_best_iteration, _ = best['ABC']['result']
+    hm_best_route, hm_best_distance, hm_trace, hm_best_iteration, _, hm_total_time = best['HM']['result']
+    lk_best_route, lk_best_distance, lk_trace, lk_best_iteration, _, lk_total_time = best['LK']['result']
+
+    # 內存使用改為各進程的峰值 RSS
+    sa_memory_used = best['SA']['peak_rss']
+    abc_memory_used = best['ABC']['peak_rss']
+    hm_memory_used = best['HM']['peak_rss']
+    lk_memory_used = best['LK']['peak_rss']
+
+    # 收斂紀錄的時間單位為毫秒
+    sa_best_time = sa_trace.best_time_ms()
+    abc_best_time = abc_trace.best_time_ms()
+    hm_best_time = hm_trace.best_time_ms()
+    lk_best_time = lk_trace.best_time_ms()
+
+    sa_execution_time = sa_trace.total_time_ms()
+    abc_execution_time = abc_trace.total_time_ms()
+    hm_execution_time = hm_trace.total_time_ms()
+    lk_execution_time = lk_trace.total_time_ms()
+
+    if dp_best_route is not None:
+        print('DP最終路徑:', dp_best_route)
+        print('DP最終距離:', dp_best_distance)
+        print(f'DP執行時間: {dp_execution_time:.2f} 毫秒')
+        print(f'DP執行時間 (分秒): {milliseconds_to_minutes_seconds(dp_execution_time)}')
+        print(f'DP算法內存使用 (DP表大小): {dp_memory_used / 1024:.2f} KB')
+    else:
+        print(f'DP已略過: 城市數 {N} 超過 {DP_MAX_CITIES}')
     print('=' * 50)
     print('SA最終路徑:', [int(x) for x in sa_best_route])
     print('SA最終距離:', sa_best_distance)
     print(f'SA得出最終距離的最少迭代次數: {sa_best_iteration}')
     print(f'SA算法得到最佳解時間: {sa_best_time:.2f} 毫秒')
     print(f'SA算法得到最佳解時間 (分秒): {milliseconds_to_minutes_seconds(sa_best_time)}')
-    print(f'SA算法內存使用: {sa_memory_used / 1024:.2f} KB')
+    print(f'SA算法峰值內存: {sa_memory_used / 1024:.2f} KB')
     print('=' * 50)
     print('ABC最終路徑:', abc_best_route)
     print('ABC最終距離:', abc_best_distance)
     print(f'ABC得出最終距離的最少迭代次數: {abc_best_iteration}')
     print(f'ABC算法得到最佳解時間: {abc_best_time:.2f} 毫秒')
     print(f'ABC算法得到最佳解時間 (分秒): {milliseconds_to_minutes_seconds(abc_best_time)}')
-    print(f'ABC算法內存使用: {abc_memory_used / 1024:.2f} KB')
+    print(f'ABC算法峰值內存: {abc_memory_used / 1024:.2f} KB')
     print('=' * 50)
     print('HM最終路徑:', hm_best_route)
     print('HM最終距離:', hm_best_distance)
+    if bearingmap is not None:
+        print('HM路徑方位:', ' → '.join(route_directions(hm_best_route, bearingmap)))
     print(f'HM得出最終距離的最少迭代次數: {hm_best_iteration}')
     print(f'HM算法得到最佳解時間: {hm_best_time:.2f} 毫秒')
     print(f'HM算法得到最佳解時間 (分秒): {milliseconds_to_minutes_seconds(hm_best_time)}')
-    print(f'HM算法內存使用: {hm_memory_used / 1024:.2f} KB')
+    print(f'HM算法峰值內存: {hm_memory_used / 1024:.2f} KB')
     print(f'HM算法總計算時間 (分秒): {milliseconds_to_minutes_seconds(hm_total_time * 1000)}')
-
+    print('=' * 50)
+    print('LK最終路徑:', lk_best_route)
+    print('LK最終距離:', lk_best_distance)
+    print(f'LK得出最終距離的最少迭代次數: {lk_best_iteration}')
+    print(f'LK算法得到最佳解時間: {lk_best_time:.2f} 毫秒')
+    print(f'LK算法得到最佳解時間 (分秒): {milliseconds_to_minutes_seconds(lk_best_time)}')
+    print(f'LK算法峰值內存: {lk_memory_used / 1024:.2f} KB')
+    print(f'LK算法總計算時間 (分秒): {milliseconds_to_minutes_seconds(lk_total_time * 1000)}')
+    print('=' * 50)
+    for line in summarize_benchmark(benchmark_results):
+        print(line)
     print('=' * 50)
 
-    plot_hm_abc_comparison(hm_evetime_distance, abc_evetime_distance,
+    plot_hm_abc_comparison(hm_trace, abc_trace,
                            hm_best_distance, abc_best_distance,
                            hm_best_iteration, abc_best_iteration)
 
-    plot_results(sa_evetime_distance, abc_evetime_distance, hm_evetime_distance,
-                 sa_best_distance, abc_best_distance, hm_best_distance,
-                 sa_best_iteration, abc_best_iteration, hm_best_iteration)
+    plot_results(sa_trace, abc_trace, hm_trace, lk_trace,
+                 sa_best_distance, abc_best_distance, hm_best_distance, lk_best_distance,
+                 sa_best_iteration, abc_best_iteration, hm_best_iteration, lk_best_iteration)
 
-    plot_iterations_vs_distance(sa_evetime_distance, abc_evetime_distance, hm_evetime_distance,
-                                sa_best_distance, abc_best_distance, hm_best_distance,
-                                sa_best_iteration, abc_best_iteration, hm_best_iteration)
+    plot_iterations_vs_distance(sa_trace, abc_trace, hm_trace, lk_trace,
+                                sa_best_distance, abc_best_distance, hm_best_distance, lk_best_distance,
+                                sa_best_iteration, abc_best_iteration, hm_best_iteration, lk_best_iteration)
 
     # plot_route(distmap, dp_best_route, "DP算法最佳路径")
     plot_route(distmap, sa_best_route, "SA算法最佳路径")
     plot_route(distmap, abc_best_route, "ABC算法最佳路径")
     plot_route(distmap, hm_best_route, "HM算法最佳路径")
+    plot_route(distmap, lk_best_route, "LK算法最佳路径")
 
     save_results_to_file(
         dp_best_route, dp_best_distance, dp_execution_time, dp_memory_used,
         sa_best_route, sa_best_distance, sa_execution_time, sa_memory_used,
         abc_best_route, abc_best_distance, abc_execution_time, abc_memory_used,
-        hm_best_route, hm_best_distance, hm_execution_time, hm_memory_used)
+        hm_best_route, hm_best_distance, hm_execution_time, hm_memory_used,
+        lk_best_route, lk_best_distance, lk_execution_time, lk_memory_used)
 
 
 if __name__ == "__main__":
-    main()
+    # --places: 使用實際店家座標的距離矩陣；--float32: 大型矩陣以 float32 儲存
+    main(use_places='--places' in sys.argv, float32='--float32' in sys.argv)
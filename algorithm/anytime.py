@@ -0,0 +1,115 @@
+import queue
+import threading
+import time
+
+from ABC_Bee import run_abc
+from Metaheuristic import run_hm
+from SA_Annealing import run_sa
+from tempering import run_pt
+
+# 支援時間預算的演算法: 名稱 -> 函數 (皆接受 budget 參數)
+ANYTIME_SOLVERS = {
+    'SA': run_sa,
+    'ABC': run_abc,
+    'HM': run_hm,
+    'PT': run_pt,
+}
+
+
+class SolverBudget:
+    # 演算法共用的停止條件，任一條件達成即停止並回傳目前最佳解:
+    # deadline_ms 由建立時起算的時間上限、max_evals 路徑評估次數上限、target_distance 找到不超過此長度的路徑
+    # on_improve(路徑, 距離, 經過毫秒, 評估次數) 在每次找到更佳路徑時呼叫 (包含初始解)
+    # cancel 為 threading.Event，由其他執行緒設定後提前停止
+    # 演算法每輪 (SA 為每個溫度，ABC / HM 為每次迭代，PT 為每個交換回合) 呼叫一次 spend，因此時間上限的誤差為一輪的時間
+
+    def __init__(self, deadline_ms=None, max_evals=None, target_distance=None, on_improve=None, cancel=None):
+        self.start = time.perf_counter()
+        self.deadline = None if deadline_ms is None else self.start + deadline_ms / 1000
+        self.max_evals = max_evals
+        self.target_distance = target_distance
+        self.on_improve = on_improve
+        self.cancel = cancel
+        self.evals = 0
+        self.best_distance = float('inf')
+        self.improvements = 0
+        self.stop_reason = None
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.start) * 1000
+
+    def improved(self, route, distance):
+        if distance >= self.best_distance:
+            return
+        self.best_distance = distance
+        self.improvements += 1
+        if self.on_improve is not None:
+            self.on_improve([int(city) for city in route], float(distance), self.elapsed_ms(), self.evals)
+
+    def spend(self, evals):
+        # 累計評估次數，回傳 True 表示應該停止
+        self.evals += evals
+        return self.should_stop()
+
+    def should_stop(self):
+        # 不累計評估次數，只檢查停止條件 (停止原因記錄在 stop_reason)
+        if self.stop_reason is None:
+            if self.target_distance is not None and self.best_distance <= self.target_distance:
+                self.stop_reason = 'target'
+            elif self.max_evals is not None and self.evals >= self.max_evals:
+                self.stop_reason = 'max_evals'
+            elif self.deadline is not None and time.perf_counter() >= self.deadline:
+                self.stop_reason = 'deadline'
+            elif self.cancel is not None and self.cancel.is_set():
+                self.stop_reason = 'cancelled'
+        return self.stop_reason is not None
+
+
+def solve(distmap, solver='HM', deadline_ms=None, max_evals=None, target_distance=None, on_improve=None,
+          cancel=None, **solver_kwargs):
+    # 以共同介面執行 SA / ABC / HM / PT，回傳最佳路徑、距離、評估次數、耗時 (毫秒) 與停止原因
+    # 停止原因為 deadline / max_evals / target / cancelled，演算法依原本的排程自行結束時為 finished
+    budget = SolverBudget(deadline_ms, max_evals, target_distance, on_improve, cancel)
+    result = ANYTIME_SOLVERS[solver](distmap, budget=budget, **solver_kwargs)
+    return {
+        'solver': solver,
+        'route': [int(city) for city in result[0]],
+        'distance': float(result[1]),
+        'evals': budget.evals,
+        'improvements': budget.improvements,
+        'elapsed_ms': budget.elapsed_ms(),
+        'stop_reason': budget.stop_reason or 'finished',
+    }
+
+
+def improvements(distmap, solver='HM', deadline_ms=None, max_evals=None, target_distance=None, **solver_kwargs):
+    # 產生器版本: 演算法在背景執行緒中執行，每找到更佳路徑就產出 (路徑, 距離, 經過毫秒, 評估次數)
+    # 呼叫端可隨時停止迭代，演算法會在下一次檢查停止條件時結束
+    updates = queue.Queue()
+    cancelled = threading.Event()
+    done = object()
+
+    def on_improve(route, distance, elapsed, evals):
+        updates.put((route, distance, elapsed, evals))
+
+    def worker():
+        try:
+            solve(distmap, solver, deadline_ms, max_evals, target_distance, on_improve, cancelled, **solver_kwargs)
+        except Exception as e:
+            updates.put(e)
+        finally:
+            updates.put(done)
+
+    thread = threading.Thread(target=worker, name=f'{solver}-anytime', daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = updates.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        cancelled.set()
+        thread.join()
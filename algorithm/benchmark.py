@@ -0,0 +1,108 @@
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from utils import get_peak_memory_usage
+from ABC_Bee import run_abc
+from SA_Annealing import run_sa
+from Metaheuristic import run_hm
+from LK_Chained import run_lk
+
+# 可在進程池中執行的演算法: 名稱 -> (函數, 預設參數)
+SOLVERS = {
+    'SA': (run_sa, {}),
+    'ABC': (run_abc, {'colony_size': 50, 'max_iterations': 1000}),
+    'HM': (run_hm, {'colony_size': 50, 'max_iterations': 1000}),
+    'LK': (run_lk, {}),
+}
+
+
+def share_distmap(distmap):
+    # 將距離矩陣複製到共享記憶體，只複製一次，所有子進程直接映射使用
+    distmap = np.ascontiguousarray(distmap)
+    block = shared_memory.SharedMemory(create=True, size=max(distmap.nbytes, 1))
+    view = np.ndarray(distmap.shape, dtype=distmap.dtype, buffer=block.buf)
+    view[:] = distmap
+    del view
+    return block, (block.name, distmap.shape, distmap.dtype.str)
+
+
+def _run_solver(spec, solver, seed, kwargs):
+    random.seed(seed)
+    np.random.seed(seed)
+
+    func, defaults = SOLVERS[solver]
+    params = {**defaults, **kwargs}
+
+    # 依名稱映射共享記憶體，不經過 pickle 複製距離矩陣
+    name, shape, dtype = spec
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        distmap = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        result = func(distmap, **params)
+        cpu_time = time.process_time() - cpu_start
+        wall_time = time.perf_counter() - wall_start
+        del distmap
+    finally:
+        block.close()
+
+    return {
+        'solver': solver,
+        'seed': seed,
+        'route': [int(x) for x in result[0]],
+        'distance': result[1],
+        'result': result,
+        'wall_time': wall_time * 1000,  # 毫秒
+        'cpu_time': cpu_time * 1000,  # 毫秒
+        'peak_rss': get_peak_memory_usage(),
+    }
+
+
+def run_benchmark(distmap, solvers=('SA', 'ABC', 'HM', 'LK'), repeats=1, base_seed=None, max_workers=None,
+                  solver_kwargs=None):
+    # 每個 (演算法, 種子) 在獨立進程中執行，不受 GIL 與彼此影響
+    # max_tasks_per_child=1: 每個任務使用全新進程，峰值 RSS 才是該任務自己的數值
+    if base_seed is None:
+        base_seed = random.randrange(2 ** 31)
+    solver_kwargs = solver_kwargs or {}
+
+    block, spec = share_distmap(distmap)
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers, max_tasks_per_child=1) as executor:
+            futures = [executor.submit(_run_solver, spec, solver, base_seed + r, solver_kwargs.get(solver, {}))
+                       for solver in solvers for r in range(repeats)]
+            results = [future.result() for future in futures]
+    finally:
+        block.close()
+        block.unlink()
+
+    return results
+
+
+def best_results(results):
+    # 每個演算法取距離最短的一次執行
+    best = {}
+    for item in results:
+        current = best.get(item['solver'])
+        if current is None or item['distance'] < current['distance']:
+            best[item['solver']] = item
+    return best
+
+
+def summarize_benchmark(results):
+    lines = []
+    for solver in dict.fromkeys(item['solver'] for item in results):
+        runs = [item for item in results if item['solver'] == solver]
+        distances = np.array([item['distance'] for item in runs], dtype=float)
+        wall = np.array([item['wall_time'] for item in runs])
+        cpu = np.array([item['cpu_time'] for item in runs])
+        peak = max(item['peak_rss'] for item in runs)
+        lines.append(f"{solver} ({len(runs)}次) 距離 平均 {distances.mean():.2f} / 最佳 {distances.min():.2f} / "
+                     f"最差 {distances.max():.2f} | 牆鐘時間 {wall.mean():.2f} 毫秒 | CPU時間 {cpu.mean():.2f} 毫秒 | "
+                     f"峰值RSS {peak / (1024 * 1024):.2f} MB")
+    return lines
@@ -0,0 +1,88 @@
+import time
+
+import numpy as np
+
+TRACE_STRIDE = 100  # 路徑長度沒有改善時，每隔多少次迭代記錄一筆
+TRACE_CAPACITY = 1024  # 預先配置的筆數，不夠時加倍
+
+
+class ConvergenceTrace:
+    # 演算法的收斂紀錄: (迭代次數, 經過時間, 路徑長度) 存放在預先配置的 NumPy 陣列
+    # 只在路徑長度低於已記錄的最小值、或距上一筆滿 stride 次迭代時記錄，時間以 perf_counter_ns 計
+    # enabled=False 時不記錄任何資料，只保留總執行時間
+
+    def __init__(self, stride=TRACE_STRIDE, capacity=TRACE_CAPACITY, enabled=True):
+        self.stride = max(1, int(stride))
+        self.enabled = enabled
+        capacity = capacity if enabled else 0
+        self.iterations = np.empty(capacity, dtype=np.int64)
+        self.times = np.empty(capacity, dtype=np.int64)  # 奈秒，由 start() 起算
+        self.distances = np.empty(capacity, dtype=np.float64)
+        self.size = 0
+        self.lowest = float('inf')
+        self.last_iteration = 0
+        self.start_ns = time.perf_counter_ns()
+        self.elapsed_ns = 0
+
+    def __len__(self):
+        return self.size
+
+    def start(self):
+        self.start_ns = time.perf_counter_ns()
+
+    def record(self, iteration, distance):
+        if not self.enabled:
+            return
+        if distance < self.lowest:
+            self.lowest = distance
+        elif self.size and iteration - self.last_iteration < self.stride:
+            return
+        self.append(iteration, distance)
+
+    def append(self, iteration, distance):
+        if self.size == len(self.iterations):
+            self.grow()
+        i = self.size
+        self.iterations[i] = iteration
+        self.times[i] = time.perf_counter_ns() - self.start_ns
+        self.distances[i] = distance
+        self.size += 1
+        self.last_iteration = iteration
+
+    def grow(self):
+        capacity = max(2 * len(self.iterations), 16)
+        for name in ('iterations', 'times', 'distances'):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def finish(self, iteration, distance):
+        # 結束時一定記錄最後一筆 (總執行時間以此為準)，並截去未使用的空間以便跨進程傳遞
+        self.elapsed_ns = time.perf_counter_ns() - self.start_ns
+        if not self.enabled:
+            return
+        if not self.size or self.iterations[self.size - 1] != iteration:
+            self.append(iteration, distance)
+        self.times[self.size - 1] = self.elapsed_ns
+        self.iterations = self.iterations[:self.size].copy()
+        self.times = self.times[:self.size].copy()
+        self.distances = self.distances[:self.size].copy()
+
+    def times_ms(self):
+        return self.times[:self.size] / 1e6
+
+    def iteration_values(self):
+        return self.iterations[:self.size]
+
+    def distance_values(self):
+        return self.distances[:self.size]
+
+    def best_time_ms(self):
+        # 第一次達到最短路徑長度的時間，未記錄時為 nan
+        if not self.size:
+            return float('nan')
+        return self.times[int(self.distances[:self.size].argmin())] / 1e6
+
+    def total_time_ms(self):
+        return self.elapsed_ns / 1e6
@@ -0,0 +1,174 @@
+import multiprocessing
+import os
+import queue
+import random
+import time
+import traceback
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from anytime import SolverBudget
+from benchmark import share_distmap
+from convergence import ConvergenceTrace
+from Metaheuristic import Hybrid_Metaheuristic_algorithm, multi_start_greedy
+
+MIGRATION_INTERVAL = 50  # 每隔多少次迭代交換一次精英路徑
+MIGRANTS = 2  # 每次送往下一個島嶼的路徑數
+MAILBOX_SIZE = 4  # 每個島嶼收件匣最多暫存幾批路徑，滿了就放棄該次傳送，不等待較慢的鄰居
+
+
+class RingMigration:
+    # 環狀拓撲的遷移通道: 島嶼 i 把精英路徑送往島嶼 (i + 1) % K 的收件匣，並取出島嶼 i - 1 送來的路徑
+    # 傳送與接收都不等待，各島嶼依自己的速度迭代，鄰居還沒送來時本次不遷入
+
+    def __init__(self, inbox, outbox, interval=MIGRATION_INTERVAL, size=MIGRANTS):
+        self.inbox = inbox
+        self.outbox = outbox
+        self.interval = max(1, int(interval))
+        self.size = max(1, int(size))
+        self.sent = 0
+        self.received = 0
+
+    def exchange(self, emigrants):
+        try:
+            self.outbox.put_nowait(np.ascontiguousarray(emigrants))
+            self.sent += 1
+        except queue.Full:
+            pass
+
+        # 只採用最新的一批，較舊的批次已經過時
+        immigrants = None
+        while True:
+            try:
+                immigrants = self.inbox.get_nowait()
+            except queue.Empty:
+                break
+            self.received += 1
+        return immigrants
+
+
+def _run_island(spec, index, seed, params, inbox, outbox, results):
+    random.seed(seed)
+    np.random.seed(seed)
+    # 鄰居結束後不會再讀取收件匣，結束時捨棄尚未送出的路徑，避免進程卡在清空佇列
+    outbox.cancel_join_thread()
+
+    name, shape, dtype = spec
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        distmap = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+        num_cities = len(distmap)
+
+        # 每個島嶼以不同的城市作為貪婪法起點，族群從一開始就不相同
+        num_starts = min(num_cities, params['num_starts'])
+        initial_solutions = multi_start_greedy(distmap, num_starts, first_city=index * num_starts)
+
+        budget = None
+        if params['deadline_ms'] is not None:
+            budget = SolverBudget(deadline_ms=params['deadline_ms'])
+        # 只有一個島嶼時環狀拓撲的下一站就是自己，不進行遷移
+        migration = None
+        if params['islands'] > 1:
+            migration = RingMigration(inbox, outbox, params['migration_interval'], params['migrants'])
+        trace = ConvergenceTrace()
+
+        wall_start = time.perf_counter()
+        best_solution, best_distance, trace, best_iteration = Hybrid_Metaheuristic_algorithm(
+            distmap, params['colony_size'], params['max_iterations'], initial_solutions, budget, trace, migration)
+        wall_time = (time.perf_counter() - wall_start) * 1000
+        del distmap
+
+        results.put({
+            'island': index,
+            'seed': seed,
+            'route': [int(x) for x in best_solution],
+            'distance': float(best_distance),
+            'best_iteration': best_iteration,
+            'trace': trace,
+            'wall_time': wall_time,
+            'migrations_sent': 0 if migration is None else migration.sent,
+            'migrations_received': 0 if migration is None else migration.received,
+            'stop_reason': None if budget is None else budget.stop_reason,
+        })
+    except Exception:
+        results.put({'island': index, 'error': traceback.format_exc()})
+    finally:
+        block.close()
+
+
+def run_island_hm(distmap, islands=None, colony_size=None, max_iterations=None,
+                  migration_interval=MIGRATION_INTERVAL, migrants=MIGRANTS, base_seed=None, deadline_ms=None):
+    # 島嶼模型: islands 個 HM 族群各在獨立進程中以不同種子演化，每隔 migration_interval 次迭代
+    # 沿環狀拓撲把 migrants 條精英路徑送往下一個島嶼，取代對方最差的路徑
+    # 距離矩陣放在共享記憶體，只複製一次；回傳全域最佳路徑與每個島嶼的結果 (含收斂紀錄)
+    num_cities = len(distmap)
+    if islands is None:
+        islands = os.cpu_count() or 1
+    if colony_size is None:
+        colony_size = min(50, max(20, num_cities // 2))
+    if max_iterations is None:
+        max_iterations = min(5000, max(1000, num_cities * 20))
+    if base_seed is None:
+        base_seed = random.randrange(2 ** 31)
+
+    params = {
+        'islands': islands,
+        'colony_size': colony_size,
+        'max_iterations': max_iterations,
+        'num_starts': 20,
+        'migration_interval': migration_interval,
+        'migrants': min(migrants, colony_size // 2),
+        'deadline_ms': deadline_ms,
+    }
+
+    # spawn: 子進程不繼承父進程的執行緒與鎖 (例如 Tk 介面)，與 benchmark 的進程池一致
+    context = multiprocessing.get_context('spawn')
+    inboxes = [context.Queue(maxsize=MAILBOX_SIZE) for _ in range(islands)]
+    results = context.Queue()
+
+    start = time.perf_counter()
+    block, spec = share_distmap(distmap)
+    processes = []
+    try:
+        for i in range(islands):
+            process = context.Process(
+                target=_run_island, name=f'HM-island-{i}', daemon=True,
+                args=(spec, i, base_seed + i, params, inboxes[i], inboxes[(i + 1) % islands], results))
+            process.start()
+            processes.append(process)
+
+        # 先收結果再 join，避免子進程因結果佇列未清空而無法結束
+        collected = []
+        while len(collected) < islands:
+            try:
+                item = results.get(timeout=0.5)
+            except queue.Empty:
+                if any(process.exitcode not in (None, 0) for process in processes):
+                    raise RuntimeError("島嶼進程異常結束")
+                continue
+            if 'error' in item:
+                raise RuntimeError(f"島嶼 {item['island']} 執行失敗:\n{item['error']}")
+            collected.append(item)
+
+        for process in processes:
+            process.join()
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        block.close()
+        block.unlink()
+    wall_time = (time.perf_counter() - start) * 1000
+
+    collected.sort(key=lambda item: item['island'])
+    best = min(collected, key=lambda item: item['distance'])
+    return {
+        'route': best['route'],
+        'distance': best['distance'],
+        'best_island': best['island'],
+        'islands': collected,
+        'base_seed': base_seed,
+        'wall_time': wall_time,  # 毫秒，包含啟動進程的時間
+    }
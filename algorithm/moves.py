@@ -0,0 +1,56 @@
+import random
+
+# 路徑格式與其他演算法相同: route[0] == route[-1] == 起點，只有 1 ~ len(route)-2 的位置可以移動
+# 所有 *_delta 函數只看受影響的邊，回傳「新路徑長度 - 舊路徑長度」，不修改路徑
+# 所有 apply_* 函數直接在原路徑上修改 (list 或 NumPy 一維陣列皆可)
+# 2-opt 的差值假設距離矩陣對稱 (or-opt 只在 utils.two_opt 的環狀路徑上使用，不在此提供)
+
+
+def distance_lookup(distmap):
+    # NumPy 單一元素索引很慢，內層迴圈改用巢狀 list 查表
+    if hasattr(distmap, 'tolist'):
+        return distmap.tolist()
+    return distmap
+
+
+def random_swap(route):
+    i, j = random.sample(range(1, len(route) - 1), 2)
+    return i, j
+
+
+def random_segment(route):
+    i, j = sorted(random.sample(range(1, len(route) - 1), 2))
+    return i, j
+
+
+def swap_delta(route, distmap, i, j):
+    if i == j:
+        return 0
+    if i > j:
+        i, j = j, i
+    a, b = route[i], route[j]
+    prev_i, next_j = route[i - 1], route[j + 1]
+
+    if j == i + 1:
+        # 相鄰交換: prev_i -> a -> b -> next_j 變成 prev_i -> b -> a -> next_j
+        return (distmap[prev_i][b] + distmap[b][a] + distmap[a][next_j]
+                - distmap[prev_i][a] - distmap[a][b] - distmap[b][next_j])
+
+    next_i, prev_j = route[i + 1], route[j - 1]
+    return (distmap[prev_i][b] + distmap[b][next_i] + distmap[prev_j][a] + distmap[a][next_j]
+            - distmap[prev_i][a] - distmap[a][next_i] - distmap[prev_j][b] - distmap[b][next_j])
+
+
+def apply_swap(route, i, j):
+    route[i], route[j] = route[j], route[i]
+
+
+def two_opt_delta(route, distmap, i, j):
+    # 反轉 route[i..j] (含 j)，只改變兩端的邊
+    a, b = route[i - 1], route[i]
+    c, d = route[j], route[j + 1]
+    return (distmap[a][c] + distmap[b][d]) - (distmap[a][b] + distmap[c][d])
+
+
+def apply_two_opt(route, i, j):
+    route[i:j + 1] = route[i:j + 1][::-1]
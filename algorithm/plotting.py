@@ -8,36 +8,49 @@ sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
 
 
-def plot_results(sa_evetime_distance, abc_evetime_distance, hm_evetime_distance,
-                 sa_best_distance, abc_best_distance, hm_best_distance,
-                 sa_best_iteration, abc_best_iteration, hm_best_iteration):
+# 以下各函數的 *_trace 參數為 convergence.ConvergenceTrace (時間單位為毫秒，橫軸為實際迭代次數)
+
+
+def skip_empty_traces(**traces):
+    # 收斂紀錄停用 (enabled=False) 或演算法在記錄前就結束時沒有資料，略過圖表並回傳 True
+    missing = [name for name, trace in traces.items() if not len(trace)]
+    if missing:
+        print(f"略過圖表: {', '.join(missing)} 沒有收斂紀錄")
+    return bool(missing)
+
+
+def plot_results(sa_trace, abc_trace, hm_trace, lk_trace,
+                 sa_best_distance, abc_best_distance, hm_best_distance, lk_best_distance,
+                 sa_best_iteration, abc_best_iteration, hm_best_iteration, lk_best_iteration):
+    if skip_empty_traces(SA=sa_trace, ABC=abc_trace, HM=hm_trace, LK=lk_trace):
+        return
     plt.rcParams['font.sans-serif'] = ['Microsoft JhengHei']
     plt.rcParams['axes.unicode_minus'] = False
 
     fig, ax = plt.subplots(figsize=(15, 8))
     plt.subplots_adjust(bottom=0.2)
 
-    sa_times, sa_distances = zip(*sa_evetime_distance)
-    abc_times, abc_distances = zip(*abc_evetime_distance)
-    hm_times, hm_distances = zip(*hm_evetime_distance)
+    sa_times = sa_trace.times_ms()
+    abc_times = abc_trace.times_ms()
+    hm_times = hm_trace.times_ms()
+    lk_times = lk_trace.times_ms()
 
-    # 將時間單位從秒轉換為毫秒
-    sa_times = [t * 1000 for t in sa_times]
-    abc_times = [t * 1000 for t in abc_times]
-    hm_times = [t * 1000 for t in hm_times]
-
-    sa_line, = ax.plot(sa_times, sa_distances, linewidth=2.5, label="SA演算法", color='r')
-    abc_line, = ax.plot(abc_times, abc_distances, linewidth=2.5, label="ABC演算法", color='b')
-    hm_line, = ax.plot(hm_times, hm_distances, linewidth=2.5, label="HM演算法", color='g')
+    # 紀錄只在改善或每隔 stride 次迭代取樣，以階梯線呈現
+    sa_line, = ax.step(sa_times, sa_trace.distance_values(), where='post', linewidth=2.5, label="SA演算法", color='r')
+    abc_line, = ax.step(abc_times, abc_trace.distance_values(), where='post', linewidth=2.5, label="ABC演算法",
+                        color='b')
+    hm_line, = ax.step(hm_times, hm_trace.distance_values(), where='post', linewidth=2.5, label="HM演算法", color='g')
+    lk_line, = ax.step(lk_times, lk_trace.distance_values(), where='post', linewidth=2.5, label="LK演算法", color='m')
 
     ax.set_xlabel("計算時間 (毫秒)", fontsize=15)
     ax.set_ylabel("路徑長度", fontsize=15)
     ax.legend()
 
     # 标记最佳解的位置
-    sa_best_time = sa_times[sa_best_iteration]
-    abc_best_time = abc_times[abc_best_iteration]
-    hm_best_time = hm_times[hm_best_iteration]
+    sa_best_time = sa_trace.best_time_ms()
+    abc_best_time = abc_trace.best_time_ms()
+    hm_best_time = hm_trace.best_time_ms()
+    lk_best_time = lk_trace.best_time_ms()
 
     ax.annotate(f'SA最佳解\n時間: {sa_best_time:.2f}ms\n距離: {sa_best_distance:.2f}',
                 xy=(sa_best_time, sa_best_distance), xytext=(10, 10),
@@ -57,13 +70,19 @@ def plot_results(sa_evetime_distance, abc_evetime_distance, hm_evetime_distance,
                 bbox=dict(boxstyle='round,pad=0.5', fc='yellow', alpha=0.5),
                 arrowprops=dict(arrowstyle='->', connectionstyle='arc3,rad=0'))
 
-    plt.title("SA、ABC和HM性能比較", fontsize=20)
+    ax.annotate(f'LK最佳解\n時間: {lk_best_time:.2f}ms\n距離: {lk_best_distance:.2f}',
+                xy=(lk_best_time, lk_best_distance), xytext=(-10, -10),
+                textcoords='offset points', ha='right', va='top',
+                bbox=dict(boxstyle='round,pad=0.5', fc='yellow', alpha=0.5),
+                arrowprops=dict(arrowstyle='->', connectionstyle='arc3,rad=0'))
+
+    plt.title("SA、ABC、HM和LK性能比較", fontsize=20)
     plt.grid(True)
 
     # 添加滑块
     axcolor = 'lightgoldenrodyellow'
     ax_slider = plt.axes([0.1, 0.1, 0.8, 0.03], facecolor=axcolor)
-    max_time = max(max(sa_times), max(abc_times), max(hm_times))
+    max_time = max(max(sa_times), max(abc_times), max(hm_times), max(lk_times))
     slider = Slider(ax_slider, '起始時間', 0, max_time - 100, valinit=0, valstep=10)
 
     def update(val):
@@ -79,25 +98,24 @@ def plot_results(sa_evetime_distance, abc_evetime_distance, hm_evetime_distance,
     plt.show()
 
 
-def plot_iterations_vs_distance(sa_evetime_distance, abc_evetime_distance, hm_evetime_distance,
-                                sa_best_distance, abc_best_distance, hm_best_distance,
-                                sa_best_iteration, abc_best_iteration, hm_best_iteration):
+def plot_iterations_vs_distance(sa_trace, abc_trace, hm_trace, lk_trace,
+                                sa_best_distance, abc_best_distance, hm_best_distance, lk_best_distance,
+                                sa_best_iteration, abc_best_iteration, hm_best_iteration, lk_best_iteration):
+    if skip_empty_traces(SA=sa_trace, ABC=abc_trace, HM=hm_trace, LK=lk_trace):
+        return
     plt.rcParams['font.sans-serif'] = ['Microsoft JhengHei']
     plt.rcParams['axes.unicode_minus'] = False
 
     fig, ax = plt.subplots(figsize=(15, 8))
 
-    sa_iterations = list(range(len(sa_evetime_distance)))
-    abc_iterations = list(range(len(abc_evetime_distance)))
-    hm_iterations = list(range(len(hm_evetime_distance)))
-
-    _, sa_distances = zip(*sa_evetime_distance)
-    _, abc_distances = zip(*abc_evetime_distance)
-    _, hm_distances = zip(*hm_evetime_distance)
-
-    sa_line, = ax.plot(sa_iterations, sa_distances, linewidth=2.5, label="SA算法", color='r')
-    abc_line, = ax.plot(abc_iterations, abc_distances, linewidth=2.5, label="ABC算法", color='b')
-    hm_line, = ax.plot(hm_iterations, hm_distances, linewidth=2.5, label="HM算法", color='g')
+    sa_line, = ax.step(sa_trace.iteration_values(), sa_trace.distance_values(), where='post', linewidth=2.5,
+                       label="SA算法", color='r')
+    abc_line, = ax.step(abc_trace.iteration_values(), abc_trace.distance_values(), where='post', linewidth=2.5,
+                        label="ABC算法", color='b')
+    hm_line, = ax.step(hm_trace.iteration_values(), hm_trace.distance_values(), where='post', linewidth=2.5,
+                       label="HM算法", color='g')
+    lk_line, = ax.step(lk_trace.iteration_values(), lk_trace.distance_values(), where='post', linewidth=2.5,
+                       label="LK算法", color='m')
 
     ax.set_xlabel("迭代次數", fontsize=15)
     ax.set_ylabel("路徑長度", fontsize=15)
@@ -121,15 +139,22 @@ def plot_iterations_vs_distance(sa_evetime_distance, abc_evetime_distance, hm_ev
                 bbox=dict(boxstyle='round,pad=0.5', fc='yellow', alpha=0.5),
                 arrowprops=dict(arrowstyle='->', connectionstyle='arc3,rad=0'))
 
-    plt.title("SA、ABC和HM算法迭代次數與路徑長度關係", fontsize=20)
+    ax.annotate(f'LK最佳解\n迭代次數: {lk_best_iteration}\n距離: {lk_best_distance:.2f}',
+                xy=(lk_best_iteration, lk_best_distance), xytext=(-10, -10),
+                textcoords='offset points', ha='right', va='top',
+                bbox=dict(boxstyle='round,pad=0.5', fc='yellow', alpha=0.5),
+                arrowprops=dict(arrowstyle='->', connectionstyle='arc3,rad=0'))
+
+    plt.title("SA、ABC、HM和LK算法迭代次數與路徑長度關係", fontsize=20)
     plt.grid(True)
 
     plt.show()
 
 
-def plot_route(distmap, route, title):
+def plot_route(distmap, route, title, coords=None):
+    # coords 為每個城市的 (經度, 緯度)，沒有實際座標時隨機生成 (實際地圖上的路徑見 map/route_planner.py)
     n = len(distmap)
-    coords = np.random.rand(n, 2)  # 隨機生成城市坐標
+    coords = np.random.rand(n, 2) if coords is None else np.asarray(coords, dtype=np.float64)
 
     plt.figure(figsize=(10, 10))
     plt.scatter(coords[:, 0], coords[:, 1], s=200, c='red')
@@ -149,8 +174,10 @@ def plot_route(distmap, route, title):
     plt.show()
 
 
-def plot_hm_abc_comparison(hm_evetime_distance, abc_evetime_distance, hm_best_distance, abc_best_distance,
+def plot_hm_abc_comparison(hm_trace, abc_trace, hm_best_distance, abc_best_distance,
                            hm_best_iteration, abc_best_iteration):
+    if skip_empty_traces(HM=hm_trace, ABC=abc_trace):
+        return
     plt.rcParams['font.sans-serif'] = ['Microsoft JhengHei']
     plt.rcParams['axes.unicode_minus'] = False
 
@@ -158,14 +185,13 @@ def plot_hm_abc_comparison(hm_evetime_distance, abc_evetime_distance, hm_best_di
     plt.subplots_adjust(bottom=0.1, hspace=0.3)
 
     # 時間軸圖
-    hm_times, hm_distances = zip(*hm_evetime_distance)
-    abc_times, abc_distances = zip(*abc_evetime_distance)
-
-    hm_times = [t * 1000 for t in hm_times]  # 轉換為毫秒
-    abc_times = [t * 1000 for t in abc_times]
+    hm_times = hm_trace.times_ms()
+    abc_times = abc_trace.times_ms()
+    hm_distances = hm_trace.distance_values()
+    abc_distances = abc_trace.distance_values()
 
-    hm_line, = ax1.plot(hm_times, hm_distances, linewidth=2.5, label="HM算法", color='g')
-    abc_line, = ax1.plot(abc_times, abc_distances, linewidth=2.5, label="ABC算法", color='b')
+    hm_line, = ax1.step(hm_times, hm_distances, where='post', linewidth=2.5, label="HM算法", color='g')
+    abc_line, = ax1.step(abc_times, abc_distances, where='post', linewidth=2.5, label="ABC算法", color='b')
 
     ax1.set_xlabel("計算時間 (毫秒)", fontsize=12)
     ax1.set_ylabel("路徑長度", fontsize=12)
@@ -174,11 +200,11 @@ def plot_hm_abc_comparison(hm_evetime_distance, abc_evetime_distance, hm_best_di
     ax1.grid(True)
 
     # 迭代圖
-    hm_iterations = list(range(len(hm_evetime_distance)))
-    abc_iterations = list(range(len(abc_evetime_distance)))
+    hm_iterations = hm_trace.iteration_values()
+    abc_iterations = abc_trace.iteration_values()
 
-    hm_iter_line, = ax2.plot(hm_iterations, hm_distances, linewidth=2.5, label="HM算法", color='g')
-    abc_iter_line, = ax2.plot(abc_iterations, abc_distances, linewidth=2.5, label="ABC算法", color='b')
+    hm_iter_line, = ax2.step(hm_iterations, hm_distances, where='post', linewidth=2.5, label="HM算法", color='g')
+    abc_iter_line, = ax2.step(abc_iterations, abc_distances, where='post', linewidth=2.5, label="ABC算法", color='b')
 
     ax2.set_xlabel("迭代次數", fontsize=12)
     ax2.set_ylabel("路徑長度", fontsize=12)
@@ -187,8 +213,8 @@ def plot_hm_abc_comparison(hm_evetime_distance, abc_evetime_distance, hm_best_di
     ax2.grid(True)
 
     # 添加最佳解標記
-    hm_best_time = hm_times[hm_best_iteration]
-    abc_best_time = abc_times[abc_best_iteration]
+    hm_best_time = hm_trace.best_time_ms()
+    abc_best_time = abc_trace.best_time_ms()
 
     ax1.annotate(f'HM最佳解\n時間: {hm_best_time:.2f}ms\n距離: {hm_best_distance:.2f}',
                  xy=(hm_best_time, hm_best_distance), xytext=(10, 10),
@@ -220,7 +246,7 @@ def plot_hm_abc_comparison(hm_evetime_distance, abc_evetime_distance, hm_best_di
     ax_slider_iter = plt.axes([0.1, 0.02, 0.8, 0.03], facecolor=axcolor)
 
     max_time = max(max(hm_times), max(abc_times))
-    max_iter = max(len(hm_iterations), len(abc_iterations))
+    max_iter = int(max(hm_iterations[-1], abc_iterations[-1]))
     slider_iter = Slider(ax_slider_iter, '迭代範圍', 0, max_iter, valinit=0, valstep=max_iter / 100)
 
     slider_time = Slider(ax_slider_time, '時間範圍', 0, max_time, valinit=0, valstep=max_time / 100)
@@ -0,0 +1,264 @@
+import math
+import multiprocessing
+import multiprocessing.connection
+import os
+import random
+import traceback
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from utils import total_distance, dsd_optimization
+from moves import distance_lookup, random_swap, swap_delta, apply_swap
+from benchmark import share_distmap
+from convergence import ConvergenceTrace
+from SA_Annealing import SA_PARAMS
+
+# 平行回火 (replica exchange) 參數設置，溫度範圍與 SA_PARAMS 相同
+PT_PARAMS = {
+    't_hot': SA_PARAMS['t0'],  # 最高溫副本的溫度
+    't_cold': SA_PARAMS['tmin'],  # 最低溫副本的溫度
+    'sweep': 400,  # 每個副本在兩次交換之間的移動次數
+    'rounds': 60,  # 交換回合數，預設每個副本的移動次數與單一 SA 鏈相近
+    'coolnum': 0.98,  # 每回合整條溫度階梯乘上的冷卻係數
+    'min_scale': 0.01,  # 溫度階梯最多冷卻到原本的幾倍
+    'reheat_after': 15,  # 全域最佳解連續幾回合沒有改善就把溫度階梯升回原本的溫度
+}
+MIN_REPLICAS = 4  # 未指定副本數時至少使用的副本數，太少時相鄰溫度差距過大，幾乎不會交換
+POLL_INTERVAL = 0.01  # 秒，等待副本回報期間檢查 budget 停止條件的間隔 (啟動進程可能比時間上限還久)
+
+
+def temperature_ladder(replicas, t_hot, t_cold):
+    # 等比溫度階梯，由高溫到低溫；相鄰溫度比例固定，交換接受率較平均
+    if replicas == 1:
+        return [t_cold]
+    ratio = (t_cold / t_hot) ** (1 / (replicas - 1))
+    return [t_hot * ratio ** i for i in range(replicas)]
+
+
+def swap_probability(distance_hot, t_hot, distance_cold, t_cold):
+    # 相鄰溫度交換狀態的 Metropolis 接受機率: min(1, exp((1/T冷 - 1/T熱) × (E冷 - E熱)))
+    # 低溫副本的路徑比高溫副本長時必定交換，好的路徑因此往低溫移動
+    exponent = (1 / t_cold - 1 / t_hot) * (distance_cold - distance_hot)
+    return 1.0 if exponent >= 0 else math.exp(exponent)
+
+
+def _run_replica(spec, seed, route, conn):
+    # 副本進程: 保有自己的路徑，每回合依父進程指定的溫度執行 sweep 次移動，只回傳路徑長度
+    # 交換狀態時由父進程交換兩個副本的溫度，路徑本身不需要跨進程傳遞
+    # 收到 'best' 時回傳目前的最佳路徑 (父進程只在全域最佳解改善時索取)
+    random.seed(seed)
+    name, shape, dtype = spec
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        distmap = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+        lookup = distance_lookup(distmap)
+        current_route = list(route)
+        current_distance = total_distance(current_route, distmap)
+        del distmap
+
+        best_route = current_route.copy()
+        best_distance = current_distance
+        iteration_count = 0
+        best_iteration = 0
+        trace = ConvergenceTrace()
+        trace.start()
+        trace.record(0, best_distance)
+
+        while True:
+            message = conn.recv()
+            if message is None:
+                break
+            if message == 'best':
+                conn.send(('ok', best_route))
+                continue
+            t, moves = message
+            for _ in range(moves):
+                iteration_count += 1
+                i, j = random_swap(current_route)
+                diff = swap_delta(current_route, lookup, i, j)
+
+                if diff < 0 or random.random() < math.exp(-diff / t):
+                    apply_swap(current_route, i, j)
+                    current_distance += diff
+
+                    if current_distance < best_distance:
+                        best_route = current_route.copy()
+                        best_distance = current_distance
+                        best_iteration = iteration_count
+                        trace.record(iteration_count, best_distance)
+            conn.send(('ok', (current_distance, best_distance)))
+
+        trace.finish(iteration_count, best_distance)
+        conn.send(('ok', (best_route, best_distance, best_iteration, trace)))
+    except Exception:
+        conn.send(('error', traceback.format_exc()))
+    finally:
+        block.close()
+        conn.close()
+
+
+def _receive(conn, index):
+    status, data = conn.recv()
+    if status == 'error':
+        raise RuntimeError(f"副本 {index} 執行失敗:\n{data}")
+    return data
+
+
+def _receive_all(connections, budget):
+    # 等待所有副本回報這一回合的狀態；budget 的停止條件在等待期間達成時回傳 None
+    states = [None] * len(connections)
+    pending = dict(enumerate(connections))
+    while pending:
+        ready = multiprocessing.connection.wait(list(pending.values()),
+                                                timeout=None if budget is None else POLL_INTERVAL)
+        for replica, connection in list(pending.items()):
+            if connection in ready:
+                states[replica] = _receive(connection, replica)
+                del pending[replica]
+        if pending and budget is not None and budget.should_stop():
+            return None
+    return states
+
+
+def parallel_tempering(distmap, replicas=None, base_seed=None, budget=None, trace=None, **params):
+    # 多條 SA 鏈各在獨立進程中以不同溫度執行，每 sweep 次移動後嘗試交換相鄰溫度的狀態 (奇偶回合輪流配對)
+    # 整條溫度階梯每回合乘上 coolnum (自適應冷卻)，全域最佳解停滯 reheat_after 回合時升回原溫度 (回溫)
+    # budget 為 anytime.SolverBudget: 全域最佳解改善時取回該副本的路徑並回報，每回合檢查一次停止條件
+    # 啟動副本與等待回報期間也會檢查，時間用完時直接結束副本並回傳目前的最佳解 (可能只是初始解)
+    # trace 記錄全域最佳解，迭代次數為每個副本的移動次數
+    # 回傳 (最佳路徑, 距離, 最佳迭代, trace, 統計)，統計包含各相鄰溫度的交換接受率、回溫次數與各副本的結果
+    params = {**PT_PARAMS, **params}
+    if replicas is None:
+        replicas = max(MIN_REPLICAS, os.cpu_count() or 1)
+    if base_seed is None:
+        base_seed = random.randrange(2 ** 31)
+    sweep = params['sweep']
+    ladder = temperature_ladder(replicas, params['t_hot'], params['t_cold'])
+    rng = random.Random(base_seed)
+
+    initial_route, initial_distance = dsd_optimization(distmap)
+    best_route = list(initial_route)
+    best_distance = initial_distance
+    best_iteration = 0
+
+    if trace is None:
+        trace = ConvergenceTrace()
+    trace.start()
+    trace.record(0, best_distance)
+    if budget is not None:
+        budget.improved(best_route, best_distance)
+
+    # spawn 與 benchmark / island 一致；每個副本以一條 Pipe 和父進程溝通
+    context = multiprocessing.get_context('spawn')
+    block, spec = share_distmap(distmap)
+    connections = []
+    processes = []
+    replica_at = list(range(replicas))  # replica_at[溫度位置] = 副本編號，位置 0 為最高溫
+    attempts = [0] * max(replicas - 1, 0)
+    accepted = [0] * max(replicas - 1, 0)
+    scale = 1.0
+    reheats = 0
+    stagnation = 0
+    iteration_count = 0
+    finals = None
+    stopped = False
+    try:
+        for i in range(replicas):
+            if budget is not None and budget.should_stop():
+                stopped = True
+                break
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(target=_run_replica, name=f'PT-replica-{i}', daemon=True,
+                                      args=(spec, base_seed + i, initial_route, child_conn))
+            process.start()
+            child_conn.close()
+            connections.append(parent_conn)
+            processes.append(process)
+
+        for round_index in range(0 if stopped else params['rounds']):
+            for slot, replica in enumerate(replica_at):
+                connections[replica].send((ladder[slot] * scale, sweep))
+            states = _receive_all(connections, budget)
+            if states is None:
+                stopped = True
+                break
+            iteration_count += sweep
+
+            round_best = min(range(replicas), key=lambda replica: states[replica][1])
+            if states[round_best][1] < best_distance:
+                best_distance = states[round_best][1]
+                best_iteration = iteration_count
+                stagnation = 0
+                connections[round_best].send('best')
+                best_route = [int(x) for x in _receive(connections[round_best], round_best)]
+                if budget is not None:
+                    budget.improved(best_route, best_distance)
+            else:
+                stagnation += 1
+            trace.record(iteration_count, best_distance)
+
+            # 偶數回合配對 (0,1)(2,3)...，奇數回合配對 (1,2)(3,4)...
+            for slot in range(round_index % 2, replicas - 1, 2):
+                hot, cold = replica_at[slot], replica_at[slot + 1]
+                attempts[slot] += 1
+                if rng.random() < swap_probability(states[hot][0], ladder[slot] * scale,
+                                                   states[cold][0], ladder[slot + 1] * scale):
+                    replica_at[slot], replica_at[slot + 1] = cold, hot
+                    accepted[slot] += 1
+
+            if stagnation >= params['reheat_after']:
+                scale = 1.0
+                stagnation = 0
+                reheats += 1
+            else:
+                scale = max(scale * params['coolnum'], params['min_scale'])
+
+            if budget is not None and budget.spend(replicas * sweep):
+                break
+
+        # 結束所有副本並取回各自的最佳路徑；因時間用完而中斷時副本在 finally 中直接結束
+        if not stopped:
+            for connection in connections:
+                connection.send(None)
+            finals = [_receive(connection, replica) for replica, connection in enumerate(connections)]
+            for process in processes:
+                process.join()
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        for connection in connections:
+            connection.close()
+        block.close()
+        block.unlink()
+
+    if finals:
+        final_best = min(range(replicas), key=lambda replica: finals[replica][1])
+        if finals[final_best][1] <= best_distance:
+            best_route = [int(x) for x in finals[final_best][0]]
+            best_distance = float(finals[final_best][1])
+    if budget is not None:
+        budget.improved(best_route, best_distance)
+    trace.finish(iteration_count, best_distance)
+
+    stats = {
+        'replicas': replicas,
+        'base_seed': base_seed,
+        'ladder': ladder,
+        'swap_rates': [a / n if n else 0.0 for a, n in zip(accepted, attempts)],
+        'reheats': reheats,
+        'final_scale': scale,
+        'stopped_early': stopped,
+        'replica_results': [{'replica': replica, 'distance': float(final[1]), 'best_iteration': final[2],
+                             'trace': final[3]} for replica, final in enumerate(finals or [])],
+    }
+    return best_route, best_distance, best_iteration, trace, stats
+
+
+def run_pt(distmap, replicas=None, budget=None, trace=None, **params):
+    # 與 run_sa 相同的回傳格式 (最佳路徑, 距離, 最佳迭代, trace, 記憶體)；記憶體分散在各副本進程，記為 0
+    best_route, best_distance, best_iteration, trace, _ = parallel_tempering(
+        distmap, replicas, budget=budget, trace=trace, **params)
+    return best_route, best_distance, best_iteration, trace, 0
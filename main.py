@@ -1,8 +1,6 @@
 import configparser
-import csv
-import http.server
 import os
-import socketserver
+import queue
 import subprocess
 import sys
 import threading
@@ -14,7 +12,17 @@ import customtkinter as ctk
 from PIL import Image
 
 from map.change_name import change_landmark_name, delete_landmark
-from utils import run_openmap, create_output_directory
+from map.geo_distance import read_location
+from map.map_server import MapServer
+from map.map_service import MapBuildService
+from map.place_store import open_default_store
+from update_txt import describe_import, import_places
+from utils import create_output_directory
+
+UPLOAD_FILE_TYPES = {
+    "txt": [("Text files", "*.txt")],
+    "csv": [("CSV files", "*.csv")],
+}
 
 
 class LandmarkUpdateWindow:
@@ -38,7 +46,7 @@ class LandmarkUpdateWindow:
         self.frame = ctk.CTkFrame(border_frame, fg_color="#2c3e50")
         self.frame.pack(expand=True, fill="both", padx=2, pady=2)
         self.frame.grid_columnconfigure((0, 1), weight=1)
-        self.frame.grid_rowconfigure((0, 1, 2), weight=1)
+        self.frame.grid_rowconfigure((0, 1, 2, 3), weight=1)
 
         self.load_icons()
         self.create_buttons()
@@ -62,22 +70,30 @@ class LandmarkUpdateWindow:
     def create_buttons(self):
         button_font = ctk.CTkFont(size=24, weight="bold")
         buttons = [
-            ("上傳 TXT 文件\n(店家名稱/緯度/經度)", upload_txt, "#3498db", "#2980b9", 0, 0, self.icons["upload_txt"]),
-            ("上傳 CSV 文件", upload_csv, "#e74c3c", "#c0392b", 0, 1, self.icons["upload_csv"]),
-            ("更改名稱", change_name, "#3498db", "#2980b9", 1, 0, self.icons["change_name"]),
-            ("刪除標記", delete_mark, "#e74c3c", "#c0392b", 1, 1, self.icons["delete_mark"])
+            ("上傳 TXT 文件\n(店家名稱/緯度/經度)", lambda: self.upload_file("txt"), "#3498db", "#2980b9", 0, 0,
+             self.icons["upload_txt"]),
+            ("上傳 CSV 文件", lambda: self.upload_file("csv"), "#e74c3c", "#c0392b", 0, 1, self.icons["upload_csv"]),
+            ("更改名稱", lambda: self.execute_command(change_name), "#3498db", "#2980b9", 1, 0,
+             self.icons["change_name"]),
+            ("刪除標記", lambda: self.execute_command(delete_mark), "#e74c3c", "#c0392b", 1, 1,
+             self.icons["delete_mark"])
         ]
 
         for text, command, fg_color, hover_color, row, col, icon in buttons:
             btn = ctk.CTkButton(self.frame, text=text, image=icon, compound="top",
-                                command=lambda cmd=command: self.execute_command(cmd),
+                                command=command,
                                 fg_color=fg_color, hover_color=hover_color,
                                 width=350, height=250, font=button_font, corner_radius=10)
             btn.grid(row=row, column=col, padx=20, pady=20, sticky="nsew")
 
+        # 相容舊流程的 CSV 只在按下匯出時輸出，建圖時不會輸出
+        ctk.CTkButton(self.frame, text="匯出 CSV 文件", command=export_csv, fg_color="#27ae60",
+                      hover_color="#229954", height=60, font=button_font,
+                      corner_radius=10).grid(row=2, column=0, columnspan=2, padx=20, pady=10, sticky="ew")
+
     def execute_command(self, cmd):
         progress = ctk.CTkProgressBar(self.frame, mode='indeterminate', height=20, width=700)
-        progress.grid(row=2, column=0, columnspan=2, padx=20, pady=20, sticky="ew")
+        progress.grid(row=3, column=0, columnspan=2, padx=20, pady=20, sticky="ew")
         progress.start()
 
         def run_command():
@@ -88,6 +104,22 @@ class LandmarkUpdateWindow:
 
         self.window.after(100, run_command)  # 延迟执行命令，给UI时间显示进度条
 
+    def upload_file(self, file_type):
+        file_path = filedialog.askopenfilename(filetypes=UPLOAD_FILE_TYPES[file_type])
+        if not file_path:
+            return
+
+        # 匯入在背景執行緒進行，進度條依已讀取的比例更新
+        progress = ctk.CTkProgressBar(self.frame, mode='determinate', height=20, width=700)
+        progress.set(0)
+        progress.grid(row=3, column=0, columnspan=2, padx=20, pady=20, sticky="ew")
+
+        def finish():
+            progress.grid_forget()
+            self.window.after(100, self.hide_window)
+
+        process_file(file_path, file_type, progress.set, finish)
+
     def show_window(self):
         self.window.deiconify()
         self.window.lift()
@@ -171,13 +203,16 @@ def update_output(output_text, message):
 
 
 def update_config(lat, lon, radius):
+    # 保留設定檔中其他區段 (例如 [Categories])，只更新起點
     config = configparser.ConfigParser()
+    config.optionxform = str
+    config.read('config.ini', encoding='utf-8')
     config['Location'] = {
         'latitude': str(lat),
         'longitude': str(lon),
         'radius': str(radius)
     }
-    with open('config.ini', 'w') as configfile:
+    with open('config.ini', 'w', encoding='utf-8') as configfile:
         config.write(configfile)
 
 
@@ -227,25 +262,6 @@ def add_point():
     add_window.wait_window()
 
 
-def update_openmap_defaults(lat, lon, radius):
-    openmap_path = os.path.join(os.path.dirname(__file__), "map", "openmap.py")
-    with open(openmap_path, 'r', encoding='utf-8') as file:
-        lines = file.readlines()
-
-    for i, line in enumerate(lines):
-        if line.strip().startswith("latitude ="):
-            lines[i] = f"        latitude = {lat}\n"
-        elif line.strip().startswith("longitude ="):
-            lines[i] = f"        longitude = {lon}\n"
-        elif line.strip().startswith("radius ="):
-            lines[i] = f"        radius = {radius}  # 米\n"
-
-    with open(openmap_path, 'w', encoding='utf-8') as file:
-        file.writelines(lines)
-
-    print(f"openmap.py 已更新: 緯度 {lat}, 經度 {lon}, 範圍 {radius}米")
-
-
 def run_algorithm():
     algorithm_path = os.path.join(os.path.dirname(__file__), "algorithm", "algorithm.py")
     try:
@@ -285,28 +301,39 @@ def execute_command(cmd, window, frame):
     window.after(100, run_command)  # 延迟执行命令，给UI时间显示进度条
 
 
-def process_file(file_path, file_type):
-    update_txt_path = os.path.join(os.path.dirname(__file__), "update_txt.py")
-    result = subprocess.run(["python", update_txt_path, file_path, file_type], capture_output=True, text=True,
-                            encoding="utf-8")
-    update_output(output_text, result.stdout)
-
-    processed_file = result.stdout.strip().split("：")[-1].strip()
-    if os.path.exists(processed_file):
-        os.rename(processed_file, "uploaded_places.csv")
-        update_output(output_text, f"文件已重命名為 uploaded_places.csv")
-
-
-def upload_txt():
-    file_path = filedialog.askopenfilename(filetypes=[("Text files", "*.txt")])
-    if file_path:
-        process_file(file_path, "txt")
-
+def process_file(file_path, file_type, on_progress=None, on_done=None):
+    # 在工作執行緒中匯入，結果經由佇列交回主執行緒 (Tk 元件只能在主執行緒操作)
+    updates = queue.Queue()
 
-def upload_csv():
-    file_path = filedialog.askopenfilename(filetypes=[("CSV files", "*.csv")])
-    if file_path:
-        process_file(file_path, "csv")
+    def worker():
+        try:
+            summary = import_places(file_path, file_type,
+                                    progress=lambda fraction, _: updates.put(('progress', fraction)))
+            updates.put(('done', summary))
+        except Exception as e:
+            updates.put(('error', e))
+
+    def poll():
+        while True:
+            try:
+                kind, value = updates.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'progress':
+                if on_progress:
+                    on_progress(value)
+                continue
+            if kind == 'done':
+                update_output(output_text, "\n".join(describe_import(value)))
+            else:
+                update_output(output_text, f"匯入文件時發生錯誤：{value}")
+            if on_done:
+                on_done()
+            return
+        root.after(100, poll)
+
+    threading.Thread(target=worker, daemon=True).start()
+    poll()
 
 
 def change_name():
@@ -317,103 +344,78 @@ def delete_mark():
     delete_landmark(root)
 
 
-def start_server(directory, port=8000):
-    os.chdir(directory)
-    handler = http.server.SimpleHTTPRequestHandler
-    with socketserver.TCPServer(("", port), handler) as httpd:
-        print(f"Serving at port {port}")
-        httpd.serve_forever()
+def draw_map():
+    update_uploaded_places()
 
+    # 在常駐的地圖服務中背景建圖，完成後再啟動服務器並打開瀏覽器
+    latitude, longitude, radius = read_location('config.ini')
+    future = map_service.submit(latitude, longitude, radius)
+    update_output(output_text, f"地圖產生中: 緯度 {latitude}, 經度 {longitude}, 範圍 {radius}米")
 
-def draw_map():
-    output_dir = create_output_directory()
-    # 确保 uploaded_places.csv 存在
-    uploaded_file = os.path.join(output_dir, "uploaded_places.csv")
-    if not os.path.exists(uploaded_file):
-        with open(uploaded_file, 'w', newline='', encoding='utf-8') as file:
-            writer = csv.writer(file)
-            writer.writerow(['名稱', '緯度', '經度'])
-        update_output(output_text, "已創建空的 uploaded_places.csv 文件")
+    def poll():
+        if not future.done():
+            root.after(100, poll)
+            return
+        try:
+            result = future.result()
+        except Exception as e:
+            update_output(output_text, f"HTML 文件生成失敗: {e}")
+            return
 
-    update_uploaded_places()
-    run_openmap()
+        # 服務器只啟動一次，之後重新產生的地圖由同一個服務器提供
+        html_file = os.path.basename(result['html_path'])
+        try:
+            map_server.start()
+        except OSError as e:
+            update_output(output_text, f"無法啟動地圖服務器 (埠 {map_server.port}): {e}")
+            return
+        url = map_server.url(html_file)
+        webbrowser.open(url)
+
+        update_output(output_text, f"共 {result['places']} 個地點，建圖耗時 {result['build_time']:.2f} 毫秒")
+        update_output(output_text,
+                      f"地圖已生成並在瀏覽器中打開。如果沒有自動打開，請手動訪問 {url}")
 
-    # 檢查 HTML 文件是否生成
-    html_file = "map_with_nearby_places_osm.html"
-    html_path = os.path.join(output_dir, html_file)
+    poll()
 
-    if os.path.exists(html_path):
-        # 啟動服務器並打開瀏覽器
-        port = 8000
-        server_thread = threading.Thread(target=start_server, args=(output_dir, port))
-        server_thread.daemon = True
-        server_thread.start()
 
-        webbrowser.open(f"http://localhost:{port}/{html_file}")
+def export_csv():
+    # 在地圖服務的執行緒中匯出，完成後顯示 CSV 路徑
+    latitude, longitude, _ = read_location('config.ini')
+    future = map_service.export(latitude, longitude)
 
-        update_output(output_text,
-                      f"地圖已生成並在瀏覽器中打開。如果沒有自動打開，請手動訪問 http://localhost:{port}/{html_file}")
-    else:
-        update_output(output_text, "HTML 文件生成失敗，請檢查 openmap.py 的執行結果")
+    def poll():
+        if not future.done():
+            root.after(100, poll)
+            return
+        try:
+            update_output(output_text, f"CSV 文件已匯出至: {future.result()}")
+        except Exception as e:
+            update_output(output_text, f"CSV 文件匯出失敗: {e}")
+
+    poll()
 
 
 def update_uploaded_places():
+    # 將新上傳的地點匯入地點資料庫，座標已存在的地點由唯一索引自動略過
     output_dir = create_output_directory()
-    uploaded_file = os.path.join(output_dir, "uploaded_places.csv")
-    temp_file = os.path.join(output_dir, "temp_uploaded_places.csv")
     new_uploaded_file = os.path.join(output_dir, "new_uploaded_places.csv")
-    existing_records = set()
-
-    # 如果存在原有的 uploaded_places.csv，讀取已有的數據
-    if os.path.exists(uploaded_file):
-        with open(uploaded_file, 'r', newline='', encoding='utf-8') as csvfile:
-            reader = csv.reader(csvfile)
-            next(reader)  # 跳過標題行
-            for row in reader:
-                existing_records.add((row[1], row[2]))  # 使用緯度和經度作為唯一標識
-
-    # 讀取新上傳的數據（如果有的話）
-    new_data = []
-    if os.path.exists(new_uploaded_file):
-        with open(new_uploaded_file, 'r', newline='', encoding='utf-8') as csvfile:
-            reader = csv.reader(csvfile)
-            next(reader)  # 跳過標題行
-            for row in reader:
-                if (row[1], row[2]) not in existing_records:
-                    new_data.append(row)
-                    existing_records.add((row[1], row[2]))
-
-    with open(temp_file, 'w', newline='', encoding='utf-8') as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(['名稱', '緯度', '經度'])
-
-        # 寫入原有數據
-        if os.path.exists(uploaded_file):
-            with open(uploaded_file, 'r', newline='', encoding='utf-8') as original:
-                reader = csv.reader(original)
-                next(reader)  # 跳過標題行
-                for row in reader:
-                    writer.writerow(row)
-
-        # 寫入新數據
-        for row in new_data:
-            writer.writerow(row)
-
-    # 替換原有文件
-    if os.path.exists(uploaded_file):
-        os.remove(uploaded_file)
-    os.rename(temp_file, uploaded_file)
-
-    # 刪除臨時的新上傳文件
+
+    store = open_default_store(output_dir)
+    added = 0
     if os.path.exists(new_uploaded_file):
+        added = store.import_csv(new_uploaded_file, uploaded=True)
         os.remove(new_uploaded_file)
+    store.close()
 
-    update_output(output_text, f"已更新 {uploaded_file}，新增了 {len(new_data)} 條記錄")
+    update_output(output_text, f"已更新 {store.db_path}，新增了 {added} 條記錄")
 
 
 def main():
-    global root, output_text
+    global root, output_text, map_service, map_server
     root = create_main_window()
+    map_service = MapBuildService()
+    map_server = MapServer(create_output_directory())
     frame = create_main_frame(root)
     output_text = create_output_area(frame)
     initialize_output(output_text)
@@ -428,6 +430,8 @@ def main():
     create_buttons(frame, commands)
 
     root.mainloop()
+    map_service.shutdown()
+    map_server.shutdown()
 
 
 if __name__ == "__main__":
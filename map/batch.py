@@ -0,0 +1,191 @@
+import csv
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import folium
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from map.geo_distance import EARTH_RADIUS, bearing_matrix, compass_labels, haversine_matrix, read_location
+from map.classify import default_classifier, process_elements
+from map.openmap import add_map_features, update_map
+from map.overpass import OverpassCache, default_cache_path
+from map.overpass_async import default_fetcher
+from map.place_store import CSV_HEADER, ORIGIN_CSV_COLUMNS, default_output_dir, open_default_store
+from map.spatial_index import PlaceIndex
+
+MAX_QUERY_RADIUS = 3000  # 合併後單一查詢的半徑上限（米），避免一次查詢範圍過大
+BATCH_WORKERS = 8
+
+
+def load_origins(file_path, default_radius=300):
+    # 讀取起點 CSV (名稱, 緯度, 經度[, 範圍])，回傳 [(名稱, 緯度, 經度, 範圍)]
+    origins = []
+    with open(file_path, 'r', newline='', encoding='utf-8') as csvfile:
+        reader = csv.reader(csvfile)
+        next(reader, None)  # 跳過標題行
+        for row in reader:
+            if len(row) < 3:
+                continue
+            try:
+                lat, lon = float(row[1]), float(row[2])
+                radius = float(row[3]) if len(row) > 3 and row[3].strip() else default_radius
+            except ValueError:
+                continue
+            origins.append((row[0].strip(), lat, lon, radius))
+    return origins
+
+
+def merge_origin_areas(origins, max_radius=MAX_QUERY_RADIUS):
+    # 將範圍互相重疊的起點合併成同一個查詢: 以第一個起點為圓心，半徑擴大到涵蓋所有成員的範圍
+    # 合併後半徑超過 max_radius 時另開新的查詢，回傳 [{'lat', 'lon', 'radius', 'members'}]
+    groups = []
+    for i, (_, lat, lon, radius) in enumerate(origins):
+        if groups:
+            distances = haversine_matrix([lat], [lon], [group['lat'] for group in groups],
+                                         [group['lon'] for group in groups])[0]
+            for j in np.argsort(distances):
+                group, distance = groups[j], float(distances[j])
+                if distance < group['radius'] + radius and distance + radius <= max_radius:
+                    group['radius'] = max(group['radius'], distance + radius)
+                    group['members'].append(i)
+                    break
+            else:
+                groups.append({'lat': lat, 'lon': lon, 'radius': radius, 'members': [i]})
+        else:
+            groups.append({'lat': lat, 'lon': lon, 'radius': radius, 'members': [i]})
+    return groups
+
+
+def fetch_group(group, cache, fetcher, existing_places, classifier):
+    # 一個合併查詢的結果轉為地點 (不限制距離，之後再依各起點的範圍篩選)
+    data = cache.fetch(group['lat'], group['lon'], int(np.ceil(group['radius'])), classifier.tags, fetcher)
+    return list(process_elements(data.get('elements', []), group['lat'], group['lon'], existing_places,
+                                 max_distance=None, classifier=classifier).values())
+
+
+def safe_file_name(name):
+    return re.sub(r'[\\/:*?"<>|\s]+', '_', name).strip('_') or 'origin'
+
+
+def write_origin_csv(file_path, origin, nearby):
+    # 每個地點另附由起點出發的方位角與 8 方位名稱
+    bearings = bearing_matrix([origin[1]], [origin[2]], [place['lat'] for place, _ in nearby],
+                              [place['lon'] for place, _ in nearby])[0]
+    directions = compass_labels(bearings) if nearby else []
+    with open(file_path, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(CSV_HEADER + ORIGIN_CSV_COLUMNS)
+        for (place, distance), bearing, direction in zip(nearby, bearings.tolist(), directions):
+            writer.writerow([place['name'], place['lat'], place['lon'], round(distance, 1), round(bearing, 1),
+                             direction])
+
+
+def build_combined_map(origins, places, html_path):
+    lats = [origin[1] for origin in origins]
+    lons = [origin[2] for origin in origins]
+    m = folium.Map(location=[float(np.mean(lats)), float(np.mean(lons))], zoom_start=13)
+    m.fit_bounds([[min(lats), min(lons)], [max(lats), max(lons)]])
+    for name, lat, lon, radius in origins:
+        folium.Marker([lat, lon], popup=name, icon=folium.Icon(color='black', icon='home')).add_to(m)
+        folium.Circle(radius=radius, location=[lat, lon], color="crimson", weight=1, fill=False).add_to(m)
+    update_map(m, {(place['lat'], place['lon']): place for place in places})
+    add_map_features(m)
+    m.save(html_path)
+
+
+def run_batch(origins_file, output_dir=None, default_radius=None, fetcher=None, cache=None,
+              workers=BATCH_WORKERS):
+    # 批次處理多個起點: 合併重疊的查詢範圍、並行抓取，所有地點寫入地點資料庫後以空間索引對每個起點做範圍篩選
+    # 每個起點輸出一份 CSV 到 output/batch/，另輸出一份包含所有起點的地圖
+    start = time.perf_counter()
+    output_dir = output_dir or default_output_dir()
+    if default_radius is None:
+        default_radius = read_location('config.ini')[2]
+    origins = load_origins(origins_file, default_radius)
+    if not origins:
+        raise ValueError(f"找不到有效的起點: {origins_file}")
+
+    batch_dir = os.path.join(output_dir, 'batch')
+    os.makedirs(batch_dir, exist_ok=True)
+    own_cache = cache is None
+    if own_cache:
+        cache = OverpassCache(default_cache_path())
+    fetcher = fetcher or default_fetcher()
+    classifier = default_classifier()
+    groups = merge_origin_areas(origins)
+
+    store = open_default_store(output_dir)
+    try:
+        existing_places = {(place['lat'], place['lon']): place['name']
+                           for place in store.all_places(uploaded_only=True)}
+        failed = []
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(fetch_group, group, cache, fetcher, existing_places, classifier)
+                       for group in groups]
+            for group, future in zip(groups, futures):
+                try:
+                    store.add_places(future.result())
+                except Exception as e:
+                    failed.append((group, e))
+
+        # 取出涵蓋所有起點範圍的地點 (包含既有與上傳的地點)，建立空間索引後逐一起點查詢
+        max_radius = max(origin[3] for origin in origins)
+        d_lat = np.degrees(max_radius / EARTH_RADIUS)
+        d_lon = d_lat / max(np.cos(np.radians(max(abs(origin[1]) for origin in origins))), 1e-6)
+        candidates = store.places_in_bbox(min(origin[1] for origin in origins) - d_lat,
+                                          max(origin[1] for origin in origins) + d_lat,
+                                          min(origin[2] for origin in origins) - d_lon,
+                                          max(origin[2] for origin in origins) + d_lon)
+    finally:
+        store.close()
+        if own_cache:
+            cache.close()
+
+    index = PlaceIndex.from_places(candidates)
+
+    def join_origin(i):
+        name, lat, lon, radius = origins[i]
+        nearby = index.query_radius(lat, lon, radius)
+        write_origin_csv(os.path.join(batch_dir, f"{i + 1:03d}_{safe_file_name(name)}.csv"), origins[i], nearby)
+        return nearby
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        nearby_sets = list(executor.map(join_origin, range(len(origins))))
+
+    shown = {}
+    for nearby in nearby_sets:
+        for place, _ in nearby:
+            shown[(place['lat'], place['lon'])] = place
+    html_path = os.path.join(output_dir, 'map_batch_origins.html')
+    build_combined_map(origins, list(shown.values()), html_path)
+
+    return {
+        'origins': len(origins),
+        'queries': len(groups),
+        'failed_queries': len(failed),
+        'places': len(shown),
+        'csv_dir': batch_dir,
+        'html_path': html_path,
+        'build_time': (time.perf_counter() - start) * 1000,  # 毫秒
+    }
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("使用方法: python map/batch.py <起點CSV (名稱,緯度,經度[,範圍])>")
+        return
+
+    result = run_batch(sys.argv[1])
+    print(f"共 {result['origins']} 個起點，合併為 {result['queries']} 個查詢 (失敗 {result['failed_queries']} 個)")
+    print(f"範圍內共 {result['places']} 個地點，耗時 {result['build_time']:.2f} 毫秒")
+    print(f"各起點 CSV 已保存至: '{result['csv_dir']}'")
+    print(f"地圖已保存至: '{result['html_path']}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import configparser
+
+import numpy as np
+
+from map.geo_distance import bearing_matrix, compass_labels, haversine_matrix
+
+# 地點類型與對應的 Overpass 標籤，依優先順序排列: 同時符合多個標籤時取排在前面的類型
+DEFAULT_CATEGORIES = (
+    ('便利商店', (('shop', 'convenience'),)),
+    ('餐廳', (('amenity', 'restaurant'),)),
+    ('咖啡廳', (('amenity', 'cafe'),)),
+    ('早餐店', (('cuisine', 'breakfast'),)),
+    ('漢堡店', (('cuisine', 'burger'),)),
+)
+NAME_BLACKLIST = frozenset(('蝦皮', 'Unknown', ''))  # 篩選掉名稱為"蝦皮"或空白的地點
+DIRECTION_POINTS = 8  # 地點方位的等分數 (4、8 或 16)
+
+
+def category_tags(categories):
+    # 所有類型的查詢標籤 (依優先順序、去除重複)
+    tags = []
+    for _, category_tags in categories:
+        for tag in category_tags:
+            if tag not in tags:
+                tags.append(tag)
+    return tuple(tags)
+
+
+def load_categories(config_file):
+    # 讀取設定檔的 [Categories] 區段，每行為 "類型 = key=value[, key=value ...]"，依出現順序決定優先順序
+    # 沒有此區段時使用 DEFAULT_CATEGORIES
+    config = configparser.ConfigParser()
+    config.optionxform = str  # 保留類型名稱的大小寫
+    config.read(config_file, encoding='utf-8')
+    if not config.has_section('Categories'):
+        return DEFAULT_CATEGORIES
+
+    categories = []
+    for name, value in config.items('Categories'):
+        tags = []
+        for part in value.split(','):
+            key, sep, tag_value = part.partition('=')
+            if sep and key.strip() and tag_value.strip():
+                tags.append((key.strip(), tag_value.strip()))
+        if tags:
+            categories.append((name, tuple(tags)))
+    return tuple(categories) or DEFAULT_CATEGORIES
+
+
+class TagClassifier:
+    # 預先把類型表編成 {(key, value): 優先順序} 查表，每個元素只需走訪自己的標籤一次
+
+    def __init__(self, categories=DEFAULT_CATEGORIES):
+        self.categories = tuple(categories)
+        self.labels = [name for name, _ in self.categories]
+        self.tags = category_tags(self.categories)
+        self.lookup = {}
+        for priority, (_, tags) in enumerate(self.categories):
+            for tag in tags:
+                self.lookup.setdefault(tag, priority)
+
+    def classify(self, tags):
+        # 回傳類型的優先順序編號，不屬於任何類型時回傳 None
+        lookup = self.lookup
+        best = None
+        for tag in tags.items():
+            priority = lookup.get(tag)
+            if priority is not None and (best is None or priority < best):
+                best = priority
+        return best
+
+    def label(self, tags):
+        priority = self.classify(tags)
+        return None if priority is None else self.labels[priority]
+
+
+def default_classifier(config_file='config.ini'):
+    return TagClassifier(load_categories(config_file))
+
+
+def process_elements(elements, latitude, longitude, existing_places=None, max_distance=None, classifier=None,
+                     direction_points=DIRECTION_POINTS):
+    # Overpass 原始元素轉為地點: 先以查表分類並篩選名稱，再以 NumPy 一次算出所有候選點的距離與方位
+    # existing_places 為 {(緯度, 經度): 名稱}，上傳過的地點沿用上傳的名稱
+    # max_distance 通常為查詢使用的範圍 (config.ini 的 radius)，None 時不限距離
+    # 回傳 {(緯度, 經度): 地點}，同一座標只保留第一個符合的元素
+    classifier = classifier or TagClassifier()
+    existing_places = existing_places or {}
+
+    keys, names, types = [], [], []
+    seen = set()
+    for element in elements:
+        tags = element.get('tags')
+        if not tags or 'lat' not in element or 'lon' not in element:
+            continue
+        key = (element['lat'], element['lon'])
+        if key in seen:
+            continue
+        name = existing_places.get(key) or tags.get('name', '')
+        if name in NAME_BLACKLIST:
+            continue
+        priority = classifier.classify(tags)
+        if priority is None:
+            continue
+        seen.add(key)
+        keys.append(key)
+        names.append(name)
+        types.append(classifier.labels[priority])
+
+    if not keys:
+        return {}
+
+    lats = [key[0] for key in keys]
+    lons = [key[1] for key in keys]
+    distances = haversine_matrix([latitude], [longitude], lats, lons)[0]
+    bearings = bearing_matrix([latitude], [longitude], lats, lons)[0]
+    directions = compass_labels(bearings, direction_points)
+    inside = np.ones(len(keys), dtype=bool) if max_distance is None else distances <= max_distance
+
+    places = {}
+    for i in np.flatnonzero(inside).tolist():
+        key = keys[i]
+        places[key] = {
+            'name': names[i],
+            'type': types[i],
+            'lat': key[0],
+            'lon': key[1],
+            'distance': float(distances[i]),
+            'bearing': float(bearings[i]),
+            'direction': directions[i],
+            'is_uploaded': key in existing_places
+        }
+    return places
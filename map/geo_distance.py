@@ -0,0 +1,142 @@
+import configparser
+import hashlib
+import os
+
+import numpy as np
+
+EARTH_RADIUS = 6371000  # 地球半徑（米）
+CHUNK_ROWS = 1024  # 分塊計算，避免大型矩陣的中間陣列佔用過多記憶體
+
+# 方位角依 4/8/16 等分對應的方位名稱，由正北開始順時針排列
+COMPASS_LABELS = {
+    4: ('北', '東', '南', '西'),
+    8: ('北', '東北', '東', '東南', '南', '西南', '西', '西北'),
+    16: ('北', '北北東', '東北', '東北東', '東', '東南東', '東南', '南南東',
+         '南', '南南西', '西南', '西南西', '西', '西北西', '西北', '北北西'),
+}
+
+
+def haversine_matrix(lats, lons, lats2=None, lons2=None, dtype=np.float64):
+    # 一次以廣播計算所有點對的大圓距離（米），回傳 len(lats) × len(lats2) 的矩陣
+    lat1 = np.radians(np.asarray(lats, dtype=np.float64))
+    lon1 = np.radians(np.asarray(lons, dtype=np.float64))
+    lat2 = lat1 if lats2 is None else np.radians(np.asarray(lats2, dtype=np.float64))
+    lon2 = lon1 if lons2 is None else np.radians(np.asarray(lons2, dtype=np.float64))
+    cos_lat2 = np.cos(lat2)
+
+    # 以 float64 計算後再存成指定型別 (float32 可省一半記憶體)
+    result = np.empty((len(lat1), len(lat2)), dtype=dtype)
+    for start in range(0, len(lat1), CHUNK_ROWS):
+        rows = slice(start, start + CHUNK_ROWS)
+        d_lat = lat2[None, :] - lat1[rows, None]
+        d_lon = lon2[None, :] - lon1[rows, None]
+        a = np.sin(d_lat / 2) ** 2 + np.cos(lat1[rows, None]) * cos_lat2[None, :] * np.sin(d_lon / 2) ** 2
+        result[rows] = 2 * EARTH_RADIUS * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return result
+
+
+def bearing_matrix(lats, lons, lats2=None, lons2=None, dtype=np.float64):
+    # 所有點對的起始方位角 (度，正北為 0、順時針 0~360)，回傳 len(lats) × len(lats2) 的矩陣
+    lat1 = np.radians(np.asarray(lats, dtype=np.float64))
+    lon1 = np.radians(np.asarray(lons, dtype=np.float64))
+    lat2 = lat1 if lats2 is None else np.radians(np.asarray(lats2, dtype=np.float64))
+    lon2 = lon1 if lons2 is None else np.radians(np.asarray(lons2, dtype=np.float64))
+    sin_lat2 = np.sin(lat2)
+    cos_lat2 = np.cos(lat2)
+
+    result = np.empty((len(lat1), len(lat2)), dtype=dtype)
+    for start in range(0, len(lat1), CHUNK_ROWS):
+        rows = slice(start, start + CHUNK_ROWS)
+        d_lon = lon2[None, :] - lon1[rows, None]
+        y = np.sin(d_lon) * cos_lat2[None, :]
+        x = np.cos(lat1[rows, None]) * sin_lat2[None, :] - np.sin(lat1[rows, None]) * cos_lat2[None, :] * np.cos(d_lon)
+        result[rows] = np.degrees(np.arctan2(y, x)) % 360.0
+    return result
+
+
+def compass_sectors(bearings, points=8):
+    # 方位角 (度) 轉為 points 等分的方位編號，每個方位以其中心角度為中心 (例如 8 等分時北為 337.5~22.5 度)
+    width = 360.0 / points
+    return (np.floor((np.asarray(bearings, dtype=np.float64) % 360.0 + width / 2) / width) % points).astype(np.int64)
+
+
+def compass_labels(bearings, points=8):
+    # 方位角陣列轉為方位名稱，輸入為純量時回傳單一名稱
+    sectors = compass_sectors(bearings, points)
+    labels = COMPASS_LABELS[points]
+    return [labels[sector] for sector in sectors.tolist()] if sectors.ndim else labels[int(sectors)]
+
+
+def route_points(places, origin=None):
+    # 以 origin 為城市0，其餘地點依序編號，回傳 (名稱, 緯度, 經度) 三個列表
+    if origin is not None:
+        places = [('起點', origin[0], origin[1])] + [place for place in places
+                                                    if (place[1], place[2]) != tuple(origin[:2])]
+    return [place[0] for place in places], [place[1] for place in places], [place[2] for place in places]
+
+
+def build_bearingmap(places, origin=None):
+    # 與 build_distmap 相同的城市編號，回傳 (方位角矩陣, 名稱列表)，[i][j] 為由城市 i 前往城市 j 的方位角
+    names, lats, lons = route_points(places, origin)
+    return bearing_matrix(lats, lons), names
+
+
+def route_directions(route, bearingmap, points=8):
+    # 路徑每一段的方位名稱 (route 為城市編號序列，回傳長度為 len(route) - 1)
+    route = np.asarray(route, dtype=np.intp)
+    return compass_labels(np.asarray(bearingmap)[route[:-1], route[1:]], points)
+
+
+def read_location(config_file):
+    config = configparser.ConfigParser()
+    config.read(config_file, encoding='utf-8')
+    latitude = config.getfloat('Location', 'latitude', fallback=25.0111)
+    longitude = config.getfloat('Location', 'longitude', fallback=121.5146)
+    radius = config.getint('Location', 'radius', fallback=300)
+    return latitude, longitude, radius
+
+
+def coordinate_key(lats, lons, dtype):
+    digest = hashlib.sha1()
+    digest.update(np.asarray(lats, dtype=np.float64).tobytes())
+    digest.update(np.asarray(lons, dtype=np.float64).tobytes())
+    digest.update(np.dtype(dtype).str.encode())
+    return digest.hexdigest()
+
+
+def build_distmap(places, origin=None, dtype=np.float64, cache_dir=None):
+    # 以 origin 為城市0，其餘地點依序編號，回傳 (距離矩陣, 名稱列表)
+    # cache_dir 不為 None 時，依座標集合的雜湊值把矩陣存成 .npy，下次直接讀取
+    names, lats, lons = route_points(places, origin)
+
+    cache_file = None
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        cache_file = os.path.join(cache_dir, f"distmap_{coordinate_key(lats, lons, dtype)}.npy")
+        if os.path.exists(cache_file):
+            return np.load(cache_file), names
+
+    distmap = haversine_matrix(lats, lons, dtype=dtype)
+    if cache_file:
+        np.save(cache_file, distmap)
+    return distmap, names
+
+
+def load_real_distmap(output_dir, config_file='config.ini', float32=False, bearings=False):
+    # 起點與範圍取自 config.ini，地點取自地點資料庫 (output/places.sqlite) 中範圍內的地點
+    # bearings 為 True 時另外回傳相同編號的方位角矩陣: (距離矩陣, 名稱列表, 方位角矩陣)
+    from map.place_store import open_default_store  # place_store 依賴本模組，延遲匯入避免循環
+
+    latitude, longitude, radius = read_location(config_file)
+    store = open_default_store(output_dir)
+    try:
+        places = [(place['name'], place['lat'], place['lon'])
+                  for place, _ in store.query_radius(latitude, longitude, radius)]
+    finally:
+        store.close()
+    distmap, names = build_distmap(places, origin=(latitude, longitude),
+                                   dtype=np.float32 if float32 else np.float64,
+                                   cache_dir=os.path.join(output_dir, 'cache'))
+    if bearings:
+        return distmap, names, build_bearingmap(places, origin=(latitude, longitude))[0]
+    return distmap, names
@@ -0,0 +1,187 @@
+import gzip
+import http.server
+import os
+import threading
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from functools import partial
+
+try:
+    import brotli
+except ImportError:  # brotli 為選用套件，沒有安裝時只提供 gzip
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/geo+json', 'application/javascript')
+MIN_COMPRESS_BYTES = 1024  # 太小的檔案壓縮不划算
+MAX_CACHE_BYTES = 64 * 1024 * 1024  # 記憶體快取上限 (原始檔與壓縮後的內容合計)
+
+
+class FileCache:
+    # 以 (修改時間, 大小) 判斷檔案是否變更，未變更時直接由記憶體回應，壓縮結果也一併快取
+    # 超過容量上限時依最久未使用的順序移除
+
+    def __init__(self, max_bytes=MAX_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total = 0
+        self.lock = threading.Lock()
+
+    def get(self, path, stat):
+        version = (stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None and entry['version'] == version:
+                self.entries.move_to_end(path)
+                return entry
+
+        with open(path, 'rb') as file:
+            body = file.read()
+        entry = {
+            'version': version,
+            'etag': f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"',
+            'last_modified': formatdate(stat.st_mtime, usegmt=True),
+            'mtime': int(stat.st_mtime),
+            'bodies': {'identity': body},
+        }
+        with self.lock:
+            self.store(path, entry)
+        return entry
+
+    def encoded(self, path, entry, encoding):
+        body = entry['bodies'].get(encoding)
+        if body is not None:
+            return body
+        raw = entry['bodies']['identity']
+        body = brotli.compress(raw) if encoding == 'br' else gzip.compress(raw, compresslevel=6)
+        with self.lock:
+            entry['bodies'][encoding] = body
+            if self.entries.get(path) is entry:
+                self.total += len(body)
+                self.evict()
+        return body
+
+    def store(self, path, entry):
+        old = self.entries.pop(path, None)
+        if old is not None:
+            self.total -= sum(len(body) for body in old['bodies'].values())
+        self.entries[path] = entry
+        self.total += len(entry['bodies']['identity'])
+        self.evict()
+
+    def evict(self):
+        while self.total > self.max_bytes and len(self.entries) > 1:
+            _, old = self.entries.popitem(last=False)
+            self.total -= sum(len(body) for body in old['bodies'].values())
+
+
+class MapRequestHandler(http.server.SimpleHTTPRequestHandler):
+    # 由 directory 參數指定根目錄，不需 os.chdir；支援 ETag / Last-Modified 條件請求與 gzip / brotli
+    extensions_map = {
+        **http.server.SimpleHTTPRequestHandler.extensions_map,
+        '.geojson': 'application/geo+json',
+        '.json': 'application/json',
+    }
+
+    def __init__(self, *args, cache=None, **kwargs):
+        self.cache = cache
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self):
+        self.send_cached(head_only=False)
+
+    def do_HEAD(self):
+        self.send_cached(head_only=True)
+
+    def send_cached(self, head_only):
+        path = self.translate_path(self.path)
+        if os.path.isdir(path) or not os.path.isfile(path):
+            # 目錄列表與 404 交由原本的處理方式
+            return super().do_HEAD() if head_only else super().do_GET()
+
+        entry = self.cache.get(path, os.stat(path))
+        if self.not_modified(entry):
+            self.send_response(304)
+            self.send_header('ETag', entry['etag'])
+            self.send_header('Last-Modified', entry['last_modified'])
+            self.end_headers()
+            return
+
+        content_type = self.guess_type(path)
+        encoding = self.choose_encoding(content_type, len(entry['bodies']['identity']))
+        body = self.cache.encoded(path, entry, encoding) if encoding != 'identity' else entry['bodies']['identity']
+
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', entry['etag'])
+        self.send_header('Last-Modified', entry['last_modified'])
+        self.send_header('Cache-Control', 'no-cache')  # 每次都以 ETag 確認，地圖重新產生後立即生效
+        self.send_header('Vary', 'Accept-Encoding')
+        if encoding != 'identity':
+            self.send_header('Content-Encoding', encoding)
+        self.end_headers()
+        if not head_only:
+            self.wfile.write(body)
+
+    def not_modified(self, entry):
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            return entry['etag'] in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                return entry['mtime'] <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def choose_encoding(self, content_type, size):
+        if size < MIN_COMPRESS_BYTES or not content_type.startswith(COMPRESSIBLE_TYPES):
+            return 'identity'
+        accepted = [part.split(';')[0].strip() for part in self.headers.get('Accept-Encoding', '').split(',')]
+        if brotli is not None and 'br' in accepted:
+            return 'br'
+        if 'gzip' in accepted:
+            return 'gzip'
+        return 'identity'
+
+    def log_message(self, format, *args):
+        # 地圖載入圖磚時請求很多，不逐一輸出到主控台
+        pass
+
+
+class MapServer:
+    # 程式內只建立一個的本地地圖服務器，在背景執行緒中持續執行，地圖重新產生後不需重啟
+
+    def __init__(self, directory, port=8000, host='127.0.0.1'):
+        self.directory = os.path.abspath(directory)
+        self.port = port
+        self.host = host
+        self.cache = FileCache()
+        self.httpd = None
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.httpd is not None:
+                return self
+            handler = partial(MapRequestHandler, directory=self.directory, cache=self.cache)
+            self.httpd = http.server.ThreadingHTTPServer((self.host, self.port), handler)
+            self.httpd.daemon_threads = True
+            self.port = self.httpd.server_address[1]
+            self.thread = threading.Thread(target=self.httpd.serve_forever, name='map-server', daemon=True)
+            self.thread.start()
+        return self
+
+    def url(self, file_name):
+        return f"http://localhost:{self.port}/{file_name}"
+
+    def shutdown(self):
+        with self.lock:
+            if self.httpd is None:
+                return
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+            self.thread = None
@@ -0,0 +1,55 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from map.openmap import build_map
+from map.overpass import OverpassCache, default_cache_path
+from map.place_store import default_output_dir, export_default_csv, open_default_store
+
+
+class MapBuildService:
+    # 常駐的地圖產生服務: folium 等套件只在匯入時載入一次，地點資料庫與 Overpass 快取的連線也只開啟一次
+    # 建圖在單一背景執行緒中依序執行，submit 立即回傳 Future，結果為 build_map 的 HTML 路徑與統計
+
+    def __init__(self, output_dir=None, served=True):
+        # served: 產生的地圖由 MapServer 提供，地點很多時可使用圖磚模式
+        self.output_dir = output_dir or default_output_dir()
+        self.served = served
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='map-build')
+        self.store = None
+        self.cache = None
+        self.lock = threading.Lock()
+
+    def open_store(self):
+        if self.store is None:
+            self.store = open_default_store(self.output_dir)
+        return self.store
+
+    def run(self, latitude, longitude, radius, places, render_mode):
+        with self.lock:
+            self.open_store()
+            if self.cache is None:
+                self.cache = OverpassCache(default_cache_path())
+            return build_map(latitude, longitude, radius, places, self.output_dir, self.store, render_mode,
+                             self.cache, self.served)
+
+    def submit(self, latitude, longitude, radius, places=None, render_mode='auto'):
+        return self.executor.submit(self.run, latitude, longitude, radius, places, render_mode)
+
+    def build(self, latitude, longitude, radius, places=None, render_mode='auto'):
+        return self.submit(latitude, longitude, radius, places, render_mode).result()
+
+    def export(self, latitude, longitude):
+        # 在建圖執行緒中匯出相容舊流程的 CSV (含與起點的距離與方位)，Future 的結果為 CSV 路徑
+        def run():
+            with self.lock:
+                return export_default_csv(self.open_store(), self.output_dir, origin=(latitude, longitude))
+        return self.executor.submit(run)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
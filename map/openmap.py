@@ -1,212 +1,85 @@
-import configparser
-import csv
 import os
 import shutil
-from math import radians, sin, cos, sqrt, atan2, degrees
+import sys
+import time
 
 import folium
-import requests
 from folium.plugins import Draw, MeasureControl
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-def haversine_distance(lat1, lon1, lat2, lon2):
-    R = 6371  # 地球半徑（公里）
-    dLat = radians(lat2 - lat1)
-    dLon = radians(lon2 - lon1)
-    a = sin(dLat / 2) * sin(dLat / 2) + cos(radians(lat1)) * cos(radians(lat2)) * sin(dLon / 2) * sin(dLon / 2)
-    c = 2 * atan2(sqrt(a), sqrt(1 - a))
-    return R * c * 1000  # 轉換為米
+from map.classify import default_classifier, process_elements
+from map.geo_distance import read_location
+from map.overpass import OverpassCache, default_cache_path
+from map.overpass_async import default_fetcher
+from map.place_store import default_output_dir, export_default_csv, open_default_store
+from map.render import PreclusteredPlaces, add_fast_cluster, category_style, choose_render_mode
+from map.tiler import TiledPlaces, write_tiles
 
 
-def get_direction(lat1, lon1, lat2, lon2):
-    dLon = lon2 - lon1
-    y = sin(radians(dLon)) * cos(radians(lat2))
-    x = cos(radians(lat1)) * sin(radians(lat2)) - sin(radians(lat1)) * cos(radians(lat2)) * cos(radians(dLon))
-    angle = degrees(atan2(y, x))
-
-    if angle < 0:
-        angle += 360
-
-    if 45 <= angle < 135:
-        return "東"
-    elif 135 <= angle < 225:
-        return "南"
-    elif 225 <= angle < 315:
-        return "西"
-    else:
-        return "北"
-
-
-def process_existing_places(file_path):
-    existing_places = {}
-    try:
-        with open(file_path, 'r', newline='', encoding='utf-8') as csvfile:
-            reader = csv.reader(csvfile)
-            next(reader)  # 跳過標題行
-            for row in reader:
-                if len(row) >= 3:
-                    name, lat, lon = row[:3]
-                    lat, lon = float(lat), float(lon)
-                    existing_places[(lat, lon)] = name
-    except Exception as e:
-        print(f"讀取文件時發生錯誤 {file_path}: {str(e)}")
-    return existing_places
-
-
-def process_place(element, existing_places, processed_coordinates, latitude, longitude):
-    if 'tags' not in element:
-        return None
-
-    lat = element['lat']
-    lon = element['lon']
-    key = (lat, lon)
-
-    if key in processed_coordinates:
-        return None
-
-    name = existing_places.get(key) or element['tags'].get('name', '')
-
-    # 篩選掉名稱為"蝦皮"或空白的地點
-    if name in ["蝦皮", "Unknown", ""]:
-        return None
-
-    if element['tags'].get('shop') == 'convenience':
-        place_type = '便利商店'
-    elif element['tags'].get('amenity') == 'restaurant':
-        place_type = '餐廳'
-    elif element['tags'].get('amenity') == 'cafe':
-        place_type = '咖啡廳'
-    elif element['tags'].get('cuisine') == 'breakfast':
-        place_type = '早餐店'
-    elif element['tags'].get('cuisine') == 'burger':
-        place_type = '漢堡店'
-    else:
-        return None
-
-    distance = haversine_distance(latitude, longitude, lat, lon)
-    direction = get_direction(latitude, longitude, lat, lon)
-
-    if distance <= 300:  # 確保在300米範圍內
-        processed_coordinates.add(key)
-        return {
-            'name': name,
-            'type': place_type,
-            'lat': lat,
-            'lon': lon,
-            'distance': distance,
-            'direction': direction,
-            'is_uploaded': key in existing_places
-        }
-    return None
-
-
-def initialize_map(latitude, longitude):
+def initialize_map(latitude, longitude, radius=300):
     m = folium.Map(location=[latitude, longitude], zoom_start=16)
     m.add_child(MeasureControl())
     folium.Marker([latitude, longitude], popup="指定位置").add_to(m)
     folium.Circle(
-        radius=300,
+        radius=radius,
         location=[latitude, longitude],
-        popup="300m範圍",
+        popup=f"{radius}m範圍",
         color="crimson",
         fill=True,
     ).add_to(m)
     return m
 
 
-def get_or_update_places(nearby_file, uploaded_file, latitude, longitude, radius):
-    if not os.path.exists(nearby_file) or not os.path.getsize(nearby_file):
-        # 如果 nearby_file 不存在或為空，從 API 獲取初始數據
-        places_dict = fetch_places_from_api(latitude, longitude, radius)
-        save_places_to_csv(places_dict, nearby_file)
+def get_or_update_places(store, latitude, longitude, radius, cache=None):
+    # 以地點資料庫的 R-tree 取出範圍內的地點；此範圍內沒有任何已知地點時才向 API 取得
+    # cache 為呼叫端持有的 OverpassCache，None 時只在需要抓取時開啟預設快取並於用完後關閉
+    nearby = store.query_radius(latitude, longitude, radius)
+    if not nearby:
+        existing_places = {(place['lat'], place['lon']): place['name']
+                           for place in store.all_places(uploaded_only=True)}
+        store.add_places(fetch_places_from_api(latitude, longitude, radius, cache=cache,
+                                               existing_places=existing_places).values())
+        nearby = store.query_radius(latitude, longitude, radius)
+
+    return {(place['lat'], place['lon']): place for place, _ in nearby}
+
+
+def fetch_places_from_api(latitude, longitude, radius, fetcher=None, cache=None, existing_places=None,
+                          classifier=None):
+    # 先查本地快取 (同一點較大半徑的結果也可過濾使用)，沒有才透過 fetcher 抓取
+    # fetcher 預設為 overpass_async.default_fetcher()，可替換成 overpass.fixture_fetcher 等本地來源
+    # existing_places 為 {(緯度, 經度): 名稱}，使用者上傳過的地點沿用上傳的名稱
+    # classifier 預設依 config.ini 的 [Categories] 建立，查詢的標籤也由它決定
+    # cache 為 None 時開啟預設快取，查詢結束後即關閉；傳入的快取由呼叫端負責關閉
+    classifier = classifier or default_classifier()
+    if cache is None:
+        with OverpassCache(default_cache_path()) as cache:
+            data = cache.fetch(latitude, longitude, radius, classifier.tags, fetcher or default_fetcher())
+    else:
+        data = cache.fetch(latitude, longitude, radius, classifier.tags, fetcher or default_fetcher())
+    return process_elements(data.get('elements', []), latitude, longitude, existing_places,
+                            max_distance=radius, classifier=classifier)
+
+
+def update_map(m, places_dict, mode='auto'):
+    # mode: markers (每個地點一個標記)、cluster (瀏覽器端聚合)、precluster (伺服器端預先聚合)，auto 依地點數選擇
+    if mode == 'auto':
+        mode = choose_render_mode(len(places_dict))
+
+    if mode == 'cluster':
+        add_fast_cluster(m, places_dict.values())
+    elif mode == 'precluster':
+        PreclusteredPlaces(places_dict.values()).add_to(m)
     else:
-        # 從 nearby_file 加載數據
-        places_dict = load_places_from_csv(nearby_file, uploaded_file)
-
-    # 如果 uploaded_file 存在，合併其中的數據
-    if os.path.exists(uploaded_file):
-        uploaded_places = load_places_from_csv(uploaded_file, None)
-        places_dict.update(uploaded_places)
-        save_places_to_csv(places_dict, nearby_file)
-
-    return places_dict
-
-
-def fetch_places_from_api(latitude, longitude, radius):
-    overpass_url = "http://overpass-api.de/api/interpreter"
-    overpass_query = f"""
-     [out:json];
-     (
-       node["shop"="convenience"](around:{radius},{latitude},{longitude});
-       node["amenity"="restaurant"](around:{radius},{latitude},{longitude});
-       node["amenity"="cafe"](around:{radius},{latitude},{longitude});
-       node["cuisine"="breakfast"](around:{radius},{latitude},{longitude});
-       node["cuisine"="burger"](around:{radius},{latitude},{longitude});
-     );
-     out body;
-     """
-
-    response = requests.get(overpass_url, params={'data': overpass_query})
-    data = response.json()
-
-    places_dict = {}
-    processed_coordinates = set()
-    existing_places = process_existing_places('uploaded_places.csv')
-
-    for element in data['elements']:
-        place = process_place(element, existing_places, processed_coordinates, latitude, longitude)
-        if place:
-            key = (place['lat'], place['lon'])
-            places_dict[key] = place
-
-    return places_dict
-
-
-def save_places_to_csv(places_dict, file_path):
-    with open(file_path, 'w', newline='', encoding='utf-8') as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(['名稱', '緯度', '經度'])
         for info in places_dict.values():
-            writer.writerow([info['name'], info['lat'], info['lon']])
-
-
-def load_places_from_csv(nearby_file, uploaded_file):
-    places_dict = {}
-    uploaded_places = set()
-
-    if uploaded_file and os.path.exists(uploaded_file):
-        with open(uploaded_file, 'r', newline='', encoding='utf-8') as csvfile:
-            reader = csv.reader(csvfile)
-            next(reader)  # 跳過標題行
-            for row in reader:
-                if len(row) >= 3:
-                    name, lat, lon = row[:3]
-                    uploaded_places.add(name)
-
-    with open(nearby_file, 'r', newline='', encoding='utf-8') as csvfile:
-        reader = csv.reader(csvfile)
-        next(reader)  # 跳過標題行
-        for row in reader:
-            if len(row) >= 3:
-                name, lat, lon = row[:3]
-                lat, lon = float(lat), float(lon)
-                places_dict[(lat, lon)] = {
-                    'name': name,
-                    'lat': lat,
-                    'lon': lon,
-                    'is_uploaded': name in uploaded_places
-                }
-    return places_dict
-
-
-def update_map(m, places_dict):
-    for info in places_dict.values():
-        icon_color = 'green' if info.get('is_uploaded', False) else 'orange'
-        folium.Marker(
-            [info['lat'], info['lon']],
-            popup=f"{info['name']}",
-            icon=folium.Icon(color=icon_color)
-        ).add_to(m)
+            icon_name, icon_color = category_style(info)
+            folium.Marker(
+                [info['lat'], info['lon']],
+                popup=f"{info['name']}",
+                icon=folium.Icon(color=icon_color, icon=icon_name)
+            ).add_to(m)
+    return mode
 
 
 def add_map_features(m):
@@ -221,57 +94,64 @@ def save_map(m, parent_dir):
     print(f"處理完成。請查看 '{output_html}' 文件。")
 
 
-def main():
-    try:
-        # 設定基本參數
-        config = configparser.ConfigParser()
-        config.read('config.ini')
-
-        # 獲取配置的值,如果沒有配置則使用默認值
-        latitude = config.getfloat('Location', 'latitude', fallback=25.0111)
-        longitude = config.getfloat('Location', 'longitude', fallback=121.5146)
-        radius = config.getint('Location', 'radius', fallback=300)
-
-        # 設定文件路徑
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        project_dir = os.path.dirname(current_dir)
-        output_dir = os.path.join(project_dir, 'output')
-
-        # 確保output資料夾存在
-        os.makedirs(output_dir, exist_ok=True)
+def build_map(latitude, longitude, radius, places=None, output_dir=None, store=None, render_mode='auto',
+              cache=None, served=False):
+    # 產生地圖 HTML，回傳 HTML 路徑與統計 (地點數、繪製模式、耗時毫秒)
+    # places 為 None 時由地點資料庫取得範圍內的地點 (必要時向 API 取得)
+    # render_mode 為 tiles 時地點寫成 output/tiles/ 的圖磚，需經由本地服務器開啟
+    # served: HTML 由 MapServer 提供；False 時 (以 file:// 開啟) auto 不會選擇 tiles，改用 cluster / precluster
+    start = time.perf_counter()
+    output_dir = output_dir or default_output_dir()
+    os.makedirs(output_dir, exist_ok=True)
 
-        nearby_file = os.path.join(output_dir, 'nearby_places_osm.csv')
-        uploaded_file = os.path.join(output_dir, 'uploaded_places.csv')
-
-        print("current_dir =", current_dir)
-        print("project_dir =", project_dir)
-        print("output_dir =", output_dir)
-        print("nearby_file =", nearby_file)
-        print("uploaded_file =", uploaded_file)
-
-        # 確保 uploaded_places.csv 存在
-        if not os.path.exists(uploaded_file):
-            with open(uploaded_file, 'w', newline='', encoding='utf-8') as file:
-                writer = csv.writer(file)
-                writer.writerow(['名稱', '緯度', '經度'])
-            print("已創建空的 uploaded_places.csv 文件")
+    own_store = store is None
+    if own_store:
+        store = open_default_store(output_dir)
+    try:
+        if places is None:
+            places_dict = get_or_update_places(store, latitude, longitude, radius, cache)
+        else:
+            places_dict = {(place['lat'], place['lon']): place for place in places}
+
+        m = initialize_map(latitude, longitude, radius)
+        if render_mode == 'auto':
+            render_mode = choose_render_mode(len(places_dict), tiled=served)
+        if render_mode == 'tiles':
+            # 圖磚寫入 output/tiles/，HTML 只嵌入有資料的圖磚清單
+            keys = write_tiles(places_dict.values(), os.path.join(output_dir, 'tiles'))
+            TiledPlaces(keys).add_to(m)
+        else:
+            update_map(m, places_dict, render_mode)
+        add_map_features(m)
 
-        # 獲取或更新地點數據
-        places_dict = get_or_update_places(nearby_file, uploaded_file, latitude, longitude, radius)
+        output_html = os.path.join(output_dir, 'map_with_nearby_places_osm.html')
+        m.save(output_html)
+    finally:
+        if own_store:
+            store.close()
 
-        # 初始化地圖
-        m = initialize_map(latitude, longitude)
+    return {
+        'html_path': output_html,
+        'places': len(places_dict),
+        'render_mode': render_mode,
+        'build_time': (time.perf_counter() - start) * 1000,  # 毫秒
+    }
 
-        # 更新地圖
-        update_map(m, places_dict)
 
-        # 添加額外的地圖功能
-        add_map_features(m)
+def main():
+    try:
+        # 獲取配置的值,如果沒有配置則使用默認值
+        latitude, longitude, radius = read_location('config.ini')
 
-        # 保存地圖
-        output_html = os.path.join(output_dir, 'map_with_nearby_places_osm.html')
-        m.save(output_html)
+        result = build_map(latitude, longitude, radius)
+        output_html = result['html_path']
         print(f"處理完成。HTML 文件已保存至: '{output_html}'")
+        print(f"共 {result['places']} 個地點，耗時 {result['build_time']:.2f} 毫秒")
+
+        # 命令列流程輸出相容舊流程的 CSV (move_files_to_external_folder 會一併移動)；建圖本身不再輸出
+        with open_default_store() as store:
+            exported = export_default_csv(store, origin=(latitude, longitude))
+        print(f"CSV 文件已保存至: '{exported}'")
 
         if os.path.exists(output_html):
             print("HTML 文件成功創建")
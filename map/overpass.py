@@ -0,0 +1,200 @@
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import zlib
+
+import requests
+
+from map.classify import DEFAULT_CATEGORIES, category_tags
+from map.geo_distance import haversine_matrix
+
+OVERPASS_URL = "http://overpass-api.de/api/interpreter"
+# 主伺服器持續回應 429/5xx 或無法連線時依序改用的鏡像站
+OVERPASS_MIRRORS = (
+    OVERPASS_URL,
+    "https://overpass.kumi.systems/api/interpreter",
+)
+REQUEST_TIMEOUT = 30  # 秒
+# 同步與非同步版本共用的重試策略: 429/5xx 或連線失敗時換下一個鏡像站，並以指數退避等待
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0  # 秒，第 n 次重試等待 BACKOFF_BASE * 2^n (加上隨機抖動)
+BACKOFF_MAX = 60.0
+RETRY_STATUS = (429, 502, 503, 504)
+
+# 預設查詢的標籤 (key, value)，由 classify.DEFAULT_CATEGORIES 的類型表產生
+PLACE_TAGS = category_tags(DEFAULT_CATEGORIES)
+
+
+class OverpassError(Exception):
+    pass
+
+
+def retry_delay(attempt, retry_after=None, backoff=BACKOFF_BASE):
+    # 有 Retry-After 標頭時依伺服器指示等待，否則為 backoff * 2^attempt 的 50% ~ 100%
+    if retry_after:
+        try:
+            return min(float(retry_after), BACKOFF_MAX)
+        except ValueError:
+            pass
+    delay = min(backoff * 2 ** attempt, BACKOFF_MAX)
+    return delay * (0.5 + random.random() / 2)
+
+
+def build_overpass_query(latitude, longitude, radius, tags=PLACE_TAGS):
+    nodes = "\n".join(f'       node["{key}"="{value}"](around:{radius},{latitude},{longitude});'
+                      for key, value in tags)
+    return f"""
+     [out:json];
+     (
+{nodes}
+     );
+     out body;
+     """
+
+
+def fetch_overpass(latitude, longitude, radius, tags=PLACE_TAGS, url=OVERPASS_MIRRORS, max_retries=MAX_RETRIES,
+                   backoff=BACKOFF_BASE):
+    # 沒有 aiohttp 時的抓取函數: 以 requests 向 Overpass API 發出 HTTP 請求，回傳解析後的 JSON
+    # 重試與鏡像站輪替與 AsyncOverpassClient.query 相同，最後仍失敗時拋出 OverpassError
+    # 測試時可用 functools.partial(fetch_overpass, url=...) 指向本地替代伺服器
+    urls = [url] if isinstance(url, str) else list(url)
+    query = build_overpass_query(latitude, longitude, radius, tags)
+    error = None
+    for attempt in range(max_retries + 1):
+        retry_after = None
+        try:
+            response = requests.post(urls[attempt % len(urls)], data={'data': query}, timeout=REQUEST_TIMEOUT)
+            if response.status_code in RETRY_STATUS:
+                retry_after = response.headers.get('Retry-After')
+                error = OverpassError(f"Overpass 回應 {response.status_code}")
+            else:
+                response.raise_for_status()
+                return response.json()
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = e
+        except (requests.HTTPError, ValueError) as e:
+            raise OverpassError(f"Overpass 查詢失敗: {e}") from e
+        if attempt < max_retries:
+            time.sleep(retry_delay(attempt, retry_after, backoff))
+    raise OverpassError(f"Overpass 查詢失敗 ({max_retries + 1} 次): {error}")
+
+
+def fixture_fetcher(file_path):
+    # 測試用的抓取函數: 從本地 JSON 檔案讀取 Overpass 回應，不連網
+    def fetch(latitude, longitude, radius, tags=PLACE_TAGS):
+        with open(file_path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+
+    return fetch
+
+
+def filter_elements(elements, latitude, longitude, radius):
+    # 只保留距離中心點 radius 米以內的節點
+    located = [element for element in elements if 'lat' in element and 'lon' in element]
+    if not located:
+        return []
+    lats = [element['lat'] for element in located]
+    lons = [element['lon'] for element in located]
+    distances = haversine_matrix([latitude], [longitude], lats, lons)[0]
+    return [element for element, distance in zip(located, distances) if distance <= radius]
+
+
+class OverpassCache:
+    # 以 SQLite 儲存壓縮後的 Overpass 回應，依 (緯度, 經度, 半徑, 標籤) 為鍵
+    # 同一中心點、較小半徑的查詢直接由較大半徑的快取過濾得到，不重新抓取
+
+    def __init__(self, db_path, ttl=7 * 24 * 3600, max_bytes=50 * 1024 * 1024):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        if db_path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                lat REAL NOT NULL,
+                lon REAL NOT NULL,
+                tags TEXT NOT NULL,
+                radius INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                size INTEGER NOT NULL,
+                payload BLOB NOT NULL,
+                PRIMARY KEY (lat, lon, tags, radius)
+            )""")
+        self.conn.commit()
+
+    @staticmethod
+    def normalize(latitude, longitude, radius, tags):
+        # 座標取到小數點後6位 (約0.1米)，標籤排序後序列化
+        tag_key = json.dumps(sorted([list(tag) for tag in tags]), ensure_ascii=False)
+        return round(float(latitude), 6), round(float(longitude), 6), int(round(radius)), tag_key
+
+    def get(self, latitude, longitude, radius, tags=PLACE_TAGS):
+        lat, lon, radius, tag_key = self.normalize(latitude, longitude, radius, tags)
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT radius, payload FROM responses "
+                "WHERE lat = ? AND lon = ? AND tags = ? AND radius >= ? AND fetched_at >= ? "
+                "ORDER BY radius LIMIT 1",
+                (lat, lon, tag_key, radius, now - self.ttl)).fetchone()
+            if row is None:
+                return None
+            self.conn.execute("UPDATE responses SET last_used = ? WHERE lat = ? AND lon = ? AND tags = ? AND radius = ?",
+                              (now, lat, lon, tag_key, row[0]))
+            self.conn.commit()
+
+        data = json.loads(zlib.decompress(row[1]).decode('utf-8'))
+        if row[0] > radius:
+            data['elements'] = filter_elements(data.get('elements', []), lat, lon, radius)
+        return data
+
+    def put(self, latitude, longitude, radius, data, tags=PLACE_TAGS):
+        lat, lon, radius, tag_key = self.normalize(latitude, longitude, radius, tags)
+        payload = zlib.compress(json.dumps(data, ensure_ascii=False).encode('utf-8'))
+        now = time.time()
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                              (lat, lon, tag_key, radius, now, now, len(payload), payload))
+            self.evict(now)
+            self.conn.commit()
+
+    def evict(self, now):
+        # 先刪除過期資料，總大小仍超過上限時依最久未使用的順序刪除
+        self.conn.execute("DELETE FROM responses WHERE fetched_at < ?", (now - self.ttl,))
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for lat, lon, tag_key, radius, size in self.conn.execute(
+                "SELECT lat, lon, tags, radius, size FROM responses ORDER BY last_used").fetchall():
+            self.conn.execute("DELETE FROM responses WHERE lat = ? AND lon = ? AND tags = ? AND radius = ?",
+                              (lat, lon, tag_key, radius))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def fetch(self, latitude, longitude, radius, tags=PLACE_TAGS, fetcher=fetch_overpass):
+        data = self.get(latitude, longitude, radius, tags)
+        if data is None:
+            data = fetcher(latitude, longitude, radius, tags)
+            self.put(latitude, longitude, radius, data, tags)
+        return data
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+
+def default_cache_path():
+    project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(project_dir, 'output', 'cache', 'overpass.sqlite')
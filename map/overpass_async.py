@@ -0,0 +1,163 @@
+import asyncio
+import math
+import threading
+
+try:
+    import aiohttp
+except ImportError:  # aiohttp 為選用套件，沒有安裝時改用 overpass.fetch_overpass (requests)
+    aiohttp = None
+
+from map.geo_distance import EARTH_RADIUS
+from map.overpass import (BACKOFF_BASE, MAX_RETRIES, OVERPASS_MIRRORS, PLACE_TAGS, REQUEST_TIMEOUT, RETRY_STATUS,
+                          OverpassError, build_overpass_query, fetch_overpass, filter_elements, retry_delay)
+
+MAX_CONCURRENCY = 4  # 同時進行的請求數上限 (Overpass 公用伺服器對單一來源有限制)
+TILE_RADIUS = 1000  # 半徑超過此值時切成多個子查詢並行送出（米）
+
+
+def tile_circle(latitude, longitude, radius, tile_radius=TILE_RADIUS):
+    # 以邊長 tile_radius * √2 的方格覆蓋查詢圓，每格以半徑 tile_radius 的外接圓查詢，回傳子查詢圓心
+    if radius <= tile_radius:
+        return [(latitude, longitude, radius)]
+    step = tile_radius * math.sqrt(2)
+    k = math.ceil((radius - step / 2) / step)
+    cos_lat = max(math.cos(math.radians(latitude)), 1e-6)
+    tiles = []
+    for i in range(-k, k + 1):
+        for j in range(-k, k + 1):
+            # 方格內離圓心最近的點仍在圓外時略過
+            dx = max(abs(i) * step - step / 2, 0)
+            dy = max(abs(j) * step - step / 2, 0)
+            if math.hypot(dx, dy) > radius:
+                continue
+            tiles.append((latitude + math.degrees(j * step / EARTH_RADIUS),
+                          longitude + math.degrees(i * step / EARTH_RADIUS) / cos_lat,
+                          tile_radius))
+    return tiles
+
+
+def merge_elements(results):
+    # 合併多個子查詢的結果，依 (type, id) 去除重複
+    merged = {}
+    for data in results:
+        for element in data.get('elements', []):
+            if 'id' in element:
+                key = (element.get('type', 'node'), element['id'])
+            else:
+                key = (element.get('lat'), element.get('lon'))
+            merged.setdefault(key, element)
+    return list(merged.values())
+
+
+class AsyncOverpassClient:
+    # 以 aiohttp 連線池查詢 Overpass: 限制同時請求數、逾時、429/5xx 時指數退避重試，
+    # 大半徑切成子查詢並行送出後依節點 id 合併
+    # url 可為單一網址或網址列表 (主伺服器在前)，每次重試輪流改用下一個鏡像站
+
+    def __init__(self, url=OVERPASS_MIRRORS, concurrency=MAX_CONCURRENCY, timeout=REQUEST_TIMEOUT,
+                 max_retries=MAX_RETRIES, backoff=BACKOFF_BASE, tile_radius=TILE_RADIUS):
+        if aiohttp is None:
+            raise ImportError("AsyncOverpassClient 需要安裝 aiohttp")
+        self.urls = [url] if isinstance(url, str) else list(url)
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.tile_radius = tile_radius
+        self.session = None
+        self.semaphore = None
+
+    def ensure_session(self):
+        # session 與 semaphore 必須在事件迴圈內建立
+        if self.session is None:
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.concurrency),
+                timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        self.ensure_session()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def retry_delay(self, attempt, retry_after=None):
+        return retry_delay(attempt, retry_after, self.backoff)
+
+    async def query(self, latitude, longitude, radius, tags=PLACE_TAGS):
+        # 單一 around 查詢，可重試的錯誤會在釋放並行名額後等待再重試；其他 HTTP 錯誤直接拋出 OverpassError
+        self.ensure_session()
+        query = build_overpass_query(latitude, longitude, radius, tags)
+        error = None
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            url = self.urls[attempt % len(self.urls)]
+            async with self.semaphore:
+                try:
+                    async with self.session.post(url, data={'data': query}) as response:
+                        if response.status in RETRY_STATUS:
+                            retry_after = response.headers.get('Retry-After')
+                            error = OverpassError(f"Overpass 回應 {response.status}")
+                        else:
+                            response.raise_for_status()
+                            return await response.json(content_type=None)
+                except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+                    error = e
+                except (aiohttp.ClientResponseError, ValueError) as e:
+                    raise OverpassError(f"Overpass 查詢失敗: {e}") from e
+            if attempt < self.max_retries:
+                await asyncio.sleep(self.retry_delay(attempt, retry_after))
+        raise OverpassError(f"Overpass 查詢失敗 ({self.max_retries + 1} 次): {error}")
+
+    async def fetch(self, latitude, longitude, radius, tags=PLACE_TAGS):
+        tiles = tile_circle(latitude, longitude, radius, self.tile_radius)
+        if len(tiles) == 1:
+            return await self.query(latitude, longitude, radius, tags)
+        results = await asyncio.gather(*(self.query(lat, lon, r, tags) for lat, lon, r in tiles))
+        return {'elements': filter_elements(merge_elements(results), latitude, longitude, radius)}
+
+    async def fetch_many(self, queries, tags=PLACE_TAGS):
+        # queries 為 [(緯度, 經度, 半徑)]，全部並行 (受同時請求數上限約束)
+        return await asyncio.gather(*(self.fetch(lat, lon, radius, tags) for lat, lon, radius in queries))
+
+
+class AsyncOverpassFetcher:
+    # 在背景執行緒中常駐一個事件迴圈與連線池，對外提供與 fetch_overpass 相同的同步介面，
+    # 可直接交給 OverpassCache.fetch；多個執行緒同時呼叫時共用同一個並行上限
+
+    def __init__(self, **client_kwargs):
+        self.client = AsyncOverpassClient(**client_kwargs)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='overpass-loop', daemon=True)
+        self.thread.start()
+
+    def __call__(self, latitude, longitude, radius, tags=PLACE_TAGS):
+        future = asyncio.run_coroutine_threadsafe(self.client.fetch(latitude, longitude, radius, tags), self.loop)
+        return future.result()
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self.client.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+_default_fetcher = None
+_default_lock = threading.Lock()
+
+
+def default_fetcher():
+    # 有 aiohttp 時使用共用的 AsyncOverpassFetcher，否則使用 requests 版本的 fetch_overpass
+    global _default_fetcher
+    if aiohttp is None:
+        return fetch_overpass
+    with _default_lock:
+        if _default_fetcher is None:
+            _default_fetcher = AsyncOverpassFetcher()
+        return _default_fetcher
@@ -0,0 +1,233 @@
+import csv
+import math
+import os
+import sqlite3
+import threading
+
+from map.geo_distance import EARTH_RADIUS, bearing_matrix, compass_labels, haversine_matrix
+
+CSV_HEADER = ['名稱', '緯度', '經度']
+ORIGIN_CSV_COLUMNS = ['距離(米)', '方位角', '方位']
+
+
+class PlaceStore:
+    # 以 SQLite 儲存所有地點 (WAL 模式)，名稱與座標皆有索引，並以 R-tree 加速範圍查詢
+    # is_uploaded = 1 表示由使用者上傳的地點 (對應舊的 uploaded_places.csv)
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.RLock()
+        if db_path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS places (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                lat REAL NOT NULL,
+                lon REAL NOT NULL,
+                type TEXT,
+                is_uploaded INTEGER NOT NULL DEFAULT 0,
+                UNIQUE (lat, lon)
+            );
+            CREATE INDEX IF NOT EXISTS idx_places_name ON places (name);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        """)
+        self.has_rtree = self.create_rtree()
+        self.conn.commit()
+
+    def create_rtree(self):
+        # 部分 SQLite 編譯版本沒有 R-tree 模組，此時改用 (lat, lon) 唯一索引做範圍查詢
+        try:
+            self.conn.executescript("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS places_rtree USING rtree(id, min_lat, max_lat, min_lon, max_lon);
+                CREATE TRIGGER IF NOT EXISTS places_rtree_insert AFTER INSERT ON places BEGIN
+                    INSERT INTO places_rtree VALUES (new.id, new.lat, new.lat, new.lon, new.lon);
+                END;
+                CREATE TRIGGER IF NOT EXISTS places_rtree_delete AFTER DELETE ON places BEGIN
+                    DELETE FROM places_rtree WHERE id = old.id;
+                END;
+                CREATE TRIGGER IF NOT EXISTS places_rtree_update AFTER UPDATE OF lat, lon ON places BEGIN
+                    UPDATE places_rtree SET min_lat = new.lat, max_lat = new.lat, min_lon = new.lon, max_lon = new.lon
+                    WHERE id = new.id;
+                END;
+            """)
+            return True
+        except sqlite3.OperationalError:
+            return False
+
+    @staticmethod
+    def row_to_place(row):
+        return {
+            'name': row[0],
+            'lat': row[1],
+            'lon': row[2],
+            'type': row[3],
+            'is_uploaded': bool(row[4]),
+        }
+
+    def add_places(self, rows, uploaded=False):
+        # rows 為 (名稱, 緯度, 經度) 或含 name/lat/lon 的字典；座標已存在的地點不重複新增
+        # 上傳的地點若座標已存在，只標記為已上傳並更新名稱
+        records = []
+        for row in rows:
+            if isinstance(row, dict):
+                records.append((str(row['name']).strip(), float(row['lat']), float(row['lon']), row.get('type')))
+            else:
+                records.append((str(row[0]).strip(), float(row[1]), float(row[2]), None))
+
+        if uploaded:
+            sql = ("INSERT INTO places (name, lat, lon, type, is_uploaded) VALUES (?, ?, ?, ?, 1) "
+                   "ON CONFLICT (lat, lon) DO UPDATE SET name = excluded.name, is_uploaded = 1 WHERE is_uploaded = 0")
+        else:
+            sql = "INSERT OR IGNORE INTO places (name, lat, lon, type, is_uploaded) VALUES (?, ?, ?, ?, 0)"
+
+        with self.lock:
+            # 新增的地點 id 依序遞增，以最大 id 的差值計算新增筆數 (更新既有地點不計入)
+            before = self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM places").fetchone()[0]
+            self.conn.executemany(sql, records)
+            added = self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM places").fetchone()[0] - before
+            self.conn.commit()
+        return added
+
+    def rename(self, old_name, new_name):
+        with self.lock:
+            cursor = self.conn.execute("UPDATE places SET name = ? WHERE name = ?", (new_name.strip(), old_name.strip()))
+            self.conn.commit()
+        return cursor.rowcount
+
+    def delete(self, name):
+        with self.lock:
+            cursor = self.conn.execute("DELETE FROM places WHERE name = ?", (name.strip(),))
+            self.conn.commit()
+        return cursor.rowcount
+
+    def find(self, name):
+        with self.lock:
+            rows = self.conn.execute("SELECT name, lat, lon, type, is_uploaded FROM places WHERE name = ?",
+                                     (name.strip(),)).fetchall()
+        return [self.row_to_place(row) for row in rows]
+
+    def all_places(self, uploaded_only=False):
+        sql = "SELECT name, lat, lon, type, is_uploaded FROM places"
+        if uploaded_only:
+            sql += " WHERE is_uploaded = 1"
+        with self.lock:
+            rows = self.conn.execute(sql + " ORDER BY id").fetchall()
+        return [self.row_to_place(row) for row in rows]
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM places").fetchone()[0]
+
+    def places_in_bbox(self, min_lat, max_lat, min_lon, max_lon):
+        if self.has_rtree:
+            sql = ("SELECT p.name, p.lat, p.lon, p.type, p.is_uploaded FROM places_rtree r "
+                   "JOIN places p ON p.id = r.id "
+                   "WHERE r.max_lat >= ? AND r.min_lat <= ? AND r.max_lon >= ? AND r.min_lon <= ?")
+        else:
+            sql = ("SELECT name, lat, lon, type, is_uploaded FROM places "
+                   "WHERE lat >= ? AND lat <= ? AND lon >= ? AND lon <= ?")
+        with self.lock:
+            rows = self.conn.execute(sql, (min_lat, max_lat, min_lon, max_lon)).fetchall()
+        # R-tree 以 float32 儲存邊界，最後再以原始座標確認
+        return [self.row_to_place(row) for row in rows
+                if min_lat <= row[1] <= max_lat and min_lon <= row[2] <= max_lon]
+
+    def query_radius(self, lat, lon, r):
+        # 先以外接矩形從 R-tree 取出候選，再以 haversine 過濾，回傳依距離排序的 (地點, 距離)
+        d_lat = math.degrees(r / EARTH_RADIUS)
+        d_lon = d_lat / max(math.cos(math.radians(lat)), 1e-6)
+        candidates = self.places_in_bbox(lat - d_lat, lat + d_lat, lon - d_lon, lon + d_lon)
+        if not candidates:
+            return []
+        distances = haversine_matrix([lat], [lon], [place['lat'] for place in candidates],
+                                     [place['lon'] for place in candidates])[0]
+        nearby = [(place, float(distance)) for place, distance in zip(candidates, distances) if distance <= r]
+        return sorted(nearby, key=lambda item: item[1])
+
+    def import_csv(self, file_path, uploaded=False):
+        rows = []
+        with open(file_path, 'r', newline='', encoding='utf-8') as csvfile:
+            reader = csv.reader(csvfile)
+            next(reader, None)  # 跳過標題行
+            for row in reader:
+                if len(row) >= 3:
+                    try:
+                        rows.append((row[0], float(row[1]), float(row[2])))
+                    except ValueError:
+                        continue
+        return self.add_places(rows, uploaded)
+
+    def export_csv(self, file_path, uploaded_only=False, origin=None, points=8):
+        # origin 為 (緯度, 經度) 時另外輸出與起點的距離、方位角與方位 (前三欄不變，仍可再匯入)
+        places = self.all_places(uploaded_only)
+        with open(file_path, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile)
+            if origin is None or not places:
+                writer.writerow(CSV_HEADER)
+                for place in places:
+                    writer.writerow([place['name'], place['lat'], place['lon']])
+                return len(places)
+
+            lats = [place['lat'] for place in places]
+            lons = [place['lon'] for place in places]
+            distances = haversine_matrix([origin[0]], [origin[1]], lats, lons)[0]
+            bearings = bearing_matrix([origin[0]], [origin[1]], lats, lons)[0]
+            directions = compass_labels(bearings, points)
+            writer.writerow(CSV_HEADER + ORIGIN_CSV_COLUMNS)
+            for place, distance, bearing, direction in zip(places, distances.tolist(), bearings.tolist(), directions):
+                writer.writerow([place['name'], place['lat'], place['lon'], round(distance, 1), round(bearing, 1),
+                                 direction])
+        return len(places)
+
+    def get_meta(self, key):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+            self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def default_output_dir():
+    project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(project_dir, 'output')
+
+
+def open_default_store(output_dir=None):
+    # 開啟 output/places.sqlite；第一次開啟時匯入既有的兩份 CSV
+    output_dir = output_dir or default_output_dir()
+    store = PlaceStore(os.path.join(output_dir, 'places.sqlite'))
+    if store.get_meta('csv_imported') is None:
+        nearby_file = os.path.join(output_dir, 'nearby_places_osm.csv')
+        uploaded_file = os.path.join(output_dir, 'uploaded_places.csv')
+        if os.path.exists(uploaded_file):
+            store.import_csv(uploaded_file, uploaded=True)
+        if os.path.exists(nearby_file):
+            store.import_csv(nearby_file)
+        store.set_meta('csv_imported', '1')
+    return store
+
+
+def export_default_csv(store, output_dir=None, origin=None):
+    # 為相容舊流程輸出兩份 CSV (nearby 為全部地點，uploaded 為使用者上傳的地點)，回傳 nearby 的路徑
+    # 只在需要時呼叫 (GUI 的匯出按鈕、openmap 命令列流程)，建圖時不會輸出
+    output_dir = output_dir or default_output_dir()
+    nearby_file = os.path.join(output_dir, 'nearby_places_osm.csv')
+    store.export_csv(nearby_file, origin=origin)
+    store.export_csv(os.path.join(output_dir, 'uploaded_places.csv'), uploaded_only=True, origin=origin)
+    return nearby_file
@@ -0,0 +1,158 @@
+import json
+
+import numpy as np
+from branca.element import MacroElement
+from folium.plugins import FastMarkerCluster
+from jinja2 import Template
+
+# 依 classify 的地點類型選擇圖示 (glyphicon 名稱, 顏色)
+CATEGORY_STYLES = {
+    '便利商店': ('shopping-cart', 'blue'),
+    '餐廳': ('cutlery', 'red'),
+    '咖啡廳': ('glass', 'darkred'),
+    '早餐店': ('time', 'cadetblue'),
+    '漢堡店': ('fire', 'darkpurple'),
+}
+UPLOADED_STYLE = ('star', 'green')  # 使用者上傳的地點
+DEFAULT_STYLE = ('map-marker', 'orange')
+
+MARKER_LIMIT = 300  # 地點數不超過此值時每個地點一個 folium.Marker
+CLUSTER_LIMIT = 10000  # 不超過此值時以 FastMarkerCluster 在瀏覽器端聚合，超過則在伺服器端預先聚合
+DETAIL_ZOOM = 16  # 預先聚合模式下，縮放至此層級才顯示個別地點
+CLUSTER_CELL_PIXELS = 60  # 預先聚合的格子大小 (螢幕像素)
+
+STYLES = [DEFAULT_STYLE, UPLOADED_STYLE] + list(CATEGORY_STYLES.values())
+STYLE_INDEX = {style: i for i, style in enumerate(STYLES)}
+
+# 聚合圓點與地點標記的共用 JS (cluster、precluster、tiles 三種模式的標記樣式一致)
+# placeMarker 的 style 為 STYLES 中的一項 [圖示, 顏色]
+PLACE_MARKER_JS = """
+            function clusterIcon(count) {
+                var size = count < 10 ? 30 : count < 100 ? 36 : count < 1000 ? 42 : 50;
+                return L.divIcon({
+                    html: '<div style="width:' + size + 'px;height:' + size + 'px;line-height:' + size +
+                          'px;border-radius:50%;background:rgba(231,76,60,0.75);color:#fff;' +
+                          'text-align:center;font-weight:bold;">' + count + '</div>',
+                    className: '',
+                    iconSize: [size, size]
+                });
+            }
+
+            function placeMarker(latlng, name, style) {
+                var label = document.createElement('span');
+                label.textContent = name;
+                return L.marker(latlng, {
+                    icon: L.AwesomeMarkers.icon({icon: style[0], markerColor: style[1], prefix: 'glyphicon'})
+                }).bindPopup(label);
+            }
+"""
+
+# FastMarkerCluster 每列資料: [緯度, 經度, 名稱, 圖示編號]，圖示表只嵌入一次
+MARKER_CALLBACK = """(function() {
+    var styles = %s;
+""" + PLACE_MARKER_JS.replace('%', '%%') + """
+    return function(row) {
+        return placeMarker(new L.LatLng(row[0], row[1]), row[2], styles[row[3]]);
+    };
+})()"""
+
+
+def category_style(place):
+    if place.get('is_uploaded'):
+        return UPLOADED_STYLE
+    return CATEGORY_STYLES.get(place.get('type'), DEFAULT_STYLE)
+
+
+def choose_render_mode(count, tiled=False):
+    # tiled: 地圖由本地服務器提供時，大量地點改為輸出圖磚，只載入畫面內的部分
+    if count <= MARKER_LIMIT:
+        return 'markers'
+    if count <= CLUSTER_LIMIT:
+        return 'cluster'
+    return 'tiles' if tiled else 'precluster'
+
+
+def place_rows(places):
+    return [[place['lat'], place['lon'], place['name'], STYLE_INDEX[category_style(place)]] for place in places]
+
+
+def add_fast_cluster(m, places):
+    # 所有地點以一個陣列嵌入 HTML，由 Leaflet.markercluster 在瀏覽器端聚合
+    FastMarkerCluster(place_rows(places), callback=MARKER_CALLBACK % json.dumps(STYLES), name='地點').add_to(m)
+
+
+def mercator(lats, lons):
+    # 經緯度轉為 [0, 1) 的 Web Mercator 座標
+    lats = np.clip(np.asarray(lats, dtype=np.float64), -85.05112878, 85.05112878)
+    x = (np.asarray(lons, dtype=np.float64) + 180.0) / 360.0
+    y = (1.0 - np.log(np.tan(np.radians(lats)) + 1.0 / np.cos(np.radians(lats))) / np.pi) / 2.0
+    return x, y
+
+
+def precluster(lats, lons, max_zoom, cell_pixels=CLUSTER_CELL_PIXELS):
+    # 每個縮放層級把地點依螢幕格子分組，回傳 {層級: [[平均緯度, 平均經度, 數量], ...]}
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    x, y = mercator(lats, lons)
+    clusters = {}
+    for zoom in range(max_zoom):
+        cells = 256 * 2 ** zoom / cell_pixels
+        cx = np.floor(x * cells).astype(np.int64)
+        cy = np.floor(y * cells).astype(np.int64)
+        _, inverse, counts = np.unique(cx * (int(cells) + 1) + cy, return_inverse=True, return_counts=True)
+        mean_lat = np.bincount(inverse, weights=lats) / counts
+        mean_lon = np.bincount(inverse, weights=lons) / counts
+        clusters[zoom] = [[round(lat, 6), round(lon, 6), int(count)]
+                          for lat, lon, count in zip(mean_lat.tolist(), mean_lon.tolist(), counts.tolist())]
+    return clusters
+
+
+class PreclusteredPlaces(MacroElement):
+    # 伺服器端預先聚合: 縮放層級低於 detail_zoom 時只畫該層級的聚合圓點，
+    # 達到 detail_zoom 後只為目前畫面範圍內的地點建立標記，移動地圖時重新繪製
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        (function() {
+            var map = {{ this._parent.get_name() }};
+            var points = {{ this.points|tojson }};
+            var clusters = {{ this.clusters|tojson }};
+            var styles = {{ this.styles|tojson }};
+            var detailZoom = {{ this.detail_zoom }};
+            var layer = L.layerGroup().addTo(map);
+            {{ this.marker_js }}
+
+            function render() {
+                layer.clearLayers();
+                var zoom = map.getZoom();
+                var bounds = map.getBounds().pad(0.2);
+                if (zoom < detailZoom) {
+                    (clusters[zoom] || []).forEach(function(row) {
+                        if (!bounds.contains([row[0], row[1]])) return;
+                        L.marker([row[0], row[1]], {icon: clusterIcon(row[2])})
+                            .on('click', function() { map.setView([row[0], row[1]], zoom + 2); })
+                            .addTo(layer);
+                    });
+                    return;
+                }
+                points.forEach(function(row) {
+                    if (!bounds.contains([row[0], row[1]])) return;
+                    placeMarker([row[0], row[1]], row[2], styles[row[3]]).addTo(layer);
+                });
+            }
+
+            map.on('moveend', render);
+            render();
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, places, detail_zoom=DETAIL_ZOOM):
+        super().__init__()
+        self._name = 'PreclusteredPlaces'
+        places = list(places)
+        self.points = place_rows(places)
+        self.clusters = precluster([place['lat'] for place in places], [place['lon'] for place in places],
+                                   detail_zoom)
+        self.styles = STYLES
+        self.marker_js = PLACE_MARKER_JS
+        self.detail_zoom = detail_zoom
@@ -0,0 +1,156 @@
+import os
+import sys
+import time
+
+import folium
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# algorithm/ 內的模組以平面方式互相匯入 (例如 from convergence import ...)，與直接執行 algorithm/ 的腳本相同
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'algorithm'))
+
+from algorithm.DP_TSP import run_dp
+from algorithm.LK_Chained import run_lk
+from map.geo_distance import (build_bearingmap, build_distmap, haversine_matrix, read_location, route_directions,
+                              route_points)
+from map.openmap import add_map_features, initialize_map
+from map.place_store import default_output_dir, open_default_store
+from map.render import category_style
+
+# 城市數 (含起點) 不超過此值時以 Held-Karp 求精確解，否則以 Chained Lin-Kernighan 求近似解
+# 實測 Held-Karp 在 16 城約 30 毫秒、18 城約 180 毫秒、20 城超過 1 秒，而 LK 約需 250 毫秒以上
+EXACT_MAX_CITIES = 17
+MAX_STOPS = 200  # 未指定地點時最多取距離起點最近的幾個地點
+
+
+def select_places(store, latitude, longitude, radius, names=None, limit=MAX_STOPS):
+    # names 為 None 時取範圍內距離起點最近的 limit 個地點；否則依名稱挑選，同名地點取離起點最近的一個
+    if names is None:
+        return [place for place, _ in store.query_radius(latitude, longitude, radius)[:limit]]
+
+    selected = []
+    missing = []
+    for name in names:
+        matches = store.find(name)
+        if not matches:
+            missing.append(name)
+            continue
+        distances = haversine_matrix([latitude], [longitude], [place['lat'] for place in matches],
+                                     [place['lon'] for place in matches])[0]
+        selected.append(matches[int(distances.argmin())])
+    if missing:
+        raise ValueError(f"地點資料庫中找不到: {', '.join(missing)}")
+    return selected
+
+
+def choose_solver(num_cities, exact_max=EXACT_MAX_CITIES):
+    return 'dp' if num_cities <= exact_max else 'lk'
+
+
+def solve_route(distmap, solver='auto'):
+    # 回傳 (路徑, 距離, 實際使用的演算法, 求解時間毫秒)，路徑以城市0 (起點) 開始並結束
+    num_cities = len(distmap)
+    if solver == 'auto':
+        solver = choose_solver(num_cities)
+    if solver not in ('dp', 'lk'):
+        raise ValueError(f"未知的演算法: {solver}")
+    if num_cities <= 3:
+        solver = 'dp'  # 三個城市以內只有一種走法，LK 的初始解與擾動都不需要
+
+    start = time.perf_counter()
+    if solver == 'dp':
+        route, distance, _, _ = run_dp(distmap)
+    else:
+        route, distance = run_lk(distmap)[:2]
+    solve_time = (time.perf_counter() - start) * 1000
+    return [int(city) for city in route], float(distance), solver, solve_time
+
+
+def draw_route(m, stops, route, directions):
+    # 依路徑順序畫折線，每個地點標上拜訪順序，起點沿用 initialize_map 的標記
+    folium.PolyLine([[stops[city]['lat'], stops[city]['lon']] for city in route],
+                    color='#2c3e50', weight=4, opacity=0.8).add_to(m)
+    for order, city in enumerate(route[1:-1], start=1):
+        stop = stops[city]
+        icon_name, icon_color = category_style(stop)
+        folium.Marker(
+            [stop['lat'], stop['lon']],
+            popup=f"{order}. {stop['name']} ({directions[order - 1]}方 {stop['leg']:.0f}米)",
+            tooltip=f"{order}. {stop['name']}",
+            icon=folium.Icon(color=icon_color, icon=icon_name)
+        ).add_to(m)
+
+
+def plan_route(latitude, longitude, places, solver='auto', output_dir=None, radius=None):
+    # 以 (latitude, longitude) 為起點、places 為要拜訪的地點，建立實際距離矩陣並求最短回路
+    # 輸出 output/map_route.html，回傳路徑、總長度 (米)、各段方位與各階段耗時 (毫秒)
+    start = time.perf_counter()
+    output_dir = output_dir or default_output_dir()
+    os.makedirs(output_dir, exist_ok=True)
+
+    places = list(places)
+    points = [(place['name'], place['lat'], place['lon']) for place in places]
+    origin = (latitude, longitude)
+    names, lats, lons = route_points(points, origin)
+    by_coordinate = {(place['lat'], place['lon']): place for place in places}
+    stops = [by_coordinate.get((lat, lon), {'name': name, 'lat': lat, 'lon': lon})
+             for name, lat, lon in zip(names, lats, lons)]
+    # 距離矩陣與方位角矩陣使用相同的城市編號 (城市0為起點)
+    distmap, _ = build_distmap(points, origin)
+    bearingmap, _ = build_bearingmap(points, origin)
+    matrix_time = (time.perf_counter() - start) * 1000
+
+    route, distance, solver, solve_time = solve_route(distmap, solver)
+    directions = route_directions(route, bearingmap)
+    legs = [float(distmap[a][b]) for a, b in zip(route[:-1], route[1:])]
+    stops = [dict(stop) for stop in stops]
+    for city, leg in zip(route[1:-1], legs):
+        stops[city]['leg'] = leg
+
+    m = initialize_map(latitude, longitude, radius or int(distmap[0].max()) + 1)
+    draw_route(m, stops, route, directions)
+    add_map_features(m)
+    html_path = os.path.join(output_dir, 'map_route.html')
+    m.save(html_path)
+
+    return {
+        'route': route,
+        'stops': [stops[city] for city in route],
+        'distance': distance,
+        'legs': legs,
+        'directions': directions,
+        'solver': solver,
+        'cities': len(distmap),
+        'matrix_time': matrix_time,
+        'solve_time': solve_time,
+        'total_time': (time.perf_counter() - start) * 1000,
+        'html_path': html_path,
+    }
+
+
+def main():
+    # python map/route_planner.py [地點名稱 ...]，未指定名稱時規劃 config.ini 範圍內的地點
+    latitude, longitude, radius = read_location('config.ini')
+    names = sys.argv[1:] or None
+    store = open_default_store()
+    try:
+        places = select_places(store, latitude, longitude, radius, names)
+    finally:
+        store.close()
+    if not places:
+        print("範圍內沒有可規劃的地點，請先繪製地圖或更新地標")
+        return
+
+    result = plan_route(latitude, longitude, places, radius=radius)
+    solver_name = 'Held-Karp (精確解)' if result['solver'] == 'dp' else 'Chained Lin-Kernighan'
+    print(f"共 {result['cities']} 個城市 (含起點)，使用 {solver_name}")
+    for order, (stop, leg, direction) in enumerate(zip(result['stops'][1:], result['legs'], result['directions']),
+                                                   start=1):
+        print(f"{order:3}. {stop['name']}  往{direction} {leg:.0f} 米")
+    print(f"路徑總長: {result['distance']:.0f} 米")
+    print(f"距離矩陣: {result['matrix_time']:.2f} 毫秒，求解: {result['solve_time']:.2f} 毫秒，"
+          f"總計: {result['total_time']:.2f} 毫秒")
+    print(f"地圖已保存至: '{result['html_path']}'")
+
+
+if __name__ == "__main__":
+    main()
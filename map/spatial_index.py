@@ -0,0 +1,78 @@
+import math
+
+import numpy as np
+
+from map.geo_distance import EARTH_RADIUS, haversine_matrix
+
+
+class PlaceIndex:
+    # 以等距投影 (米) 的方格分桶建立空間索引，半徑查詢只檢查附近的格子
+    # 格子篩選後再以 haversine 計算精確距離
+
+    def __init__(self, lats, lons, items=None, cell_size=250):
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.items = list(items) if items is not None else list(range(len(self.lats)))
+        self.cell_size = cell_size
+        self.buckets = {}
+        if not len(self.lats):
+            self.lat0 = self.lon0 = 0.0
+            self.cos0 = 1.0
+            return
+
+        self.lat0 = float(self.lats.mean())
+        self.lon0 = float(self.lons.mean())
+        self.cos0 = math.cos(math.radians(self.lat0))
+
+        cx, cy = self.cells(self.lats, self.lons)
+        order = np.lexsort((cy, cx))
+        keys = np.stack([cx[order], cy[order]], axis=1)
+        starts = np.flatnonzero(np.r_[True, np.any(keys[1:] != keys[:-1], axis=1)])
+        for start, end in zip(starts, np.r_[starts[1:], len(order)]):
+            self.buckets[(int(keys[start, 0]), int(keys[start, 1]))] = order[start:end]
+
+    @classmethod
+    def from_places(cls, places, cell_size=250):
+        # places 為含 'lat'、'lon' 的字典列表
+        places = list(places)
+        return cls([place['lat'] for place in places], [place['lon'] for place in places], places, cell_size)
+
+    def __len__(self):
+        return len(self.items)
+
+    def project(self, lats, lons):
+        x = EARTH_RADIUS * np.radians(np.asarray(lons, dtype=np.float64) - self.lon0) * self.cos0
+        y = EARTH_RADIUS * np.radians(np.asarray(lats, dtype=np.float64) - self.lat0)
+        return x, y
+
+    def cells(self, lats, lons):
+        x, y = self.project(lats, lons)
+        return np.floor(x / self.cell_size).astype(np.int64), np.floor(y / self.cell_size).astype(np.int64)
+
+    def candidates(self, lat, lon, reach_x, reach_y):
+        x, y = self.project(lat, lon)
+        x0, x1 = int(math.floor((x - reach_x) / self.cell_size)), int(math.floor((x + reach_x) / self.cell_size))
+        y0, y1 = int(math.floor((y - reach_y) / self.cell_size)), int(math.floor((y + reach_y) / self.cell_size))
+        found = [self.buckets[(cx, cy)] for cx in range(x0, x1 + 1) for cy in range(y0, y1 + 1)
+                 if (cx, cy) in self.buckets]
+        return np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+
+    def reach(self, lat, r):
+        # 離投影中心緯度越遠，經度方向的投影誤差越大，搜索範圍需跟著放大
+        stretch = self.cos0 / max(math.cos(math.radians(lat)), 1e-6)
+        return r * max(1.0, stretch) * 1.01, r * 1.01
+
+    def query_radius(self, lat, lon, r):
+        # 回傳距離 (lat, lon) r 米以內的 (項目, 距離)，依距離由近到遠排序
+        if not self.buckets:
+            return []
+        reach_x, reach_y = self.reach(lat, r)
+        indices = self.candidates(lat, lon, reach_x, reach_y)
+        if not len(indices):
+            return []
+        distances = haversine_matrix([lat], [lon], self.lats[indices], self.lons[indices])[0]
+        mask = distances <= r
+        indices, distances = indices[mask], distances[mask]
+        order = np.argsort(distances, kind='stable')
+        return [(self.items[indices[i]], float(distances[i])) for i in order]
+
@@ -0,0 +1,150 @@
+import json
+import os
+import shutil
+
+import numpy as np
+from branca.element import MacroElement
+from jinja2 import Template
+
+from map.render import DETAIL_ZOOM, PLACE_MARKER_JS, STYLES, mercator, place_rows, precluster
+
+
+def tile_indices(lats, lons, zoom):
+    # 回傳每個點所在的 XYZ 圖磚編號 (x 向東、y 向南遞增)
+    x, y = mercator(lats, lons)
+    n = 2 ** zoom
+    return np.clip(np.floor(x * n), 0, n - 1).astype(np.int64), np.clip(np.floor(y * n), 0, n - 1).astype(np.int64)
+
+
+def group_by_tile(lats, lons, zoom):
+    # 依圖磚分組，回傳 {(x, y): 索引陣列}
+    tx, ty = tile_indices(lats, lons, zoom)
+    order = np.lexsort((ty, tx))
+    keys = np.stack([tx[order], ty[order]], axis=1)
+    starts = np.flatnonzero(np.r_[True, np.any(keys[1:] != keys[:-1], axis=1)]) if len(order) else []
+    return {(int(keys[start, 0]), int(keys[start, 1])): order[start:end]
+            for start, end in zip(starts, np.r_[starts[1:], len(order)])}
+
+
+def point_feature(lat, lon, properties):
+    return {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [lon, lat]}, 'properties': properties}
+
+
+def write_tile(tile_dir, zoom, x, y, features):
+    path = os.path.join(tile_dir, str(zoom), str(x))
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, f"{y}.geojson"), 'w', encoding='utf-8') as file:
+        json.dump({'type': 'FeatureCollection', 'features': features}, file, ensure_ascii=False,
+                  separators=(',', ':'))
+
+
+def write_tiles(places, tile_dir, max_zoom=DETAIL_ZOOM):
+    # 依縮放層級 0..max_zoom 輸出 z/x/y.geojson 圖磚:
+    # 低於 max_zoom 的層級存放預先聚合的圓點 (properties.count)，max_zoom 存放個別地點 (名稱與圖示編號)
+    # 先寫入暫存目錄再替換，地圖服務器不會讀到寫到一半的圖磚；回傳有資料的圖磚鍵值 "z/x/y"
+    places = list(places)
+    lats = np.array([place['lat'] for place in places], dtype=np.float64)
+    lons = np.array([place['lon'] for place in places], dtype=np.float64)
+    rows = place_rows(places)
+
+    temp_dir = tile_dir + '.tmp'
+    shutil.rmtree(temp_dir, ignore_errors=True)
+    os.makedirs(temp_dir)
+    keys = []
+
+    clusters = precluster(lats, lons, max_zoom) if places else {}
+    for zoom, zoom_clusters in clusters.items():
+        c_lats = np.array([row[0] for row in zoom_clusters])
+        c_lons = np.array([row[1] for row in zoom_clusters])
+        for (x, y), indices in group_by_tile(c_lats, c_lons, zoom).items():
+            write_tile(temp_dir, zoom, x, y, [point_feature(zoom_clusters[i][0], zoom_clusters[i][1],
+                                                            {'count': zoom_clusters[i][2]}) for i in indices])
+            keys.append(f"{zoom}/{x}/{y}")
+
+    for (x, y), indices in group_by_tile(lats, lons, max_zoom).items():
+        write_tile(temp_dir, max_zoom, x, y, [point_feature(rows[i][0], rows[i][1],
+                                                            {'name': rows[i][2], 'style': rows[i][3]})
+                                              for i in indices])
+        keys.append(f"{max_zoom}/{x}/{y}")
+
+    shutil.rmtree(tile_dir, ignore_errors=True)
+    os.replace(temp_dir, tile_dir)
+    return keys
+
+
+class TiledPlaces(MacroElement):
+    # 只下載目前畫面範圍內的圖磚 (tile_url 相對於 HTML)，縮放層級超過 max_zoom 時沿用 max_zoom 的圖磚
+    # 離開畫面的圖磚隨即移除，瀏覽器中的標記數只與可見地點數有關
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        (function() {
+            var map = {{ this._parent.get_name() }};
+            var tileKeys = new Set({{ this.keys|tojson }});
+            var styles = {{ this.styles|tojson }};
+            var maxZoom = {{ this.max_zoom }};
+            var tileUrl = {{ this.tile_url|tojson }};
+            var loaded = {};
+            var currentZoom = null;
+            {{ this.marker_js }}
+
+            function pointToLayer(feature, latlng) {
+                var props = feature.properties;
+                if (props.count !== undefined) {
+                    return L.marker(latlng, {icon: clusterIcon(props.count)})
+                        .on('click', function() { map.setView(latlng, map.getZoom() + 2); });
+                }
+                return placeMarker(latlng, props.name, styles[props.style]);
+            }
+
+            function tileX(lon, n) { return Math.floor((lon + 180) / 360 * n); }
+            function tileY(lat, n) {
+                var rad = lat * Math.PI / 180;
+                return Math.floor((1 - Math.log(Math.tan(rad) + 1 / Math.cos(rad)) / Math.PI) / 2 * n);
+            }
+
+            function refresh() {
+                var zoom = Math.min(Math.round(map.getZoom()), maxZoom);
+                if (zoom !== currentZoom) {
+                    Object.keys(loaded).forEach(function(key) { map.removeLayer(loaded[key]); });
+                    loaded = {};
+                    currentZoom = zoom;
+                }
+                var n = Math.pow(2, zoom);
+                var bounds = map.getBounds().pad(0.1);
+                var x0 = Math.max(tileX(bounds.getWest(), n), 0), x1 = Math.min(tileX(bounds.getEast(), n), n - 1);
+                var y0 = Math.max(tileY(bounds.getNorth(), n), 0), y1 = Math.min(tileY(bounds.getSouth(), n), n - 1);
+
+                var visible = {};
+                for (var x = x0; x <= x1; x++) {
+                    for (var y = y0; y <= y1; y++) {
+                        var key = zoom + '/' + x + '/' + y;
+                        if (tileKeys.has(key)) visible[key] = true;
+                    }
+                }
+                Object.keys(loaded).forEach(function(key) {
+                    if (!visible[key]) { map.removeLayer(loaded[key]); delete loaded[key]; }
+                });
+                Object.keys(visible).forEach(function(key) {
+                    if (loaded[key]) return;
+                    var layer = L.geoJSON(null, {pointToLayer: pointToLayer}).addTo(map);
+                    loaded[key] = layer;
+                    fetch(tileUrl + key + '.geojson')
+                        .then(function(response) { return response.json(); })
+                        .then(function(data) { if (loaded[key] === layer) layer.addData(data); });
+                });
+            }
+
+            map.on('moveend', refresh);
+            refresh();
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, keys, max_zoom=DETAIL_ZOOM, tile_url='tiles/'):
+        super().__init__()
+        self._name = 'TiledPlaces'
+        self.keys = keys
+        self.styles = STYLES
+        self.marker_js = PLACE_MARKER_JS
+        self.max_zoom = max_zoom
+        self.tile_url = tile_url
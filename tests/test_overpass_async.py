@@ -0,0 +1,166 @@
+import asyncio
+import http.server
+import json
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from map.overpass import fetch_overpass
+from map.overpass_async import AsyncOverpassClient, OverpassError, aiohttp
+
+
+class StandInOverpass:
+    # 本地替代 Overpass 伺服器: 依序回應 statuses 中的狀態碼 (用完後一律 200)，並記錄請求數與最大同時請求數
+
+    def __init__(self, statuses=(), delay=0.0, elements=None):
+        self.statuses = list(statuses)
+        self.delay = delay
+        self.elements = elements if elements is not None else [{'type': 'node', 'id': 1, 'lat': 25.0, 'lon': 121.5}]
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                with server.lock:
+                    server.requests += 1
+                    server.in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server.in_flight)
+                    status = server.statuses.pop(0) if server.statuses else 200
+                try:
+                    time.sleep(server.delay)
+                    body = json.dumps({'elements': server.elements} if status == 200 else {}).encode('utf-8')
+                    self.send_response(status)
+                    if status == 429:
+                        self.send_header('Retry-After', '0')
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                finally:
+                    with server.lock:
+                        server.in_flight -= 1
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/api/interpreter"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@unittest.skipIf(aiohttp is None, "需要安裝 aiohttp")
+class AsyncOverpassClientTest(unittest.TestCase):
+
+    def start_server(self, **kwargs):
+        server = StandInOverpass(**kwargs)
+        self.addCleanup(server.close)
+        return server
+
+    def run_client(self, url, coroutine, **kwargs):
+        async def main():
+            async with AsyncOverpassClient(url=url, backoff=0.01, timeout=5, **kwargs) as client:
+                return await coroutine(client)
+        return asyncio.run(main())
+
+    def test_concurrency_limit(self):
+        server = self.start_server(delay=0.2)
+        queries = [(25.0 + i * 0.01, 121.5, 300) for i in range(6)]
+        results = self.run_client(server.url, lambda client: client.fetch_many(queries), concurrency=2)
+        self.assertEqual(len(results), 6)
+        self.assertEqual(server.requests, 6)
+        self.assertEqual(server.max_in_flight, 2)
+
+    def test_retry_on_429_and_5xx(self):
+        server = self.start_server(statuses=(429, 503, 504))
+        data = self.run_client(server.url, lambda client: client.query(25.0, 121.5, 300), max_retries=3)
+        self.assertEqual(data['elements'], server.elements)
+        self.assertEqual(server.requests, 4)
+
+    def test_gives_up_after_max_retries(self):
+        server = self.start_server(statuses=(503,) * 10)
+        with self.assertRaises(OverpassError):
+            self.run_client(server.url, lambda client: client.query(25.0, 121.5, 300), max_retries=2)
+        self.assertEqual(server.requests, 3)
+
+    def test_other_status_raises_overpass_error(self):
+        server = self.start_server(statuses=(400,))
+        with self.assertRaises(OverpassError):
+            self.run_client(server.url, lambda client: client.query(25.0, 121.5, 300), max_retries=2)
+        self.assertEqual(server.requests, 1)
+
+    def test_retry_delay_backoff(self):
+        client = AsyncOverpassClient(backoff=1.0)
+        self.assertEqual(client.retry_delay(0, '7'), 7.0)
+        for attempt in range(4):
+            delay = client.retry_delay(attempt)
+            self.assertGreaterEqual(delay, 2 ** attempt / 2)
+            self.assertLessEqual(delay, 2 ** attempt)
+
+    def test_mirror_fallback(self):
+        primary = self.start_server(statuses=(503,) * 10)
+        mirror = self.start_server()
+        data = self.run_client([primary.url, mirror.url], lambda client: client.query(25.0, 121.5, 300),
+                               max_retries=2)
+        self.assertEqual(data['elements'], mirror.elements)
+        self.assertEqual(primary.requests, 1)
+        self.assertEqual(mirror.requests, 1)
+
+    def test_mirror_fallback_when_unreachable(self):
+        mirror = self.start_server()
+        unreachable = StandInOverpass()
+        unreachable.close()  # 埠已關閉，連線會被拒絕
+        data = self.run_client([unreachable.url, mirror.url], lambda client: client.query(25.0, 121.5, 300),
+                               max_retries=1)
+        self.assertEqual(data['elements'], mirror.elements)
+
+
+
+class FetchOverpassTest(unittest.TestCase):
+    # 沒有 aiohttp 時使用的 requests 版本，重試與鏡像站輪替應與非同步版本相同
+
+    def start_server(self, **kwargs):
+        server = StandInOverpass(**kwargs)
+        self.addCleanup(server.close)
+        return server
+
+    def test_retry_on_429_and_5xx(self):
+        server = self.start_server(statuses=(429, 503))
+        data = fetch_overpass(25.0, 121.5, 300, url=server.url, max_retries=3, backoff=0.01)
+        self.assertEqual(data['elements'], server.elements)
+        self.assertEqual(server.requests, 3)
+
+    def test_mirror_fallback(self):
+        primary = self.start_server(statuses=(503,) * 10)
+        mirror = self.start_server()
+        data = fetch_overpass(25.0, 121.5, 300, url=[primary.url, mirror.url], max_retries=2, backoff=0.01)
+        self.assertEqual(data['elements'], mirror.elements)
+        self.assertEqual(primary.requests, 1)
+
+    def test_errors_raise_overpass_error(self):
+        failing = self.start_server(statuses=(503,) * 10)
+        with self.assertRaises(OverpassError):
+            fetch_overpass(25.0, 121.5, 300, url=failing.url, max_retries=1, backoff=0.01)
+        self.assertEqual(failing.requests, 2)
+        rejected = self.start_server(statuses=(400,))
+        with self.assertRaises(OverpassError):
+            fetch_overpass(25.0, 121.5, 300, url=rejected.url, max_retries=2, backoff=0.01)
+        self.assertEqual(rejected.requests, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
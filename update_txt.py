@@ -1,97 +1,174 @@
 import csv
+import math
 import os
 import re
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 
+from map.place_store import open_default_store
+
+CHUNK_SIZE = 50000  # 每批解析與寫入的行數，記憶體用量只與批次大小有關
+TXT_PATTERN = re.compile(r'(.+?)\s*(-?\d+\.\d+)\s*,\s*(-?\d+\.\d+)')
+MAX_REJECT_SAMPLES = 10  # 只保留前幾個格式錯誤的行號供提示
 
-def process_txt_file(file_path):
-    lines = []
-    try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            lines = file.readlines()
-        print(f"成功讀取文件，共 {len(lines)} 行")
-    except FileNotFoundError:
-        print(f"找不到文件：{file_path}")
-        return
-    except IOError as e:
-        print(f"讀取文件時發生錯誤：{e}")
-        return
 
-    data = []
-    for i, line in enumerate(lines, start=1):
-        line = ''.join(line.split())
-        match = re.match(r'(.+?)(\d+\.\d+),(\d+\.\d+)', line)
+def valid_coordinate(lat, lon):
+    return math.isfinite(lat) and math.isfinite(lon) and -90 <= lat <= 90 and -180 <= lon <= 180
+
+
+def parse_txt_lines(lines, start_line):
+    # 每行格式: 名稱 緯度,經度，回傳 (有效資料, 錯誤行號)
+    # 先以原始行比對 (名稱與緯度之間的空白可區分名稱結尾的數字)，名稱再去除所有空白
+    rows = []
+    rejects = []
+    for i, line in enumerate(lines, start=start_line):
+        line = line.strip()
+        if not line:
+            continue
+        match = TXT_PATTERN.match(line)
         if match:
             place, latitude, longitude = match.groups()
-            data.append([place, latitude, longitude])
-            print(f"添加數據: {place}, {latitude}, {longitude}")
-        else:
-            print(f"警告: 第 {i} 行格式不正確")
+            lat, lon = float(latitude), float(longitude)
+            if valid_coordinate(lat, lon):
+                rows.append((''.join(place.split()), lat, lon))
+                continue
+        rejects.append(i)
+    return rows, rejects
+
+
+def parse_csv_rows(records, start_line):
+    # 每列取前三欄 (名稱, 緯度, 經度)
+    rows = []
+    rejects = []
+    for i, record in enumerate(records, start=start_line):
+        if not record:
+            continue
+        if len(record) >= 3:
+            try:
+                lat, lon = float(record[1]), float(record[2])
+            except ValueError:
+                lat = lon = math.nan
+            if record[0].strip() and valid_coordinate(lat, lon):
+                rows.append((record[0].strip(), lat, lon))
+                continue
+        rejects.append(i)
+    return rows, rejects
+
+
+def parse_chunk(file_type, items, start_line):
+    if file_type == "txt":
+        return parse_txt_lines(items, start_line)
+    return parse_csv_rows(items, start_line)
 
-    return data
 
+def read_chunks(file, file_type, chunk_size):
+    # 逐批讀取，回傳 (第一行的行號, 該批的行或 CSV 列)；CSV 由 csv.reader 處理引號內的換行
+    if file_type == "txt":
+        items = iter(file)
+        line = 1
+    else:
+        items = csv.reader(file)
+        next(items, None)  # 跳過標題行
+        line = 2
+    while True:
+        chunk = list(islice(items, chunk_size))
+        if not chunk:
+            return
+        yield line, chunk
+        line += len(chunk)
+
+
+def parse_chunks(chunks, file_type, workers):
+    # workers > 1 時以進程池平行解析，同時最多 2 * workers 批在處理中，維持記憶體上限
+    if not workers or workers <= 1:
+        for start_line, chunk in chunks:
+            yield parse_chunk(file_type, chunk, start_line)
+        return
 
-def process_csv_file(file_path):
-    data = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = []
+        for start_line, chunk in chunks:
+            pending.append(executor.submit(parse_chunk, file_type, chunk, start_line))
+            if len(pending) >= 2 * workers:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
+
+
+def import_places(file_path, file_type, store=None, chunk_size=CHUNK_SIZE, workers=None, progress=None):
+    # 串流匯入上傳的 TXT/CSV：逐批解析、驗證座標，依資料庫的 (緯度, 經度) 唯一索引去除重複，只新增新的地點
+    # 回傳統計: 總行數、新增 (added)、重複 (duplicates)、格式錯誤 (rejected)、資料庫路徑 (output_path)、
+    # 匯入後資料庫的地點總數 (total)
+    # progress(比例, 統計) 在每批寫入後呼叫，比例依已讀取的位元組數估計
+    if file_type not in ("txt", "csv"):
+        raise ValueError(f"不支持的文件類型: {file_type}")
+
+    summary = {'rows': 0, 'added': 0, 'duplicates': 0, 'rejected': 0, 'reject_lines': []}
+    own_store = store is None
+    if own_store:
+        store = open_default_store()
     try:
-        with open(file_path, 'r', newline='', encoding='utf-8') as file:
-            reader = csv.reader(file)
-            next(reader)  # 跳過標題行
-            for row in reader:
-                if len(row) >= 3:
-                    data.append(row[:3])  # 只取前三列
-                    print(f"添加數據: {', '.join(row[:3])}")
-                else:
-                    print(f"警告: 行 {reader.line_num} 格式不正確")
-    except FileNotFoundError:
-        print(f"找不到文件：{file_path}")
-    except IOError as e:
-        print(f"讀取文件時發生錯誤：{e}")
-
-    return data
+        summary['output_path'] = store.db_path
+        total_bytes = os.path.getsize(file_path) or 1
+        newline = None if file_type == "txt" else ''
+        with open(file_path, 'r', newline=newline, encoding='utf-8') as file:
+            for rows, rejects in parse_chunks(read_chunks(file, file_type, chunk_size), file_type, workers):
+                added = store.add_places(rows, uploaded=True) if rows else 0
+                summary['rows'] += len(rows) + len(rejects)
+                summary['added'] += added
+                summary['duplicates'] += len(rows) - added
+                summary['rejected'] += len(rejects)
+                summary['reject_lines'].extend(rejects[:MAX_REJECT_SAMPLES - len(summary['reject_lines'])])
+                if progress:
+                    progress(min(file.buffer.tell() / total_bytes, 1.0), summary)
+        summary['total'] = store.count()
+        if progress:
+            progress(1.0, summary)
+    finally:
+        if own_store:
+            store.close()
+    return summary
+
+
+def describe_import(summary):
+    # 匯入結果的文字說明 (命令列與 GUI 共用)
+    lines = []
+    if summary['rejected']:
+        samples = ', '.join(str(line) for line in summary['reject_lines'])
+        lines.append(f"警告: {summary['rejected']} 行格式不正確 (例如第 {samples} 行)")
+    if not summary['added'] and not summary['duplicates']:
+        lines.append("沒有數據可處理")
+    else:
+        lines.append(f"總共 {summary['rows']} 行數據，新增 {summary['added']} 行，重複 {summary['duplicates']} 行")
+        lines.append(f"地點資料庫已更新：{summary['output_path']} (共 {summary['total']} 個地點)")
+    return lines
 
 
 def main():
     if len(sys.argv) < 3:
-        print("使用方法: python update_txt.py <文件路徑> <文件類型>")
+        print("使用方法: python update_txt.py <文件路徑> <文件類型> [進程數]")
         return
 
     file_path = sys.argv[1]
     file_type = sys.argv[2]
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else None
 
-    if file_type == "txt":
-        data = process_txt_file(file_path)
-    elif file_type == "csv":
-        data = process_csv_file(file_path)
-    else:
+    if file_type not in ("txt", "csv"):
         print("不支持的文件類型")
         return
 
-    if data:
-        output_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploaded_places.csv")
-        try:
-            # 如果文件已存在，先读取现有数据
-            existing_data = []
-            if os.path.exists(output_file):
-                with open(output_file, 'r', newline='', encoding='utf-8') as file:
-                    reader = csv.reader(file)
-                    next(reader)  # 跳过标题行
-                    existing_data = list(reader)
-
-            # 合并现有数据和新数据，去重
-            all_data = existing_data + data
-            unique_data = list({tuple(row) for row in all_data})
-
-            with open(output_file, 'w', newline='', encoding='utf-8') as file:
-                writer = csv.writer(file)
-                writer.writerow(['名稱', '緯度', '經度'])  # 写入标题行
-                writer.writerows(unique_data)
-            print(f"CSV檔案已更新：{output_file}")
-            print(f"總共 {len(unique_data)} 行數據（包括新增和既有）")
-        except IOError as e:
-            print(f"寫入CSV檔案時發生錯誤：{e}")
-    else:
-        print("沒有數據可處理")
+    try:
+        summary = import_places(file_path, file_type, workers=workers)
+    except FileNotFoundError:
+        print(f"找不到文件：{file_path}")
+        return
+    except IOError as e:
+        print(f"讀取文件時發生錯誤：{e}")
+        return
+
+    for line in describe_import(summary):
+        print(line)
 
 
 if __name__ == "__main__":
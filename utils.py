@@ -1,7 +1,7 @@
 import os
 import random
-import subprocess
 import sys
+from collections import deque
 
 import numpy as np
 import psutil
@@ -21,43 +21,38 @@ def create_output_directory():
     return output_dir
 
 
-def run_openmap():
-    # 获取 main.py 所在的目录
-    if getattr(sys, 'frozen', False):
-        # 如果是打包后的 exe
-        base_path = sys._MEIPASS
-    else:
-        # 如果是直接运行 Python 脚本
-        base_path = os.path.dirname(os.path.abspath(__file__))
+def get_memory_usage():
+    process = psutil.Process(os.getpid())
+    return process.memory_info().rss
 
-    # 构建 openmap.py 的绝对路径
-    openmap_path = os.path.join(base_path, "map", "openmap.py")
 
-    # 构建输出 HTML 文件的路径
-    output_dir = os.path.join(base_path, "output")
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-    html_file = "map_with_nearby_places_osm.html"
-    html_path = os.path.join(output_dir, html_file)
+def get_peak_memory_usage():
+    # 進程從啟動至今的最高 RSS (bytes)
+    memory_info = psutil.Process(os.getpid()).memory_info()
+    if hasattr(memory_info, 'peak_wset'):  # Windows
+        return memory_info.peak_wset
 
-    # 执行 openmap.py 脚本
-    result = subprocess.run(["python", openmap_path], capture_output=True, text=True, encoding="utf-8")
-    print(result.stdout)
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024  # Linux 單位為 KB
 
-    # 检查是否生成了 HTML 文件
-    if os.path.exists(html_path):
-        print(f"地图已生成并保存至: '{html_path}'")
-    else:
-        print("错误: HTML 文件未能成功创建")
+
+def total_distance(route, distmap):
+    return sum(distmap[int(route[i]), int(route[i + 1])] for i in range(len(route) - 1))
 
 
-def get_memory_usage():
-    process = psutil.Process(os.getpid())
-    return process.memory_info().rss
+def batch_total_distance(routes, distmap):
+    # routes 為 (路徑數 × N+1) 的整數陣列，一次以花式索引算出所有路徑長度
+    routes = np.asarray(routes, dtype=np.intp)
+    distmap = np.asarray(distmap)
+    return distmap[routes[:, :-1], routes[:, 1:]].sum(axis=1)
 
 
-def total_distance(route, distmap):
-    return sum(distmap[int(route[i]), int(route[i + 1])] for i in range(len(route) - 1))
+def random_population(size, num_cities):
+    # 產生 size 條隨機路徑，起點與終點固定為城市0
+    population = np.zeros((size, num_cities + 1), dtype=np.intp)
+    population[:, 1:-1] = np.argsort(np.random.random((size, num_cities - 1)), axis=1) + 1
+    return population
 
 
 def create_distmap(N):
@@ -104,39 +99,164 @@ def generate_neighbor(solution):
 
 # K近鄰
 def knn_optimization(distmap):
-    n_cities = len(distmap)
-    unvisited = set(range(n_cities))
+    dist = np.asarray(distmap, dtype=float)
+    n_cities = len(dist)
+    visited = np.zeros(n_cities, dtype=bool)
     route = [0]  # 從城市0開始
-    unvisited.remove(0)
+    visited[0] = True
 
-    while unvisited:
-        last = route[-1]
-        next_city = min(unvisited, key=lambda x: distmap[int(last)][int(x)])
-        route.append(int(next_city))
-        unvisited.remove(next_city)
+    for _ in range(n_cities - 1):
+        row = np.where(visited, np.inf, dist[route[-1]])
+        next_city = int(row.argmin())
+        route.append(next_city)
+        visited[next_city] = True
 
     route.append(0)  # 回到起點
     distance = total_distance(route, distmap)
     return route, distance
 
 
-def two_opt_swap(route, i, k):
-    new_route = route[:i] + route[i:k + 1][::-1] + route[k + 1:]
-    return [int(city) for city in new_route]
-
-
-def two_opt(route, distmap):
-    best = route
-    improved = True
-    while improved:
-        improved = False
-        for i in range(1, len(route) - 2):
-            for k in range(i + 1, len(route) - 1):
-                new_route = two_opt_swap(route, i, k)
-                if total_distance(new_route, distmap) < total_distance(best, distmap):
-                    best = new_route
-                    improved = True
-        route = best
+def neighbor_lists(distmap, k):
+    # 每個城市距離最近的 k 個城市 (由近到遠)，作為局部搜索的候選集合
+    dist = np.array(distmap, dtype=float)
+    n_cities = len(dist)
+    k = min(k, n_cities - 1)
+    np.fill_diagonal(dist, np.inf)
+    nearest = np.argpartition(dist, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(dist, nearest, axis=1).argsort(axis=1)
+    return np.take_along_axis(nearest, order, axis=1).tolist()
+
+
+class ArrayTour:
+    # 環狀路徑的陣列表示，供 two_opt 與 LK 共用: tour 為城市順序，pos 為城市在 tour 中的位置
+    # 直接修改 tour 內容後需呼叫 rebuild_positions
+
+    def __init__(self, tour):
+        self.tour = tour
+        self.n = len(tour)
+        self.pos = [0] * self.n
+        self.rebuild_positions()
+
+    def rebuild_positions(self):
+        pos = self.pos
+        for index, city in enumerate(self.tour):
+            pos[city] = index
+
+    def succ(self, city):
+        return self.tour[(self.pos[city] + 1) % self.n]
+
+    def pred(self, city):
+        return self.tour[self.pos[city] - 1]
+
+    def reverse(self, i, j):
+        # 反轉位置 i 到 j (往前環繞) 的路段，改為反轉較短的另一側效果相同
+        tour, pos, n = self.tour, self.pos, self.n
+        length = (j - i) % n + 1
+        if length * 2 > n:
+            i, j = (j + 1) % n, (i - 1) % n
+            length = n - length
+        for _ in range(length // 2):
+            a, b = tour[i], tour[j]
+            tour[i], tour[j] = b, a
+            pos[b], pos[a] = i, j
+            i = (i + 1) % n
+            j = (j - 1) % n
+
+    def exchange(self, a, b, c, d):
+        # 以 (a,c)、(b,d) 取代同方向的相鄰邊 (a,b)、(c,d)
+        if self.succ(a) == b:
+            self.reverse(self.pos[b], self.pos[c])
+        else:
+            self.reverse(self.pos[c], self.pos[b])
+
+
+def two_opt(route, distmap, neighbors=10, or_opt_length=3):
+    # 候選集合 + don't-look bits 的 2-opt / Or-opt 局部搜索 (首次改進即套用)
+    # 路徑視為環狀，tour 存放城市順序，pos 為城市在 tour 中的位置，距離矩陣需對稱
+    start = int(route[0])
+    tour = [int(city) for city in route[:-1]]
+    n = len(tour)
+    if n < 5:
+        return [start] + tour[1:] + [start], total_distance(route, distmap)
+
+    dist = np.asarray(distmap).tolist()
+    near = neighbor_lists(distmap, neighbors)
+    array_tour = ArrayTour(tour)
+    pos, succ, pred, exchange = array_tour.pos, array_tour.succ, array_tour.pred, array_tour.exchange
+    eps = 1e-9
+
+    def improve_2opt(a):
+        for step in (succ, pred):
+            b = step(a)
+            d_ab = dist[a][b]
+            for c in near[a]:
+                d_ac = dist[a][c]
+                if d_ac >= d_ab:
+                    break
+                d = step(c)
+                if c == b or d == a:
+                    continue
+                delta = d_ac + dist[b][d] - d_ab - dist[c][d]
+                if delta < -eps:
+                    exchange(a, b, c, d)
+                    return (a, b, c, d)
+        return None
+
+    def improve_or_opt(a):
+        for length in range(1, min(or_opt_length, n - 3) + 1):
+            first = a
+            last = tour[(pos[a] + length - 1) % n]
+            prev, after = pred(first), succ(last)
+            removed = dist[prev][first] + dist[last][after] - dist[prev][after]
+            if removed <= eps:
+                continue
+            segment = {tour[(pos[a] + offset) % n] for offset in range(length)}
+            for end, other in ((first, last), (last, first)):
+                for c in near[end]:
+                    d_ce = dist[c][end]
+                    if d_ce >= removed:
+                        break
+                    if c in segment:
+                        continue
+                    for e in (succ(c), pred(c)):
+                        if e in segment:
+                            continue
+                        delta = d_ce + dist[other][e] - dist[c][e] - removed
+                        if delta < -eps:
+                            move_segment(first, length, end, c, e)
+                            return (prev, after, first, last, c, e)
+        return None
+
+    def move_segment(first, length, end, c, e):
+        # 將 first 起算 length 個城市移到 c 與 e 之間，end 端與 c 相鄰
+        rotated = tour[pos[first]:] + tour[:pos[first]]
+        block, rest = rotated[:length], rotated[length:]
+        index = rest.index(c)
+        if e == rest[(index + 1) % len(rest)]:
+            if block[0] != end:
+                block.reverse()
+            rest[index + 1:index + 1] = block
+        else:
+            if block[-1] != end:
+                block.reverse()
+            rest[index:index] = block
+        tour[:] = rest
+        array_tour.rebuild_positions()
+
+    queue = deque(tour)
+    queued = [True] * n
+    while queue:
+        a = queue.popleft()
+        queued[a] = False
+        touched = improve_2opt(a) or improve_or_opt(a)
+        if touched:
+            for city in touched:
+                if not queued[city]:
+                    queued[city] = True
+                    queue.append(city)
+
+    index = pos[start]
+    best = tour[index:] + tour[:index] + [start]
     return best, total_distance(best, distmap)
 
 